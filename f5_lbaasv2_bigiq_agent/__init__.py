@@ -1,4 +1,10 @@
-__version__ = "16.0.0"
+import time
 
 import eventlet
+
+__version__ = "16.0.0"
+
+# Reported in the startup timing of the agent
+START_TIME = time.time()
+
 eventlet.monkey_patch()
@@ -1,48 +1,133 @@
-import service_launcher
+import argparse
 import sys
+import time
 
 from oslo_config import cfg
 from oslo_log import log as oslo_logging
-from neutron.common import config as common_config
-from neutron.common import rpc as n_rpc
-from neutron.conf.agent import common as config
-
-try:
-    # q version
-    from neutron.conf.agent.common import INTERFACE_OPTS
-except Exception:
-    # p version
-    from neutron.agent.linux.interface import OPTS as INTERFACE_OPTS
-except ImportError as Error:
-    pass
 
+import f5_lbaasv2_bigiq_agent
 import f5_lbaasv2_bigiq_agent.agent_manager as manager
+import f5_lbaasv2_bigiq_agent.bigiq.config_cache as config_cache
+import f5_lbaasv2_bigiq_agent.bigiq.direct as direct
+import f5_lbaasv2_bigiq_agent.bigiq.endpoints as endpoints
+import f5_lbaasv2_bigiq_agent.bigiq.inventory as inventory
+import f5_lbaasv2_bigiq_agent.bigiq.shared as shared
 import f5_lbaasv2_bigiq_agent.constants as constants
+import f5_lbaasv2_bigiq_agent.drift as drift
+import f5_lbaasv2_bigiq_agent.evacuation as evacuation
+import f5_lbaasv2_bigiq_agent.fair_queue as fair_queue
+import f5_lbaasv2_bigiq_agent.journal as journal
+import f5_lbaasv2_bigiq_agent.member_health as member_health
+import f5_lbaasv2_bigiq_agent.profiler as profiler
+import f5_lbaasv2_bigiq_agent.resync as resync
+import f5_lbaasv2_bigiq_agent.rpc_recorder as rpc_recorder
+import f5_lbaasv2_bigiq_agent.scheduler.rebalance as rebalance
+import f5_lbaasv2_bigiq_agent.stats_reporter as stats_reporter
+import f5_lbaasv2_bigiq_agent.tracing as tracing
+import f5_lbaasv2_bigiq_agent.write_behind as write_behind
 
 LOG = oslo_logging.getLogger(__name__)
 
 OPTS = [
 ]
 
-
-class F5BIGIQAgentService(n_rpc.Service):
-    """F5 BIG-IQ agent service class."""
-
-    def start(self):
-        """Start the F5 agent service."""
-        self.tg.add_timer(
-            cfg.CONF.periodic_interval,
-            self.manager.run_periodic_tasks,
-            None,
-            None
-        )
-        super(F5BIGIQAgentService, self).start()
+REQUIRED_OPTS = {
+    "agent_id": "Agent ID",
+    "bigiq_host": "BIG-IQ host"
+}
+
+
+class StartupTimer(object):
+    """Time the phases of agent startup since the process started."""
+
+    def __init__(self):
+        self.last = f5_lbaasv2_bigiq_agent.START_TIME
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.time()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def __str__(self):
+        return ", ".join("%s %.3fs" % phase for phase in self.phases)
+
+
+def _check_required_opts(argv):
+    """Quit early if the config lacks an option the agent cannot run without.
+
+    Only the config files are read, into a private ConfigOpts, so this
+    check runs before neutron is imported and before cfg.CONF is parsed.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--config-file", action="append", default=[])
+    parser.add_argument("--config-dir", action="append", default=[])
+    known, _ = parser.parse_known_args(argv)
+
+    args = []
+    for config_file in known.config_file:
+        args += ["--config-file", config_file]
+    for config_dir in known.config_dir:
+        args += ["--config-dir", config_dir]
+
+    conf = cfg.ConfigOpts()
+    conf.register_opts([opt for opt in manager.OPTS
+                        if opt.dest in REQUIRED_OPTS])
+    oslo_logging.register_options(conf)
+    conf(args=args, project="neutron")
+
+    for name, description in sorted(REQUIRED_OPTS.items()):
+        if not getattr(conf, name):
+            # Logging is set up from the same files, so that the error
+            # goes where the agent logs
+            oslo_logging.setup(conf, "neutron")
+            LOG.error("%s is undefined. Quit process.", description)
+            sys.exit(1)
+
+
+def register_opts(conf):
+    """Register the options of the agent modules."""
+    conf.register_opts(OPTS)
+    conf.register_opts(manager.OPTS)
+    conf.register_opts(inventory.OPTS)
+    conf.register_opts(config_cache.OPTS)
+    conf.register_opts(direct.OPTS)
+    conf.register_opts(endpoints.OPTS)
+    conf.register_opts(shared.OPTS)
+    conf.register_opts(journal.OPTS)
+    conf.register_opts(fair_queue.OPTS)
+    conf.register_opts(stats_reporter.OPTS)
+    conf.register_opts(drift.OPTS)
+    conf.register_opts(rebalance.OPTS)
+    conf.register_opts(evacuation.OPTS)
+    conf.register_opts(tracing.OPTS)
+    conf.register_opts(profiler.OPTS)
+    conf.register_opts(member_health.OPTS)
+    conf.register_opts(write_behind.OPTS)
+    conf.register_opts(resync.OPTS)
+    conf.register_opts(rpc_recorder.OPTS)
 
 
 def main():
     """F5 BIG-IQ agent for OpenStack."""
-    cfg.CONF.register_opts(OPTS)
-    cfg.CONF.register_opts(manager.OPTS)
+    timer = StartupTimer()
+    _check_required_opts(sys.argv[1:])
+    timer.mark("check config")
+
+    from neutron.common import config as common_config
+    from neutron.conf.agent import common as config
+
+    try:
+        # q version
+        from neutron.conf.agent.common import INTERFACE_OPTS
+    except ImportError:
+        # p version
+        from neutron.agent.linux.interface import OPTS as INTERFACE_OPTS
+
+    from f5_lbaasv2_bigiq_agent import service_launcher
+    timer.mark("import neutron")
+
+    register_opts(cfg.CONF)
     cfg.CONF.register_opts(INTERFACE_OPTS)
 
     config.register_agent_state_opts_helper(cfg.CONF)
@@ -50,18 +135,13 @@ def main():
 
     common_config.init(sys.argv[1:])
     config.setup_logging()
-
-    if not cfg.CONF.agent_id:
-        LOG.error("Agent ID is undefined. Quit process.")
-        sys.exit(1)
-
-    if not cfg.CONF.bigiq_host:
-        LOG.error("BIG-IQ host is undefined. Quit process.")
-        sys.exit(1)
+    tracing.setup(cfg.CONF)
+    timer.mark("load config")
 
     mgr = manager.F5BIGIQAgentManager(cfg.CONF)
+    timer.mark("init manager")
 
-    svc = F5BIGIQAgentService(
+    svc = service_launcher.F5BIGIQAgentService(
         host=mgr.agent_host,
         topic=constants.TOPIC_LBAASV2_BIGIQ_AGENT,
         manager=mgr
@@ -69,4 +149,6 @@ def main():
 
     service_launch = service_launcher.F5ServiceLauncher(cfg.CONF)
     service_launch.launch_service(svc)
+    timer.mark("launch service")
+    LOG.info("Agent startup: %s", timer)
     service_launch.wait()
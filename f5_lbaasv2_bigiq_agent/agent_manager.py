@@ -1,16 +1,39 @@
+import threading
+import time
+
+import eventlet
+from eventlet import queue as eventlet_queue
+from eventlet import semaphore
 from oslo_config import cfg
-from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 import oslo_messaging
 from oslo_service import loopingcall
 from oslo_service import periodic_task
 
-from neutron.agent import rpc as agent_rpc
-from neutron_lib import context as ncontext
-
+import f5_lbaasv2_bigiq_agent
 from f5_lbaasv2_bigiq_agent import constants
+from f5_lbaasv2_bigiq_agent import deadline
+from f5_lbaasv2_bigiq_agent import drift
+from f5_lbaasv2_bigiq_agent import evacuation
+from f5_lbaasv2_bigiq_agent import fair_queue
+from f5_lbaasv2_bigiq_agent import journal
+from f5_lbaasv2_bigiq_agent import member_health
 from f5_lbaasv2_bigiq_agent import plugin_rpc
+from f5_lbaasv2_bigiq_agent import profiler
+from f5_lbaasv2_bigiq_agent import resync
+from f5_lbaasv2_bigiq_agent import rpc_recorder
+from f5_lbaasv2_bigiq_agent import stats_reporter
+from f5_lbaasv2_bigiq_agent import tracing
+from f5_lbaasv2_bigiq_agent import write_behind
+from f5_lbaasv2_bigiq_agent.bigiq import config_cache
+from f5_lbaasv2_bigiq_agent.bigiq import direct
+from f5_lbaasv2_bigiq_agent.bigiq import endpoints
 from f5_lbaasv2_bigiq_agent.bigiq import get_bigiq_mgr
+from f5_lbaasv2_bigiq_agent.bigiq import inventory
+from f5_lbaasv2_bigiq_agent.bigiq import l7
+from f5_lbaasv2_bigiq_agent.bigiq import shared
+from f5_lbaasv2_bigiq_agent.scheduler import placement
+from f5_lbaasv2_bigiq_agent.scheduler import rebalance
 from f5_lbaasv2_bigiq_agent.scheduler import scheduler
 
 LOG = logging.getLogger(__name__)
@@ -38,10 +61,12 @@ OPTS = [
         default=None,
         help=("Static agent ID to use with Neutron")
     ),
-    cfg.StrOpt(
+    cfg.ListOpt(
         "bigiq_host",
-        default=None,
-        help=("BIG-IQ hostname or IP address")
+        default=[],
+        help=("BIG-IQ hostnames or IP addresses. Reads are spread over "
+              "all healthy ones, writes go to the first one, or to the "
+              "next healthy one when it fails its health probes")
     ),
     cfg.StrOpt(
         "bigiq_user",
@@ -78,16 +103,57 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         super(F5BIGIQAgentManager, self).__init__(conf)
         LOG.debug("Initializing BIG-IQ Agent Manager")
 
+        # neutron is slow to import, defer it until the agent is started
+        from neutron_lib import context as ncontext
+
         self.conf = conf
         self.context = ncontext.get_admin_context_without_session()
         self.serializer = None
 
+        self.inventory = inventory.DeviceInventory(self.conf)
+        self.device_load = placement.DeviceLoad()
+
         filter_names = [name for name in self.conf.bigip_filters.split(",")]
-        self.scheduler = scheduler.BIGIPScheduler(filter_names)
+        self.scheduler = scheduler.BIGIPScheduler(filter_names,
+                                                  self.inventory,
+                                                  self.device_load)
+        self.rebalancer = rebalance.Rebalancer(self.conf, self.inventory,
+                                               self.device_load)
+        self._rebalancing = False
+        # Evacuation of each failed BIG-IP, the last one once finished
+        self._evacuations = {}
+        self._cleaning = False
 
         # TODO: replace this map with a db
         self._lb_bigip_map = {}
 
+        # Last loadbalancer graph successfully provisioned, which is the
+        # desired state drift detection compares the devices with
+        self._desired_state = {}
+        self.drift_detector = drift.DriftDetector(self.conf)
+
+        self.journal = None
+        if self.conf.journal_path:
+            self.journal = journal.OperationJournal(self.conf)
+            self._lb_bigip_map = self.journal.placements()
+            tenants = self.journal.tenants()
+            for lb_id, bigip_id in self._lb_bigip_map.items():
+                self.device_load.place(lb_id, bigip_id, tenants.get(lb_id))
+
+        self.rpc_recorder = None
+        if self.conf.rpc_record_path:
+            self.rpc_recorder = rpc_recorder.RPCRecorder(self.conf)
+
+        self.dispatcher = None
+        if self.conf.rpc_queue_workers > 0:
+            self.dispatcher = fair_queue.FairQueueDispatcher(self.conf)
+
+        self.write_behind = None
+        self._batch = threading.local()
+        if self.conf.write_behind_window > 0:
+            self.write_behind = write_behind.WriteBehind(self.conf,
+                                                         self._submit_batch)
+
         self.agent_host = self.conf.host + ":" + self.conf.agent_id
 
         global PERIODIC_TASK_INTERVAL
@@ -113,10 +179,22 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         # Setup RPC for communications to and from controller
         self._setup_rpc()
 
+        self.stats_reporter = stats_reporter.StatsReporter(self.conf,
+                                                           self.plugin_rpc)
+        self.member_health = member_health.MemberHealth(self.conf,
+                                                        self.plugin_rpc)
+        self.member_health.start()
+        self.reconciler = resync.Reconciler(self.conf, self.plugin_rpc)
+        self._last_resync = None
+
         # Mark this agent admin_state_up per startup policy
         if(self.admin_state_up):
             self.plugin_rpc.set_agent_admin_state(self.admin_state_up)
 
+        # Finish or roll back operations interrupted by the last shutdown
+        if self.journal:
+            self._recover_journal()
+
         # Start state reporting of agent to Neutron
         report_interval = self.conf.AGENT.report_interval
         if report_interval:
@@ -124,7 +202,13 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
                 self._report_state)
             heartbeat.start(interval=report_interval)
 
+        # Learn the desired state of our loadbalancers without holding
+        # up the RPC consumer
+        if self.conf.resync_on_startup:
+            eventlet.spawn_n(self._resync)
+
     def _setup_rpc(self):
+        from neutron.agent import rpc as agent_rpc
 
         # Setting up outbound (callbacks) communications from agent
 
@@ -143,6 +227,29 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         # Setting up outbound communcations with the neutron agent extension
         self.state_rpc = agent_rpc.PluginReportStateAPI(topic)
 
+    def _recover_journal(self):
+        inflight = self.journal.inflight()
+        if not inflight:
+            return
+
+        LOG.info("Recovering %d interrupted operations by %s",
+                 len(inflight), self.conf.journal_recovery)
+        for record in inflight:
+            method = record['method']
+            args = record['args']
+            try:
+                if self.conf.journal_recovery == "replay":
+                    getattr(self, method)(self.context, **args)
+                else:
+                    loadbalancer = args.get('loadbalancer')
+                    if loadbalancer:
+                        self._provision_done(loadbalancer, False)
+            except Exception as ex:
+                LOG.exception("Fail to recover operation %s: %s",
+                              method, ex.message)
+            finally:
+                self.journal.end(record['id'])
+
     def _report_state(self, force_resync=False):
         agent_admin_state = True
 
@@ -155,9 +262,43 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
             LOG.exception("Fail to communicate with BIG-IQ: %s",
                           str(ex.message))
 
+        if self.dispatcher:
+            self.agent_state['configurations']['rpc_queue'] = \
+                self.dispatcher.stats()
+        self.agent_state['configurations']['config_hash'] = \
+            config_cache.get_config_cache(self.conf).stats()
+        self.agent_state['configurations']['drift'] = \
+            self.drift_detector.stats()
+        self.agent_state['configurations']['request_latency'] = \
+            direct.get_direct_transport(self.conf).stats()
+        self.agent_state['configurations']['tracing'] = tracing.stats()
+        self.agent_state['configurations']['member_health'] = \
+            self.member_health.stats()
+        self.agent_state['configurations']['resync'] = \
+            self.reconciler.stats()
+        self.agent_state['configurations']['deadlines'] = \
+            deadline.stats()
+        self.agent_state['configurations']['l7'] = \
+            l7.get_l7_compiler().stats()
+        self.agent_state['configurations']['bigiq_endpoints'] = \
+            endpoints.get_endpoint_pool(self.conf).stats()
+        if self._evacuations:
+            self.agent_state['configurations']['evacuations'] = dict(
+                (bigip_id, progress.stats())
+                for bigip_id, progress in self._evacuations.items())
+        if self.rpc_recorder:
+            self.agent_state['configurations']['rpc_recorder'] = \
+                self.rpc_recorder.stats()
+        if self.conf.shared_objects:
+            self.agent_state['configurations']['shared_objects'] = \
+                shared.get_shared_objects().stats()
+        if self.write_behind:
+            self.agent_state['configurations']['write_behind'] = \
+                self.write_behind.stats()
+
         try:
             self.plugin_rpc.set_agent_admin_state(agent_admin_state)
-            LOG.debug("reporting state of agent as: %s" % self.agent_state)
+            LOG.debug("reporting state of agent as: %s", self.agent_state)
             self.state_rpc.report_state(self.context, self.agent_state)
             self.agent_state.pop('start_flag', None)
         except Exception as ex:
@@ -174,29 +315,525 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         endpoints = [started_by.manager]
         started_by.conn.create_consumer(
             node_topic, endpoints, fanout=False)
+        LOG.info("Consuming %s, %.3fs after process start", node_topic,
+                 time.time() - f5_lbaasv2_bigiq_agent.START_TIME)
 
     @periodic_task.periodic_task(
         spacing=PERIODIC_TASK_INTERVAL)
     def update_operating_status(self, context):
-        pass
+        if not self.member_health.poll_due():
+            return
+
+        bigiq = get_bigiq_mgr(self.conf)
+        for lb_id, bigip_id in list(self._lb_bigip_map.items()):
+            loadbalancer = self._desired_state.get(lb_id)
+            if loadbalancer is None:
+                continue
+            try:
+                for pool_id, member_id, state in \
+                        bigiq.get_member_status(bigip_id, loadbalancer):
+                    status = member_health.STATES.get(state)
+                    if status:
+                        self.member_health.update(pool_id, member_id,
+                                                  status)
+            except Exception as ex:
+                LOG.error("Fail to poll member status of loadbalancer "
+                          "%s: %s", lb_id, ex)
+
+    def _collect_loadbalancer_stats(self, bigiq, lb_id, bigip_id):
+        try:
+            stats = bigiq.get_loadbalancer_stats(bigip_id, {'id': lb_id})
+            if stats:
+                self.stats_reporter.offer(lb_id, stats)
+        except Exception as ex:
+            LOG.error("Fail to get stats of loadbalancer %s: %s",
+                      lb_id, ex.message)
+
+    @periodic_task.periodic_task(
+        spacing=PERIODIC_TASK_INTERVAL)
+    def report_loadbalancer_stats(self, context):
+        bigiq = get_bigiq_mgr(self.conf)
+        for lb_id, bigip_id in list(self._lb_bigip_map.items()):
+            self._collect_loadbalancer_stats(bigiq, lb_id, bigip_id)
+        try:
+            sent = self.stats_reporter.flush()
+            LOG.debug("Reported stats of %d loadbalancers", sent)
+        except Exception as ex:
+            LOG.exception("Fail to report loadbalancer stats: %s",
+                          ex.message)
+
+    @periodic_task.periodic_task(
+        spacing=PERIODIC_TASK_INTERVAL)
+    def refresh_inventory(self, context):
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            self.inventory.refresh(bigiq)
+        except Exception as ex:
+            LOG.exception("Fail to refresh BIG-IP inventory: %s", ex.message)
+
+    @periodic_task.periodic_task(
+        spacing=PERIODIC_TASK_INTERVAL)
+    def check_drift(self, context):
+        busy = self.dispatcher.busy if self.dispatcher else None
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            self.drift_detector.run(bigiq, dict(self._lb_bigip_map),
+                                    self._desired_state, skip=busy)
+        except Exception as ex:
+            LOG.exception("Fail to check configuration drift: %s", ex)
+
+    def _locate_partition(self, bigiq, loadbalancer):
+        """Return the BIG-IP holding the partition of a loadbalancer.
+
+        The devices of the tenant are looked up in uuid order. None
+        means that no device could be found to hold it.
+        """
+        bigips = self.scheduler.get_candidates(bigiq,
+                                               loadbalancer['tenant_id'])
+        # A partition on an evacuated BIG-IP may be a stale one
+        stale = self._stale_bigips()
+        for bigip_id in sorted(bigip['uuid'] for bigip in bigips):
+            if bigip_id in stale:
+                continue
+            if bigiq.get_partition_fingerprint(bigip_id, loadbalancer):
+                return bigip_id
+        return None
+
+    def _adopt_loadbalancer(self, loadbalancer):
+        """Recover where a loadbalancer the agent does not know lives.
+
+        It is never scheduled anew: its partition is looked up on the
+        devices of its tenant, and it is only placed where it is found.
+        Loadbalancers found nowhere are left alone for an operator.
+        """
+        lb_id = loadbalancer['id']
+        if lb_id in self._lb_bigip_map:
+            return
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigip_id = self._locate_partition(bigiq, loadbalancer)
+        except Exception as ex:
+            LOG.error("Fail to locate loadbalancer %s: %s", lb_id, ex)
+            return
+        if bigip_id is None:
+            LOG.warning("Cannot find the partition of loadbalancer %s on "
+                        "any BIG-IP of tenant %s, leave it unplaced",
+                        lb_id, loadbalancer['tenant_id'])
+            return
+        self._associate_lb_with_bigip(lb_id, bigip_id,
+                                      loadbalancer['tenant_id'])
+        self._desired_state[lb_id] = loadbalancer
+        LOG.info("Found loadbalancer %s on BIG-IP %s", lb_id, bigip_id)
+
+    def _adopt(self, loadbalancer):
+        if loadbalancer.get('provisioning_status') == \
+                constants.PENDING_DELETE:
+            return
+        if self.dispatcher:
+            self.dispatcher.submit(fair_queue.CREATE,
+                                   self._adopt_loadbalancer,
+                                   (loadbalancer,), {},
+                                   loadbalancer.get('tenant_id'),
+                                   loadbalancer['id'])
+        else:
+            self._adopt_loadbalancer(loadbalancer)
+
+    def _resync(self):
+        self._last_resync = time.time()
+        try:
+            self.reconciler.run(self._lb_bigip_map, self._desired_state,
+                                self._adopt)
+        except Exception as ex:
+            LOG.exception("Fail to reconcile with the plugin: %s", ex)
+
+    @periodic_task.periodic_task(
+        spacing=PERIODIC_TASK_INTERVAL)
+    def resync_loadbalancers(self, context):
+        interval = self.conf.resync_interval
+        if interval <= 0 or (self._last_resync is not None and
+                             time.time() - self._last_resync < interval):
+            return
+        self._resync()
+
+    @periodic_task.periodic_task(
+        spacing=PERIODIC_TASK_INTERVAL)
+    def save_config_hashes(self, context):
+        try:
+            config_cache.get_config_cache(self.conf).save()
+        except Exception as ex:
+            LOG.exception("Fail to save config hashes: %s", ex)
+
+    def _move_loadbalancer(self, bigiq, move):
+        loadbalancer = self._desired_state.get(move.lb_id)
+        if loadbalancer is None or \
+                self._lb_bigip_map.get(move.lb_id) != move.source:
+            # Deleted or moved since the plan was made
+            return
+
+        try:
+            drift.rebuild_partition(bigiq, move.target, loadbalancer)
+        except Exception as ex:
+            LOG.error("Fail to move loadbalancer %s to BIG-IP %s: %s",
+                      move.lb_id, move.target, ex)
+            return
+
+        self._associate_lb_with_bigip(move.lb_id, move.target,
+                                      move.tenant_id)
+        try:
+            drift.remove_partition(bigiq, move.source, loadbalancer)
+        except Exception as ex:
+            LOG.warning("Loadbalancer %s moved to BIG-IP %s, but its "
+                        "partition is left on BIG-IP %s: %s", move.lb_id,
+                        move.target, move.source, ex)
+
+    def _run_moves(self, bigiq, moves):
+        batch_size = max(1, self.conf.rebalance_batch_size)
+        for i in range(0, len(moves), batch_size):
+            batch = moves[i:i + batch_size]
+            if self.dispatcher:
+                # Moves go through the loadbalancer lanes, so they never
+                # run beside RPC work on the same loadbalancer.
+                done = eventlet_queue.LightQueue()
+                for move in batch:
+                    self.dispatcher.submit(
+                        fair_queue.UPDATE, self._move_loadbalancer,
+                        (bigiq, move), {}, move.tenant_id, move.lb_id,
+                        lambda: done.put(None))
+                for _ in batch:
+                    done.get()
+            else:
+                pool = eventlet.GreenPool(len(batch))
+                for move in batch:
+                    pool.spawn_n(self._move_loadbalancer, bigiq, move)
+                pool.waitall()
+            LOG.info("Rebalance moved %d of %d loadbalancers",
+                     min(i + batch_size, len(moves)), len(moves))
+
+    def _rebalance(self, max_moves):
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            moves = self.rebalancer.plan(
+                bigiq, [lb_id for lb_id in self._lb_bigip_map
+                        if lb_id in self._desired_state], max_moves,
+                exclude=self._stale_bigips())
+            LOG.info("Rebalance plans %d moves", len(moves))
+            self._run_moves(bigiq, moves)
+        except Exception as ex:
+            LOG.exception("Fail to rebalance loadbalancers: %s", ex)
+        finally:
+            self._rebalancing = False
+
+    @tracing.traced
+    def rebalance(self, context, max_moves=None, **kwargs):
+        """Handle RPC cast from an operator to even out BIG-IP load."""
+        if self._rebalancing:
+            LOG.warning("Rebalance already running")
+            return
+        self._rebalancing = True
+        eventlet.spawn_n(self._rebalance, max_moves)
+
+    def _restore_load(self, lb_id):
+        # Count a loadbalancer on the BIG-IP it is placed on again, after
+        # it was counted on the target of a move that did not happen
+        bigip_id = self._lb_bigip_map.get(lb_id)
+        if bigip_id is None:
+            self.device_load.unplace(lb_id)
+        else:
+            self.device_load.place(lb_id, bigip_id,
+                                   self.device_load.tenant(lb_id))
+
+    def _evacuate_loadbalancer(self, bigiq, progress, lb_id, target):
+        loadbalancer = self._desired_state.get(lb_id)
+        if loadbalancer is None or \
+                self._lb_bigip_map.get(lb_id) != progress.bigip_id:
+            # Deleted or moved while queued
+            self._restore_load(lb_id)
+            progress.skip(lb_id)
+            return
+
+        try:
+            with progress.slot(target):
+                drift.rebuild_partition(bigiq, target, loadbalancer)
+        except Exception as ex:
+            LOG.error("Fail to evacuate loadbalancer %s to BIG-IP %s: %s",
+                      lb_id, target, ex)
+            self._restore_load(lb_id)
+            progress.fail(loadbalancer)
+            return
+
+        # The partition on the failed BIG-IP cannot be reached, it is
+        # removed once the device is back
+        self._associate_lb_with_bigip(lb_id, target,
+                                      loadbalancer['tenant_id'])
+        progress.moved_to(loadbalancer, target)
+
+    def _start_evacuation(self, bigiq, progress, lb_id, done):
+        loadbalancer = self._desired_state.get(lb_id)
+        if loadbalancer is None or \
+                self._lb_bigip_map.get(lb_id) != progress.bigip_id:
+            progress.skip(lb_id)
+            done()
+            return
+
+        try:
+            target = self._pick_bigip(bigiq, loadbalancer,
+                                      exclude=progress.bigip_id)
+        except Exception as ex:
+            LOG.error("Fail to pick a BIG-IP for loadbalancer %s: %s",
+                      lb_id, ex)
+            target = None
+        if target is None:
+            progress.fail(loadbalancer)
+            done()
+            return
+
+        # Count it on its target right away, so that spreading filters
+        # see the loadbalancers still being rebuilt
+        self.device_load.place(lb_id, target, loadbalancer['tenant_id'])
+        if self.dispatcher:
+            # Evacuations go through the loadbalancer lanes, so they never
+            # run beside RPC work on the same loadbalancer.
+            self.dispatcher.submit(
+                fair_queue.UPDATE, self._evacuate_loadbalancer,
+                (bigiq, progress, lb_id, target), {},
+                loadbalancer['tenant_id'], lb_id, done)
+            return
+
+        def evacuate():
+            try:
+                self._evacuate_loadbalancer(bigiq, progress, lb_id, target)
+            finally:
+                done()
+        eventlet.spawn_n(evacuate)
+
+    def _fetch_desired_state(self, lb_ids):
+        """Fetch the graphs of loadbalancers not resynced since startup."""
+        missing = [lb_id for lb_id in lb_ids
+                   if lb_id not in self._desired_state]
+        page_size = max(1, self.conf.resync_page_size)
+        for i in range(0, len(missing), page_size):
+            try:
+                services = self.plugin_rpc.get_service_definitions(
+                    missing[i:i + page_size],
+                    timeout=self.conf.resync_rpc_timeout)
+            except Exception as ex:
+                # Those loadbalancers are skipped, the others still move
+                LOG.error("Fail to fetch %d loadbalancers to evacuate: %s",
+                          len(missing[i:i + page_size]), ex)
+                continue
+            for loadbalancer in services or []:
+                if loadbalancer['id'] in self._lb_bigip_map:
+                    self._desired_state.setdefault(loadbalancer['id'],
+                                                   loadbalancer)
+
+    def _evacuate(self, progress, lb_ids, op_id):
+        concurrency = max(1, self.conf.evacuation_concurrency)
+        slots = semaphore.Semaphore(concurrency)
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            self._fetch_desired_state(lb_ids)
+            LOG.info("Evacuate %d loadbalancers off BIG-IP %s",
+                     len(lb_ids), progress.bigip_id)
+            for lb_id in lb_ids:
+                slots.acquire()
+                self._start_evacuation(bigiq, progress, lb_id, slots.release)
+        except Exception as ex:
+            LOG.exception("Fail to evacuate BIG-IP %s: %s",
+                          progress.bigip_id, ex)
+        finally:
+            # Wait for the last loadbalancers
+            for _ in range(concurrency):
+                slots.acquire()
+            progress.finish()
+            journal.end_operation(self, op_id)
+
+    @tracing.traced
+    def evacuate(self, context, bigip_id, **kwargs):
+        """Handle RPC cast from an operator to empty a failed BIG-IP.
+
+        Every loadbalancer placed on the BIG-IP is rebuilt on another one
+        the scheduler picks. The evacuation is journaled, so that one cut
+        short by a restart resumes with the loadbalancers left, when
+        journal_recovery is replay; casting it again does the same.
+        """
+        previous = self._evacuations.get(bigip_id)
+        if previous is not None and previous.running:
+            LOG.warning("Evacuation of BIG-IP %s already running", bigip_id)
+            return
+
+        lb_ids = sorted(lb_id for lb_id, placed in self._lb_bigip_map.items()
+                        if placed == bigip_id)
+        progress = evacuation.Evacuation(self.conf, self.plugin_rpc,
+                                         bigip_id, lb_ids)
+        if previous is not None:
+            progress.stale.update(previous.stale)
+        self._evacuations[bigip_id] = progress
+        op_id = journal.begin_operation(self, "evacuate",
+                                        {'bigip_id': bigip_id})
+        eventlet.spawn_n(self._evacuate, progress, lb_ids, op_id)
+
+    def _stale_bigips(self):
+        """Return the evacuated BIG-IPs still holding stale partitions.
+
+        They take no loadbalancers until those are removed.
+        """
+        return set(bigip_id for bigip_id, progress
+                   in list(self._evacuations.items()) if progress.stale)
+
+    def _remove_stale_partition(self, bigiq, progress, lb_id):
+        if self._lb_bigip_map.get(lb_id) != progress.bigip_id:
+            try:
+                drift.remove_partition(bigiq, progress.bigip_id,
+                                       progress.stale[lb_id])
+            except Exception as ex:
+                LOG.error("Fail to remove stale partition of loadbalancer "
+                          "%s from BIG-IP %s: %s", lb_id, progress.bigip_id,
+                          ex)
+                return
+        progress.cleaned(lb_id)
+
+    def _clean_evacuated(self, progresses):
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            pool = eventlet.GreenPool(max(1, self.conf.evacuation_concurrency))
+            for progress in progresses:
+                for lb_id in sorted(progress.stale):
+                    pool.spawn_n(self._remove_stale_partition, bigiq,
+                                 progress, lb_id)
+                pool.waitall()
+                if not progress.stale:
+                    LOG.info("Removed stale partitions from BIG-IP %s, "
+                             "which takes loadbalancers again",
+                             progress.bigip_id)
+        except Exception as ex:
+            LOG.exception("Fail to remove stale partitions: %s", ex)
+        finally:
+            self._cleaning = False
+
+    @periodic_task.periodic_task(
+        spacing=PERIODIC_TASK_INTERVAL)
+    def clean_evacuated_bigips(self, context):
+        """Remove the partitions evacuations left on recovered BIG-IPs."""
+        if self._cleaning:
+            return
+        progresses = []
+        for bigip_id, progress in list(self._evacuations.items()):
+            device = self.inventory.get_device(bigip_id) or {}
+            if progress.stale and not progress.running and \
+                    device.get('state') == "ACTIVE":
+                progresses.append(progress)
+        if progresses:
+            self._cleaning = True
+            eventlet.spawn_n(self._clean_evacuated, progresses)
+
+    def _submit_batch(self, loadbalancer, changes):
+        op_ids = [op_id for change in changes for op_id in change.op_ids]
+
+        def done():
+            for op_id in op_ids:
+                journal.end_operation(self, op_id)
+
+        limit = deadline.start(self.conf, fair_queue.UPDATE)
+        if self.dispatcher is None:
+            try:
+                with deadline.scope(limit):
+                    self._apply_batch(loadbalancer, changes)
+            finally:
+                done()
+            return
+
+        self.dispatcher.submit(fair_queue.UPDATE, self._apply_batch,
+                               (loadbalancer, changes), {},
+                               loadbalancer.get('tenant_id'),
+                               loadbalancer['id'], done, limit,
+                               lambda: self._report_batch(loadbalancer,
+                                                          changes, changes))
+
+    def _apply_batch(self, loadbalancer, changes):
+        """Apply collected changes of a loadbalancer, then report once.
+
+        Each change runs its bare handler against the latest loadbalancer
+        graph, unless it deletes the child of an object deleted in the
+        same batch. Objects whose change failed get an ERROR status of
+        their own, objects created and deleted within the batch or going
+        along with a deleted parent are only reported destroyed, and the
+        loadbalancer gets a single status for the batch.
+        """
+        failed = []
+        self._batch.active = True
+        try:
+            for change in changes:
+                if change.op == write_behind.CANCEL:
+                    continue
+                handler = getattr(type(self), change.method).unjournaled
+                kwargs = change.kwargs if change.own_graph else \
+                    dict(change.kwargs, loadbalancer=loadbalancer)
+                self._batch.failed = False
+                try:
+                    handler(self, self.context, **kwargs)
+                except Exception as ex:
+                    LOG.error("Fail to %s %s: %s", change.method,
+                              change.obj['id'], ex)
+                    self._batch.failed = True
+                if self._batch.failed:
+                    failed.append(change)
+        finally:
+            self._batch.active = False
+        self._report_batch(loadbalancer, changes, failed)
+
+    def _report_batch(self, loadbalancer, changes, failed):
+        for change in changes:
+            if change.op != write_behind.CANCEL:
+                continue
+            try:
+                getattr(self.plugin_rpc, "%s_destroyed" % change.kind)(
+                    change.obj['id'])
+            except Exception as ex:
+                LOG.exception("Fail to report %s destroyed: %s",
+                              change.kind, ex)
+        failed = [change for change in failed
+                  if change.op != write_behind.CANCEL]
+        for change in failed:
+            try:
+                getattr(self.plugin_rpc, "update_%s_status" % change.kind)(
+                    change.obj['id'], provisioning_status=constants.ERROR)
+            except Exception as ex:
+                LOG.exception("Fail to update %s status: %s",
+                              change.kind, ex)
+        LOG.debug("Applied %d changes of loadbalancer %s, %d failed",
+                  len(changes), loadbalancer['id'], len(failed))
+        self._provision_done(loadbalancer, not failed)
+
+    @tracing.traced
+    def profile(self, context, duration=None, **kwargs):
+        """Handle RPC cast from an operator to profile the agent."""
+        profiler.get_profiler(self.conf).start(duration)
 
     ######################################################################
     #
     # handlers for all in bound requests and notifications from controller
     #
     ######################################################################
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @tracing.traced
     def agent_updated(self, context, payload):
         """Handle the agent_updated notification event."""
         pass
 
-    def _associate_lb_with_bigip(self, lb_id, bigip_id):
+    def _associate_lb_with_bigip(self, lb_id, bigip_id, tenant_id=None):
         # TODO: implement a db to save it
         self._lb_bigip_map[lb_id] = bigip_id
+        self.device_load.place(lb_id, bigip_id, tenant_id)
+        if self.journal:
+            self.journal.place(lb_id, bigip_id, tenant_id)
 
     def _deassociate_lb_with_bigip(self, lb_id):
         # TODO: implement a db to save it
         del self._lb_bigip_map[lb_id]
+        self.device_load.unplace(lb_id)
+        self._desired_state.pop(lb_id, None)
+        if self.journal:
+            self.journal.unplace(lb_id)
 
     def _lookup_associated_bigip(self, lb_id):
         # TODO: implement a db to find it
@@ -206,51 +843,108 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
                       lb_id)
         return bigip_id
 
+    def _pick_bigip(self, bigiq, loadbalancer, exclude=None):
+        """Pick a BIG-IP for a loadbalancer, other than exclude.
+
+        BIG-IPs still holding stale partitions are never picked.
+        """
+        lb_id = loadbalancer['id']
+        tenant_id = loadbalancer['tenant_id']
+        stale = self._stale_bigips()
+        bigips = [bigip for bigip in
+                  self.scheduler.get_candidates(bigiq, tenant_id)
+                  if bigip['uuid'] != exclude and bigip['uuid'] not in stale]
+
+        if len(bigips) == 0:
+            LOG.error("No eligibale BIG-IP for tenant %s", tenant_id)
+            return None
+
+        candidates = self.scheduler.schedule(bigips, loadbalancer)
+        if len(candidates) == 0:
+            LOG.error("No eligibale BIG-IP for loadbalancer %s", lb_id)
+            return None
+
+        # Filters which do not pick a single BIG-IP leave the choice to
+        # the lowest uuid, the same on every run.
+        return min(bigip['uuid'] for bigip in candidates)
+
+    def _schedule_loadbalancer(self, bigiq, loadbalancer):
+        """Pick a BIG-IP for a loadbalancer and associate it."""
+        bigip_id = self._pick_bigip(bigiq, loadbalancer)
+        if bigip_id is not None:
+            self._associate_lb_with_bigip(loadbalancer['id'], bigip_id,
+                                          loadbalancer['tenant_id'])
+        return bigip_id
+
+    def _operation_expired(self, method, kwargs):
+        """Fail an operation dropped from the queue past its deadline."""
+        kind = method.split("_", 1)[1]
+        obj = kwargs.get(kind)
+        if kind != "loadbalancer" and obj:
+            try:
+                update_status = getattr(self.plugin_rpc,
+                                        "update_%s_status" % kind)
+                if kind == "l7rule":
+                    update_status(obj['id'], obj.get('policy_id'),
+                                  provisioning_status=constants.ERROR)
+                else:
+                    update_status(obj['id'],
+                                  provisioning_status=constants.ERROR)
+            except Exception as ex:
+                LOG.exception("Fail to update %s status: %s", kind, ex)
+
+        loadbalancer = kwargs.get('loadbalancer')
+        if loadbalancer:
+            self._provision_done(loadbalancer, False)
+
     def _provision_done(self, loadbalancer, done=True, **kwargs):
+        if getattr(self._batch, "active", False):
+            # Applying a write-behind batch, which reports once for all
+            # its changes
+            if not done:
+                self._batch.failed = True
+            return
+
         if done:
             p_status = constants.ACTIVE
             o_status = constants.ONLINE
+            if loadbalancer['id'] in self._lb_bigip_map:
+                self._desired_state[loadbalancer['id']] = loadbalancer
         else:
             p_status = constants.ERROR
             o_status = loadbalancer['operating_status']
 
+        if self.rpc_recorder:
+            self.rpc_recorder.status(loadbalancer['id'], p_status)
         try:
             self.plugin_rpc.update_loadbalancer_status(
                 loadbalancer['id'], p_status, o_status)
         except Exception as ex:
             LOG.exception("Fail to update loadbalancer status: %s", ex.message)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_loadbalancer(self, context, loadbalancer, **kwargs):
         """Handle RPC cast from plugin to create_loadbalancer."""
-        lb_id = loadbalancer['id']
-        tenant_id = loadbalancer['tenant_id']
-        bigiq = get_bigiq_mgr(self.conf)
-        bigips = bigiq.get_devices_in_tenant_device_group(tenant_id)
-
-        if len(bigips) == 0:
-            LOG.error("No eligibale BIG-IP for tenant %s", tenant_id)
-            self._provision_done(loadbalancer, False)
-            return
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigip_id = self._schedule_loadbalancer(bigiq, loadbalancer)
+            if bigip_id is None:
+                self._provision_done(loadbalancer, False)
+                return
 
-        candidates = self.scheduler.schedule(bigips)
-        if len(candidates) == 0:
-            LOG.error("No eligibale BIG-IP for loadbalancer %s", lb_id)
-            self._provision_done(loadbalancer, False)
-        elif len(bigips) > 1:
-            LOG.error("Several eligibale BIG-IPs for loadbalancer %s", lb_id)
+            bigiq.create_loadbalancer(bigip_id, loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
             self._provision_done(loadbalancer, False)
-        else:
-            bigip_id = candidates[0]['uuid']
-            self._associate_lb_with_bigip(lb_id, bigip_id)
-            try:
-                bigiq = get_bigiq_mgr(self.conf)
-                bigiq.create_loadbalancer(bigip_id, loadbalancer)
-                self._provision_done(loadbalancer)
-            except Exception:
-                self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.flushing
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_loadbalancer(self, context, old_loadbalancer,
                             loadbalancer, **kwargs):
         """Handle RPC cast from plugin to update_loadbalancer."""
@@ -268,7 +962,11 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         except Exception:
             self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.flushing
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_loadbalancer(self, context, loadbalancer, **kwargs):
         """Handle RPC cast from plugin to delete_loadbalancer."""
         lb_id = loadbalancer['id']
@@ -282,16 +980,33 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
             bigiq = get_bigiq_mgr(self.conf)
             bigiq.delete_loadbalancer(bigip_id, loadbalancer)
             self._deassociate_lb_with_bigip(lb_id)
+            self.stats_reporter.forget(lb_id)
+            self.member_health.forget(loadbalancer)
+            if self.rpc_recorder:
+                self.rpc_recorder.status(lb_id, rpc_recorder.DESTROYED)
             self.plugin_rpc.loadbalancer_destroyed(lb_id)
         except Exception:
             self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @fair_queue.queued(fair_queue.STATS)
+    @tracing.traced
     def update_loadbalancer_stats(self, context, loadbalancer, **kwarg):
         """Handle RPC cast from plugin to get stats."""
-        pass
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+        if bigip_id is None:
+            return
 
-    @log_helpers.log_method_call
+        bigiq = get_bigiq_mgr(self.conf)
+        self._collect_loadbalancer_stats(bigiq, lb_id, bigip_id)
+        self.stats_reporter.flush()
+
+    @rpc_recorder.recorded
+    @write_behind.batched("listener", write_behind.CREATE)
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_listener(self, context, listener, **kwarg):
         """Handle RPC cast from plugin to create_listener."""
         loadbalancer = kwarg['loadbalancer']
@@ -309,13 +1024,34 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         except Exception:
             self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.batched("listener", write_behind.UPDATE)
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_listener(self, context, old_listener, listener, **kwarg):
         """Handle RPC cast from plugin to update_listener."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
 
-    @log_helpers.log_method_call
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.update_listener(bigip_id, listener, loadbalancer,
+                                  old_listener=old_listener)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("listener", write_behind.DELETE)
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_listener(self, context, listener, **kwarg):
         """Handle RPC cast from plugin to delete_listener."""
         loadbalancer = kwarg['loadbalancer']
@@ -334,98 +1070,329 @@ class F5BIGIQAgentManager(periodic_task.PeriodicTasks):
         except Exception:
             self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @staticmethod
+    def _member_pool(member):
+        # The graph sent along may not list the member yet, its pool_id
+        # tells the pool it goes in
+        if member.get('pool_id'):
+            return {'pool': {'id': member['pool_id']}}
+        return {}
+
+    @rpc_recorder.recorded
+    @write_behind.batched("pool", write_behind.CREATE)
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_pool(self, context, pool, **kwarg):
         """Handle RPC cast from plugin to create_pool."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
 
-    @log_helpers.log_method_call
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.create_pool(bigip_id, pool, loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("pool", write_behind.UPDATE)
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_pool(self, context, old_pool, pool, **kwarg):
         """Handle RPC cast from plugin to update_pool."""
         loadbalancer = kwarg['loadbalancer']
         self._provision_done(loadbalancer)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.batched("pool", write_behind.DELETE)
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_pool(self, context, pool, **kwarg):
         """Handle RPC cast from plugin to delete_pool."""
         loadbalancer = kwarg['loadbalancer']
-        self.plugin_rpc.pool_destroyed(pool['id'])
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.delete_pool(bigip_id, pool, loadbalancer)
+            self.member_health.forget_pool(pool['id'])
+            self.plugin_rpc.pool_destroyed(pool['id'])
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.batched("member", write_behind.CREATE)
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_member(self, context, member, **kwarg):
         """Handle RPC cast from plugin to create_member."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
 
-    @log_helpers.log_method_call
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.create_member(bigip_id, member, loadbalancer,
+                                **self._member_pool(member))
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("member", write_behind.UPDATE)
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_member(self, context, old_member, member, **kwarg):
         """Handle RPC cast from plugin to update_member."""
         loadbalancer = kwarg['loadbalancer']
         self._provision_done(loadbalancer)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.batched("member", write_behind.DELETE)
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_member(self, context, member, **kwarg):
         """Handle RPC cast from plugin to delete_member."""
         loadbalancer = kwarg['loadbalancer']
-        self.plugin_rpc.member_destroyed(member['id'])
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
 
-    @log_helpers.log_method_call
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.delete_member(bigip_id, member, loadbalancer,
+                                **self._member_pool(member))
+            self.member_health.forget_member(member['id'])
+            self.plugin_rpc.member_destroyed(member['id'])
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("health_monitor", write_behind.CREATE)
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_health_monitor(self, context, health_monitor, **kwarg):
         """Handle RPC cast from plugin to create_pool_health_monitor."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.create_health_monitor(bigip_id, health_monitor,
+                                        loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.batched("health_monitor", write_behind.UPDATE)
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_health_monitor(self, context, old_health_monitor,
                               health_monitor, **kwarg):
         """Handle RPC cast from plugin to update_health_monitor."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
 
-    @log_helpers.log_method_call
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.update_health_monitor(bigip_id, health_monitor,
+                                        loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("health_monitor", write_behind.DELETE)
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_health_monitor(self, context, health_monitor, **kwarg):
         """Handle RPC cast from plugin to delete_health_monitor."""
         loadbalancer = kwarg['loadbalancer']
-        self.plugin_rpc.health_monitor_destroyed(health_monitor['id'])
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
 
-    @log_helpers.log_method_call
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.delete_heath_monitor(bigip_id, health_monitor,
+                                       loadbalancer)
+            self.plugin_rpc.health_monitor_destroyed(health_monitor['id'])
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("l7policy", write_behind.CREATE)
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_l7policy(self, context, l7policy, **kwarg):
         """Handle RPC cast from plugin to create_l7policy."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
 
-    @log_helpers.log_method_call
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.create_l7policy(bigip_id, l7policy, loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.batched("l7policy", write_behind.UPDATE)
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_l7policy(self, context, old_l7policy, l7policy, **kwarg):
         """Handle RPC cast from plugin to update_l7policy."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.update_l7policy(bigip_id, l7policy, loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.batched("l7policy", write_behind.DELETE)
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_l7policy(self, context, l7policy, **kwarg):
         """Handle RPC cast from plugin to delete_l7policy."""
         loadbalancer = kwarg['loadbalancer']
-        self.plugin_rpc.l7policy_destroyed(l7policy['id'])
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.delete_l7policy(bigip_id, l7policy, loadbalancer)
+            self.plugin_rpc.l7policy_destroyed(l7policy['id'])
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
 
-    @log_helpers.log_method_call
+    @rpc_recorder.recorded
+    @write_behind.flushing
+    @fair_queue.queued(fair_queue.CREATE)
+    @journal.journaled
+    @tracing.traced
     def create_l7rule(self, context, l7rule, **kwarg):
         """Handle RPC cast from plugin to create_l7rule."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
 
-    @log_helpers.log_method_call
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.create_l7rule(bigip_id, l7rule, loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.flushing
+    @fair_queue.queued(fair_queue.UPDATE)
+    @journal.journaled
+    @tracing.traced
     def update_l7rule(self, context, old_l7rule, l7rule, **kwarg):
         """Handle RPC cast from plugin to update_l7rule."""
         loadbalancer = kwarg['loadbalancer']
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
 
-    @log_helpers.log_method_call
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.update_l7rule(bigip_id, l7rule, loadbalancer)
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
+
+    @rpc_recorder.recorded
+    @write_behind.flushing
+    @fair_queue.queued(fair_queue.DELETE)
+    @journal.journaled
+    @tracing.traced
     def delete_l7rule(self, context, l7rule, **kwarg):
         """Handle RPC cast from plugin to delete_l7rule."""
         loadbalancer = kwarg['loadbalancer']
-        self.plugin_rpc.l7rule_destroyed(l7rule['id'])
-        self._provision_done(loadbalancer)
+        lb_id = loadbalancer['id']
+        bigip_id = self._lookup_associated_bigip(lb_id)
+
+        if bigip_id is None:
+            self._provision_done(loadbalancer, False)
+            return
+
+        try:
+            bigiq = get_bigiq_mgr(self.conf)
+            bigiq.delete_l7rule(bigip_id, l7rule, loadbalancer)
+            self.plugin_rpc.l7rule_destroyed(l7rule['id'])
+            self._provision_done(loadbalancer)
+        except Exception:
+            self._provision_done(loadbalancer, False)
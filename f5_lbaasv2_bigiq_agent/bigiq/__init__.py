@@ -1,9 +1,24 @@
-from .as3 import BIGIQManagerAS3
-from .icontrol import BIGIQManagerIControl
+_mgr_factory = None
+
+
+def set_bigiq_mgr_factory(factory):
+    """Build BIG-IQ managers with factory instead of by deploy mode.
+
+    Tools which drive the agent against a simulated BIG-IQ use it.
+    """
+    global _mgr_factory
+    _mgr_factory = factory
 
 
 def get_bigiq_mgr(conf):
+    if _mgr_factory is not None:
+        return _mgr_factory(conf)
+
+    # Deploy mode managers import the f5sdk client, which is slow to
+    # import; load them when BIG-IQ is first used.
     if conf.deploy_mode == "as3":
+        from .as3 import BIGIQManagerAS3
         return BIGIQManagerAS3(conf)
     else:
+        from .icontrol import BIGIQManagerIControl
         return BIGIQManagerIControl(conf)
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from .templates import RawBody
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.BoolOpt(
+        "config_hash_skip",
+        default=False,
+        help=("Skip BIG-IQ requests whose body is identical to the last "
+              "one successfully applied to the same resource. A resource "
+              "changed or removed on the BIG-IP behind the agent's back "
+              "is then only fixed by drift detection, or once a request "
+              "to it fails, which drops its hash")
+    ),
+    cfg.StrOpt(
+        "config_hash_path",
+        default=None,
+        help=("File where applied configuration hashes are persisted "
+              "across restarts. Leave it unset to keep them in memory")
+    )
+]
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def body_hash(body):
+    """Return a stable hash of a request body or AS3 declaration."""
+    if isinstance(body, RawBody):
+        return body.hash
+    data = json.dumps(body, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class ConfigHashCache(object):
+    """Hashes of the configuration last applied to each resource.
+
+    Hashes are grouped by scope, the BIG-IP and partition a resource
+    lives in, and keyed by the iControl URI of the resource or by the
+    partition itself in AS3 mode. A key is only recorded after BIG-IQ
+    accepted the body, and is dropped when the resource is deleted, a
+    request to it fails, or it is found to have drifted.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.path = conf.config_hash_path
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._dirty = False
+        self._skipped = 0
+        self._applied = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as fd:
+                self._hashes = json.load(fd)
+        except (IOError, ValueError) as ex:
+            LOG.warning("Ignore unreadable config hashes %s: %s",
+                        self.path, ex)
+
+    def save(self):
+        """Persist the hashes if they changed since the last save."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            hashes = dict(self._hashes)
+            self._dirty = False
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as fd:
+            json.dump(hashes, fd, separators=(',', ':'))
+        os.rename(tmp_path, self.path)
+
+    def unchanged(self, scope, key, body):
+        """Tell whether body was already applied to key, and count it."""
+        if not self.conf.config_hash_skip:
+            return False
+        if self._hashes.get(scope, {}).get(key) == body_hash(body):
+            self._skipped += 1
+            return True
+        return False
+
+    def applied(self, scope, key, body):
+        with self._lock:
+            self._hashes.setdefault(scope, {})[key] = body_hash(body)
+            self._dirty = True
+        self._applied += 1
+
+    def forget(self, scope, key):
+        """Forget a resource a request failed on, which may have changed."""
+        with self._lock:
+            if self._hashes.get(scope, {}).pop(key, None) is not None:
+                self._dirty = True
+
+    def invalidate(self, scope, key=None):
+        """Forget a resource and every resource below it.
+
+        Without a key, every resource of the scope is forgotten.
+        """
+        with self._lock:
+            hashes = self._hashes.get(scope)
+            if not hashes:
+                return
+            if key is None:
+                del self._hashes[scope]
+            else:
+                for k in [k for k in hashes
+                          if k == key or k.startswith(key + "/")]:
+                    del hashes[k]
+            self._dirty = True
+
+    def stats(self):
+        total = self._skipped + self._applied
+        return {
+            'skipped': self._skipped,
+            'applied': self._applied,
+            'skip_ratio': round(float(self._skipped) / total, 3)
+            if total else 0.0
+        }
+
+
+def scope(bigip_id, partition):
+    return bigip_id + "/" + partition
+
+
+def get_config_cache(conf):
+    """Return the config hash cache shared by all BIG-IQ managers."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ConfigHashCache(conf)
+    return _cache
@@ -0,0 +1,236 @@
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5sdk.exceptions import HTTPError
+
+from f5_lbaasv2_bigiq_agent import deadline
+
+from . import stream as bigiq_stream
+from . import templates
+from .manager import bigip_root
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.BoolOpt(
+        "bigip_direct",
+        default=False,
+        help=("Send iControl requests straight to the BIG-IP management "
+              "address instead of through the BIG-IQ rest-proxy, falling "
+              "back to the rest-proxy when the BIG-IP cannot be reached")
+    ),
+    cfg.StrOpt(
+        "bigip_user",
+        default="admin",
+        help=("BIG-IP username for direct requests")
+    ),
+    cfg.StrOpt(
+        "bigip_password",
+        default="admin",
+        secret=True,
+        help=("BIG-IP password for direct requests")
+    ),
+    cfg.IntOpt(
+        "bigip_direct_pool_size",
+        default=8,
+        help=("Connections kept open to each BIG-IP for direct requests")
+    ),
+    cfg.IntOpt(
+        "bigip_direct_timeout",
+        default=30,
+        help=("Seconds to wait for a BIG-IP to answer a direct request")
+    ),
+    cfg.IntOpt(
+        "bigip_direct_retry_interval",
+        default=300,
+        help=("Seconds the rest-proxy is used for a BIG-IP after a direct "
+              "request to it failed")
+    ),
+    cfg.BoolOpt(
+        "bigip_direct_verify",
+        default=False,
+        help=("Check the certificate of each BIG-IP on direct requests")
+    ),
+    cfg.StrOpt(
+        "bigip_direct_ca_bundle",
+        default=None,
+        help=("CA bundle the certificates of the BIG-IPs are checked "
+              "against when bigip_direct_verify is set, instead of the "
+              "system CAs")
+    )
+]
+
+PROXY_PREFIX = "/rest-proxy"
+
+DIRECT = "direct"
+PROXY = "proxy"
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+class DirectUnavailable(Exception):
+    pass
+
+
+class _Device(object):
+    __slots__ = ("address", "session", "token", "failed_at")
+
+    def __init__(self, address):
+        self.address = address
+        self.session = None
+        self.token = None
+        self.failed_at = None
+
+
+class DirectTransport(object):
+    """Send iControl requests straight to BIG-IP devices.
+
+    The management address of a BIG-IP is looked up through BIG-IQ the
+    first time the device is used. Each device gets its own pooled HTTP
+    session, authenticated with a token. When a device cannot be reached
+    directly, the caller falls back to the rest-proxy, which is then used
+    for that device until bigip_direct_retry_interval has passed.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._latency = {}
+
+    def _device(self, bigiq, bigip_id):
+        device = self._devices.get(bigip_id)
+        if device is None:
+            resp = bigiq.make_request(bigip_root + bigip_id, method="GET")
+            device = _Device(resp["address"])
+            with self._lock:
+                self._devices.setdefault(bigip_id, device)
+        return device
+
+    def _session(self, device):
+        if device.session is None:
+            import requests
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=self.conf.bigip_direct_pool_size)
+            session.mount("https://", adapter)
+            session.verify = bigiq_stream.verify_setting(
+                self.conf.bigip_direct_verify,
+                self.conf.bigip_direct_ca_bundle)
+            device.session = session
+        return device.session
+
+    def _login(self, device):
+        resp = self._session(device).post(
+            "https://%s/mgmt/shared/authn/login" % device.address,
+            json={"username": self.conf.bigip_user,
+                  "password": self.conf.bigip_password,
+                  "loginProviderName": "tmos"},
+            timeout=deadline.timeout(self.conf.bigip_direct_timeout))
+        resp.raise_for_status()
+        device.token = resp.json()["token"]["token"]
+
+    def _send(self, device, method, url, body, stream=False):
+        payload = {"json": body}
+        headers = {}
+        if isinstance(body, templates.RawBody):
+            # Sent as serialized ahead of time
+            payload = {"data": body.data}
+            headers = {"Content-Type": templates.RAW_CONTENT_TYPE}
+
+        if device.token is None:
+            self._login(device)
+        headers["X-F5-Auth-Token"] = device.token
+        resp = self._session(device).request(
+            method, url, headers=headers,
+            timeout=deadline.timeout(self.conf.bigip_direct_timeout),
+            stream=stream, **payload)
+        if resp.status_code == 401:
+            resp.close()
+            self._login(device)
+            headers["X-F5-Auth-Token"] = device.token
+            resp = self._session(device).request(
+                method, url, headers=headers,
+                timeout=deadline.timeout(self.conf.bigip_direct_timeout),
+                stream=stream, **payload)
+        return resp
+
+    def available(self, bigip_id):
+        device = self._devices.get(bigip_id)
+        if device is None or device.failed_at is None:
+            return True
+        return time.time() - device.failed_at >= \
+            self.conf.bigip_direct_retry_interval
+
+    def request(self, bigiq, bigip_id, path, method="GET",
+                body=None, stream=False):
+        """Send a request to a BIG-IP iControl path.
+
+        The address of the BIG-IP is looked up through bigiq, the BIG-IQ
+        endpoint the request would otherwise go through.
+        HTTP errors are raised as f5sdk HTTPError, like the rest-proxy
+        does. DirectUnavailable is raised when the device cannot be used
+        directly. With stream, the response body is returned unparsed,
+        as an iterator of byte chunks.
+        """
+        try:
+            device = self._device(bigiq, bigip_id)
+            url = "https://%s%s" % (device.address, path)
+            resp = self._send(device, method, url, body, stream)
+        except deadline.DeadlineExceeded:
+            # The device is fine, the operation ran out of time
+            raise
+        except Exception as ex:
+            limit = deadline.current()
+            if limit is not None and limit.expired():
+                raise limit.error()
+            with self._lock:
+                device = self._devices.get(bigip_id)
+                if device:
+                    device.failed_at = time.time()
+                    device.token = None
+            LOG.warning("Fail to reach BIG-IP %s directly, use the "
+                        "rest-proxy: %s", bigip_id, ex)
+            raise DirectUnavailable(str(ex))
+
+        device.failed_at = None
+        if resp.status_code >= 400:
+            raise HTTPError(
+                "Bad request for URL: %s code: %s reason: %s body: %s" % (
+                    url, resp.status_code, resp.reason, resp.text))
+        if stream:
+            return bigiq_stream.iter_content(resp)
+        if resp.status_code == 204 or not resp.content:
+            return None
+        return resp.json()
+
+    def record(self, path_type, elapsed):
+        with self._lock:
+            count, total, worst = self._latency.get(path_type, (0, 0.0, 0.0))
+            self._latency[path_type] = (count + 1, total + elapsed,
+                                        max(worst, elapsed))
+
+    def stats(self):
+        """Return request count and latency of each path type."""
+        with self._lock:
+            return dict(
+                (path_type, {'requests': count,
+                             'avg_latency': round(total / count, 3),
+                             'max_latency': round(worst, 3)})
+                for path_type, (count, total, worst)
+                in self._latency.items())
+
+
+def get_direct_transport(conf):
+    """Return the direct transport shared by all BIG-IQ managers."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = DirectTransport(conf)
+    return _transport
@@ -0,0 +1,307 @@
+import itertools
+import threading
+import time
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5sdk.exceptions import HTTPError
+
+from . import stream
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt(
+        "bigiq_probe_interval",
+        default=10,
+        help=("Seconds between two health probes of each BIG-IQ in "
+              "bigiq_host. Set it to 0 to never probe, and so never fail "
+              "over")
+    ),
+    cfg.IntOpt(
+        "bigiq_probe_timeout",
+        default=5,
+        help=("Seconds a BIG-IQ has to answer a health probe")
+    ),
+    cfg.IntOpt(
+        "bigiq_probe_failures",
+        default=2,
+        help=("Consecutive failed health probes after which a BIG-IQ is "
+              "taken out of rotation, and writes fail over to the next "
+              "healthy one")
+    ),
+    cfg.IntOpt(
+        "bigiq_token_lifetime",
+        default=240,
+        help=("Seconds the token of a BIG-IQ login is used before the agent "
+              "logs in to that BIG-IQ again. BIG-IQ tokens expire after "
+              "300 seconds by default. A request refused with 401 logs in "
+              "again and is retried once, whatever this is. Set it to 0 to "
+              "only log in again on 401")
+    ),
+    cfg.IntOpt(
+        "bigiq_pool_size",
+        default=8,
+        help=("Connections kept open to each BIG-IQ for streamed reads")
+    ),
+    cfg.BoolOpt(
+        "bigiq_verify",
+        default=False,
+        help=("Check the certificate of each BIG-IQ on streamed reads")
+    ),
+    cfg.StrOpt(
+        "bigiq_ca_bundle",
+        default=None,
+        help=("CA bundle the certificates of the BIG-IQs are checked "
+              "against when bigiq_verify is set, instead of the system "
+              "CAs")
+    )
+]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class _Tracked(object):
+    __slots__ = ("endpoint",)
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    def __enter__(self):
+        self.endpoint.outstanding += 1
+        self.endpoint.requests += 1
+        return self.endpoint
+
+    def __exit__(self, exc_type, exc, tb):
+        self.endpoint.outstanding -= 1
+        if exc is not None and not isinstance(exc, HTTPError):
+            self.endpoint.errors += 1
+        return False
+
+
+def unauthorized(ex):
+    """Tell whether an f5sdk HTTPError is a refused token."""
+    return isinstance(ex, HTTPError) and str(ex).find("code: 401") >= 0
+
+
+class Endpoint(object):
+    """A BIG-IQ node, with its own client and pooled session.
+
+    The client logs in the first time it is used, and keeps its token
+    for the requests to the node until bigiq_token_lifetime has passed.
+    f5sdk never renews a token, so a client whose token is refused is
+    dropped, and the request is sent once more by a new login.
+    """
+
+    def __init__(self, host, conf=None, client=None, login=None):
+        self.host = host
+        self.conf = conf
+        self._login = login
+        self._given = client
+        self._client = client
+        self._logged_in_at = time.time() if client is not None else None
+        self._session = None
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.healthy = True
+        self.failures = 0
+        self.last_error = None
+        self.probed_at = None
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+
+    def login(self):
+        """Return a new client logged in to the node."""
+        if self._login is not None:
+            return self._login()
+        if self._given is not None:
+            # A client handed over, such as a simulated one
+            return self._given
+        # The client pulls in requests, import it on first use
+        from f5sdk.bigiq import ManagementClient
+        return ManagementClient(self.host, user=self.conf.bigiq_user,
+                                password=self.conf.bigiq_password)
+
+    def _expired(self):
+        lifetime = self.conf.bigiq_token_lifetime if self.conf else 0
+        return lifetime > 0 and \
+            time.time() - self._logged_in_at >= lifetime
+
+    @property
+    def client(self):
+        client = self._client
+        if client is None or self._expired():
+            with self._lock:
+                if self._client is client:
+                    self._client = self.login()
+                    self._logged_in_at = time.time()
+                    self.logins += 1
+                client = self._client
+        return client
+
+    def renew(self, client):
+        """Drop a client whose token was refused, to log in again."""
+        with self._lock:
+            if self._client is client:
+                self._client = None
+
+    def call(self, func):
+        """Call func with the client, logging in again if refused once."""
+        client = self.client
+        try:
+            return func(client)
+        except HTTPError as ex:
+            if not unauthorized(ex):
+                raise
+        LOG.info("BIG-IQ %s refused the token, log in again", self.host)
+        self.renew(client)
+        return func(self.client)
+
+    def make_request(self, uri, **kwargs):
+        """Send a request to the node, like the f5sdk client does."""
+        return self.call(lambda client: client.make_request(uri, **kwargs))
+
+    def get_info(self):
+        return self.call(lambda client: client.get_info())
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = stream.new_session(
+                        self.conf.bigiq_pool_size,
+                        stream.verify_setting(self.conf.bigiq_verify,
+                                              self.conf.bigiq_ca_bundle))
+        return self._session
+
+    def track(self):
+        """Count a request to the node while it is outstanding."""
+        return _Tracked(self)
+
+
+class EndpointPool(object):
+    """Spread BIG-IQ requests over the nodes of bigiq_host.
+
+    Reads go to the healthy node with the fewest outstanding requests.
+    Writes go to the active node, the first one listed until a health
+    probe takes it out of rotation; writes then fail over to the next
+    healthy node, and stay there until that one fails in turn.
+    """
+
+    def __init__(self, conf, endpoints):
+        self.conf = conf
+        self.endpoints = endpoints
+        self._active = 0
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._probing = False
+        self.failovers = 0
+
+    def reader(self):
+        healthy = [endpoint for endpoint in self.endpoints
+                   if endpoint.healthy] or self.endpoints
+        least = min(endpoint.outstanding for endpoint in healthy)
+        candidates = [endpoint for endpoint in healthy
+                      if endpoint.outstanding == least]
+        return candidates[next(self._turn) % len(candidates)]
+
+    def writer(self):
+        return self.endpoints[self._active]
+
+    def pick(self, method):
+        """Return the node a request with method goes to."""
+        if method == "GET":
+            return self.reader()
+        return self.writer()
+
+    def _probe(self, endpoint):
+        try:
+            with eventlet.Timeout(self.conf.bigiq_probe_timeout):
+                endpoint.get_info()
+        except (Exception, eventlet.Timeout) as ex:
+            endpoint.failures += 1
+            endpoint.last_error = str(ex) or type(ex).__name__
+            if endpoint.healthy and \
+                    endpoint.failures >= self.conf.bigiq_probe_failures:
+                endpoint.healthy = False
+                LOG.warning("BIG-IQ %s failed %d health probes, take it "
+                            "out of rotation: %s", endpoint.host,
+                            endpoint.failures, endpoint.last_error)
+        else:
+            if not endpoint.healthy:
+                LOG.info("BIG-IQ %s is healthy again", endpoint.host)
+            endpoint.healthy = True
+            endpoint.failures = 0
+        endpoint.probed_at = time.time()
+
+    def _fail_over(self):
+        with self._lock:
+            if self.endpoints[self._active].healthy:
+                return
+            count = len(self.endpoints)
+            for step in range(1, count):
+                index = (self._active + step) % count
+                if self.endpoints[index].healthy:
+                    LOG.warning("Fail writes over from BIG-IQ %s to %s",
+                                self.endpoints[self._active].host,
+                                self.endpoints[index].host)
+                    self._active = index
+                    self.failovers += 1
+                    return
+            LOG.error("No healthy BIG-IQ left to fail writes over to")
+
+    def probe(self):
+        """Probe every node, and fail writes over if the active one died."""
+        for endpoint in self.endpoints:
+            self._probe(endpoint)
+        self._fail_over()
+
+    def _probe_forever(self):
+        while True:
+            eventlet.sleep(self.conf.bigiq_probe_interval)
+            try:
+                self.probe()
+            except Exception as ex:
+                LOG.exception("Fail to probe BIG-IQ: %s", ex)
+
+    def start(self):
+        """Probe the nodes periodically in the background."""
+        if self._probing or self.conf.bigiq_probe_interval <= 0:
+            return
+        self._probing = True
+        eventlet.spawn_n(self._probe_forever)
+
+    def stats(self):
+        """Return the health and load of each node."""
+        active = self.writer()
+        return {
+            'failovers': self.failovers,
+            'endpoints': dict((endpoint.host, {
+                'healthy': endpoint.healthy,
+                'active': endpoint is active,
+                'outstanding': endpoint.outstanding,
+                'requests': endpoint.requests,
+                'errors': endpoint.errors,
+                'failed_probes': endpoint.failures,
+                'logins': endpoint.logins,
+                'last_error': endpoint.last_error
+            }) for endpoint in self.endpoints)
+        }
+
+
+def get_endpoint_pool(conf):
+    """Return the pool of BIG-IQ nodes shared by all BIG-IQ managers."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = EndpointPool(conf, [Endpoint(host, conf)
+                                           for host in conf.bigiq_host])
+                pool.start()
+                _pool = pool
+    return _pool
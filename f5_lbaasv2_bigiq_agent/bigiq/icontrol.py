@@ -1,57 +1,177 @@
+import time
+
 from oslo_log import log as logging
 
 from f5sdk.exceptions import HTTPError
 
+from f5_lbaasv2_bigiq_agent import deadline
+from f5_lbaasv2_bigiq_agent import tracing
+
+from . import direct
+from . import l7
+from . import shared
+from . import templates
+from .config_cache import scope
+from .manager import bigip_root
 from .manager import BIGIQManager
 
 LOG = logging.getLogger(__name__)
 
-bigip_root = ("/mgmt/shared/resolver/device-groups"
-              "/cm-bigip-allBigIpDevices/devices/")
-
 sys_root = "/rest-proxy/mgmt/tm/sys"
 
 ltm_root = "/rest-proxy/mgmt/tm/ltm"
 
+_device_uris = {}
+
+
+class _DeviceURIs(object):
+    """iControl URI prefixes of a BIG-IP, joined once per device."""
+
+    __slots__ = ("sys", "ltm", "folder", "virtual", "pool")
+
+    def __init__(self, bigip_id):
+        self.sys = bigip_root + bigip_id + sys_root
+        self.ltm = bigip_root + bigip_id + ltm_root
+        self.folder = self.sys + "/folder"
+        self.virtual = self.ltm + "/virtual"
+        self.pool = self.ltm + "/pool"
+
+
+def device_uris(bigip_id):
+    """Return the URI prefixes of a BIG-IP."""
+    uris = _device_uris.get(bigip_id)
+    if uris is None:
+        uris = _device_uris.setdefault(bigip_id, _DeviceURIs(bigip_id))
+    return uris
+
+
+def item_uri(collection, partition, name):
+    """Return the URI of an object of a collection."""
+    return collection + "/~" + partition + "~" + name
+
 
 class BIGIQManagerIControl(BIGIQManager):
     """BIG-IQ Manager which utilizes iControl REST"""
 
     def __init__(self, conf):
         super(BIGIQManagerIControl, self).__init__(conf)
+        self.transport = direct.get_direct_transport(conf)
+
+    def _request(self, uri, method="GET", body=None):
+        """Send an iControl request through the fastest available path.
+
+        With bigip_direct, rest-proxy URIs are sent straight to the
+        BIG-IP, unless it could not be reached lately. The request is cut
+        short when the operation it is made for runs out of time.
+        """
+        with tracing.span("bigiq_request", method=method, uri=uri), \
+                deadline.bounded():
+            return self._send(uri, method, body)
+
+    def _send(self, uri, method, body):
+        start = time.time()
+        kwargs = {}
+        if isinstance(body, templates.RawBody):
+            kwargs = templates.raw_request()
+        endpoint = self.endpoints.pick(method)
+        if self.conf.bigip_direct and uri.startswith(bigip_root):
+            bigip_id, proxy, path = \
+                uri[len(bigip_root):].partition(direct.PROXY_PREFIX)
+            if proxy and self.transport.available(bigip_id):
+                try:
+                    resp = self.transport.request(
+                        endpoint, bigip_id, path,
+                        method=method, body=body)
+                    self.transport.record(direct.DIRECT,
+                                          time.time() - start)
+                    return resp
+                except direct.DirectUnavailable:
+                    start = time.time()
+
+        try:
+            with endpoint.track():
+                return endpoint.make_request(
+                    uri, method=method,
+                    body=body.data if kwargs else body, **kwargs)
+        finally:
+            self.transport.record(direct.PROXY, time.time() - start)
+
+    def _stream(self, uri):
+        if self.conf.bigip_direct and uri.startswith(bigip_root):
+            bigip_id, proxy, path = \
+                uri[len(bigip_root):].partition(direct.PROXY_PREFIX)
+            if proxy and self.transport.available(bigip_id):
+                try:
+                    with tracing.span("bigiq_stream", uri=uri):
+                        return self.transport.request(
+                            self.endpoints.reader(), bigip_id, path,
+                            stream=True)
+                except direct.DirectUnavailable:
+                    pass
+        return super(BIGIQManagerIControl, self)._stream(uri)
+
+    def _scope(self, uri, partition):
+        bigip_id = uri[len(bigip_root):].split("/", 1)[0]
+        return scope(bigip_id, partition)
 
     def _create(self, uri, body, **kwargs):
         resource = kwargs.get("resource", "unknown")
+        if isinstance(body, templates.RawBody):
+            name, partition = body.name, body.partition
+        else:
+            name, partition = body["name"], body.get("partition")
+        if partition:
+            key = item_uri(uri, partition, name)
+        else:
+            partition = name
+            key = uri + "/~" + name
+        cache_scope = self._scope(uri, partition)
+        if self.config_cache.unchanged(cache_scope, key, body):
+            LOG.debug("Skip unchanged %s", resource)
+            return
         try:
-            self.client.make_request(uri, method="POST", body=body)
+            self._request(uri, method="POST", body=body)
         except Exception as ex:
             if isinstance(ex, HTTPError) and \
                ex.message.find("code: 409") >= 0:
-                self._overwrite(uri, body, **kwargs)
+                self._overwrite(key, body, **kwargs)
             else:
+                self.config_cache.forget(cache_scope, key)
                 LOG.error("Fail to create %s : %s", resource, ex.message)
                 raise ex
+        self.config_cache.applied(cache_scope, key, body)
 
     def _overwrite(self, uri, body, **kwargs):
         resource = kwargs.get("resource", "unknown")
         try:
-            self.client.make_request(uri, method="PUT", body=body)
+            self._request(uri, method="PUT", body=body)
         except Exception as ex:
             LOG.error("Fail to overwrite %s : %s", resource, ex.message)
             raise ex
 
     def _modify(self, uri, body, **kwargs):
         resource = kwargs.get("resource", "unknown")
+        cache_scope = self._scope(uri, kwargs["partition"])
+        if self.config_cache.unchanged(cache_scope, uri, body):
+            LOG.debug("Skip unchanged %s", resource)
+            return
         try:
-            self.client.make_request(uri, method="PATCH", body=body)
+            self._request(uri, method="PATCH", body=body)
         except Exception as ex:
+            # A 404 above all tells the body applied last is gone
+            self.config_cache.forget(cache_scope, uri)
             LOG.error("Fail to modify %s : %s", resource, ex.message)
             raise ex
+        # Re-sending the last body written to a resource is a no-op,
+        # whether that body was a full one or a PATCH.
+        self.config_cache.applied(cache_scope, uri, body)
 
     def _delete(self, uri, **kwargs):
         resource = kwargs.get("resource", "unknown")
+        self.config_cache.invalidate(
+            self._scope(uri, kwargs["partition"]), uri)
         try:
-            self.client.make_request(uri, method="DELETE")
+            self._request(uri, method="DELETE")
         except Exception as ex:
             if isinstance(ex, HTTPError) and \
                ex.message.find("code: 404") >= 0:
@@ -60,107 +180,434 @@ class BIGIQManagerIControl(BIGIQManager):
                 LOG.error("Fail to delete %s : %s", resource, ex.message)
                 raise ex
 
+    def _acquire_shared(self, bigip_id, user, collection, body):
+        """Make sure a shared object exists and reference it for user.
+
+        collection is where the object goes below the LTM root, such as
+        monitor/http. Return the object user referenced before, once
+        nobody else does, to be collected after user moved off it.
+        """
+        registry = shared.get_shared_objects()
+        path = item_uri(collection, shared.SHARED_PARTITION, body["name"])
+        uri = device_uris(bigip_id).ltm + "/" + collection
+        with registry.lock(bigip_id, path):
+            # Unchanged in the config cache once any user created it
+            self._create(uri, body, resource=body["name"])
+            return registry.acquire(bigip_id, user, path)
+
+    def _collect(self, bigip_id, path):
+        """Delete a shared object unless it is used again."""
+        if path is None:
+            return
+        registry = shared.get_shared_objects()
+        uri = device_uris(bigip_id).ltm + "/" + path
+        with registry.lock(bigip_id, path):
+            if registry.in_use(bigip_id, path):
+                return
+            try:
+                self._delete(uri, partition=shared.SHARED_PARTITION,
+                             resource=path)
+            except HTTPError as ex:
+                # The device keeps objects which are still in use, such
+                # as by pools created before a restart
+                if ex.message.find("code: 400") >= 0:
+                    LOG.info("Keep shared %s, which is still in use", path)
+                    return
+                raise ex
+            registry.count_collected()
+
+    def _release_shared(self, bigip_id, user):
+        if self.conf.shared_objects:
+            self._collect(bigip_id,
+                          shared.get_shared_objects().release(bigip_id, user))
+
     def _find_pool_by_member(self, loadbalancer, member_id):
         pool = None
         for p in loadbalancer['pools']:
-            for m in pool['members']:
+            for m in p['members']:
                 if member_id == m['id']:
                     return p
         return pool
 
+    def _find_pool_by_monitor(self, loadbalancer, health_monitor):
+        for p in loadbalancer.get('pools', []):
+            monitor = p.get('healthmonitor') or {}
+            if p['id'] == health_monitor.get('pool_id') or \
+                    health_monitor['id'] in (monitor.get('id'),
+                                             p.get('healthmonitor_id')):
+                return p
+
     def create_loadbalancer(self, bigip_id, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
-        uri = "{0}{1}{2}/folder".format(bigip_root, bigip_id, sys_root)
-        body = {
-            "name": partition,
-            "description": "tenant-" + loadbalancer['tenant_id'],
-            "subPath": "/",
-            "fullPath": "/" + partition
-        }
-        self._create(uri, body, resource=partition)
+        body = templates.FOLDER.render(
+            partition, "tenant-" + loadbalancer['tenant_id'], "/" + partition)
+        self._create(device_uris(bigip_id).folder, body, resource=partition)
 
     def delete_loadbalancer(self, bigip_id, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
-        uri = "{0}{1}{2}/folder/~{3}".format(
-            bigip_root, bigip_id, sys_root, partition)
-        self._delete(uri, resource=partition)
+        l7.get_l7_compiler().forget_partition(partition)
+        uri = device_uris(bigip_id).folder + "/~" + partition
+        self.config_cache.invalidate(scope(bigip_id, partition))
+        self._delete(uri, partition=partition, resource=partition)
+
+    def get_loadbalancer_stats(self, bigip_id, loadbalancer, **kwargs):
+        partition = "loadbalancer-" + loadbalancer['id']
+        uri = (device_uris(bigip_id).virtual +
+               "/stats?$filter=partition+eq+" + partition)
+        resp = self._request(uri, method="GET")
+
+        stats = {
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "active_connections": 0,
+            "total_connections": 0
+        }
+        for entry in (resp or {}).get("entries", {}).values():
+            values = entry["nestedStats"]["entries"]
+            stats["bytes_in"] += values["clientside.bitsIn"]["value"] // 8
+            stats["bytes_out"] += values["clientside.bitsOut"]["value"] // 8
+            stats["active_connections"] += \
+                values["clientside.curConns"]["value"]
+            stats["total_connections"] += \
+                values["clientside.totConns"]["value"]
+        return stats
+
+    def get_partition_fingerprint(self, bigip_id, loadbalancer, **kwargs):
+        partition = "loadbalancer-" + loadbalancer['id']
+        fingerprint = {}
+
+        uris = device_uris(bigip_id)
+        uri = uris.folder + "/~" + partition + "?$select=name"
+        try:
+            self._request(uri, method="GET")
+        except HTTPError as ex:
+            if ex.message.find("code: 404") >= 0:
+                return fingerprint
+            raise ex
+        fingerprint["folder/" + partition] = ""
+
+        for virtual in self.iter_paged(
+                uris.virtual, odata_filter="partition+eq+" + partition,
+                select=("name", "destination")):
+            destination = virtual.get("destination", "").split("/")[-1]
+            fingerprint["virtual/" + virtual["name"]] = destination
+
+        uri = uris.pool + "?expandSubcollections=true"
+        for pool in self.iter_paged(
+                uri, odata_filter="partition+eq+" + partition,
+                select=("name", "membersReference")):
+            fingerprint["pool/" + pool["name"]] = ""
+            members = pool.get("membersReference", {}).get("items", [])
+            for member in members:
+                key = "member/%s/%s" % (pool["name"], member["name"])
+                fingerprint[key] = member.get("address", "")
+        return fingerprint
+
+    def get_member_status(self, bigip_id, loadbalancer, **kwargs):
+        partition = "loadbalancer-" + loadbalancer['id']
+        uri = device_uris(bigip_id).pool + "?expandSubcollections=true"
+
+        status = []
+        for pool in self.iter_paged(
+                uri, odata_filter="partition+eq+" + partition,
+                select=("name", "membersReference")):
+            if not pool["name"].startswith("pool-"):
+                continue
+            members = pool.get("membersReference", {}).get("items", [])
+            for member in members:
+                if not member["name"].startswith("member-"):
+                    continue
+                member_id = member["name"][len("member-"):].rsplit(":", 1)[0]
+                status.append((pool["name"][len("pool-"):], member_id,
+                               member.get("state", "")))
+        return status
 
     def create_listener(self, bigip_id, listener, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
         listener_name = "listener-" + listener['id']
         destination = (loadbalancer['vip_address'] + ":" +
                        str(listener['protocol_port']))
-        uri = "{0}{1}{2}/virtual".format(bigip_root, bigip_id, ltm_root)
-        body = {
-            "name": listener_name,
-            "partition": partition,
-            "destination": destination,
-            "ipProtocol": "tcp"
-        }
-        self._create(uri, body, resource=listener_name)
+        previous = None
+        if listener.get('protocol') == "HTTP":
+            http_profile, previous = self._http_profile(
+                bigip_id, listener, partition)
+            body = templates.HTTP_VIRTUAL.render(
+                listener_name, partition, destination,
+                ["/Common/tcp", http_profile])
+        else:
+            body = templates.VIRTUAL.render(listener_name, partition,
+                                            destination)
+        self._create(device_uris(bigip_id).virtual, body,
+                     resource=listener_name)
+        self._collect(bigip_id, previous)
+
+    def update_listener(self, bigip_id, listener, loadbalancer, **kwargs):
+        if listener.get('protocol') != "HTTP":
+            return
+        partition = "loadbalancer-" + loadbalancer['id']
+        listener_name = "listener-" + listener['id']
+        http_profile, previous = self._http_profile(bigip_id, listener,
+                                                    partition)
+        uri = item_uri(device_uris(bigip_id).virtual, partition,
+                       listener_name)
+        self._modify(uri, {"profiles": ["/Common/tcp", http_profile]},
+                     partition=partition, resource=listener_name)
+        self._collect(bigip_id, previous)
+
+        old_listener = kwargs.get('old_listener')
+        if not self.conf.shared_objects and \
+                http_profile == "/Common/http" and \
+                (old_listener is None or
+                 shared.http_profile_settings(old_listener) is not None):
+            # Moved off its own profile
+            profile_name = "http-" + listener_name
+            uri = item_uri(device_uris(bigip_id).ltm + "/profile/http",
+                           partition, profile_name)
+            self._delete(uri, partition=partition, resource=profile_name)
+
+    def _http_profile(self, bigip_id, listener, partition):
+        """Return the HTTP profile of a listener, creating it if needed.
+
+        Along comes the shared profile the listener used before, when it
+        is left unused.
+        """
+        settings = shared.http_profile_settings(listener)
+        if settings is None:
+            if self.conf.shared_objects:
+                return "/Common/http", shared.get_shared_objects().release(
+                    bigip_id, "listener-" + listener['id'])
+            return "/Common/http", None
+        if self.conf.shared_objects:
+            name = shared.shared_name("http", settings)
+            previous = self._acquire_shared(
+                bigip_id, "listener-" + listener['id'], "profile/http",
+                dict(settings, name=name, partition=shared.SHARED_PARTITION))
+            return "/%s/%s" % (shared.SHARED_PARTITION, name), previous
+
+        name = "http-listener-" + listener['id']
+        uri = device_uris(bigip_id).ltm + "/profile/http"
+        self._create(uri, dict(settings, name=name, partition=partition),
+                     resource=name)
+        return "/%s/%s" % (partition, name), None
 
     def delete_listener(self, bigip_id, listener, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
         listener_name = "listener-" + listener['id']
-        uri = "{0}{1}{2}/virtual/~{3}~{4}".format(
-            bigip_root, bigip_id, ltm_root, partition, listener_name)
-        self._delete(uri, resource=listener_name)
+        uris = device_uris(bigip_id)
+        uri = item_uri(uris.virtual, partition, listener_name)
+        self._delete(uri, partition=partition, resource=listener_name)
+        if self.conf.shared_objects:
+            self._release_shared(bigip_id, listener_name)
+        elif shared.http_profile_settings(listener) is not None:
+            profile_name = "http-" + listener_name
+            uri = item_uri(uris.ltm + "/profile/http", partition,
+                           profile_name)
+            self._delete(uri, partition=partition, resource=profile_name)
+        if listener.get('l7policies'):
+            policy_name = l7.policy_name(listener['id'])
+            uri = item_uri(uris.ltm + "/policy", partition, policy_name)
+            self._delete(uri, partition=partition, resource=policy_name)
+        l7.get_l7_compiler().forget(partition, listener['id'])
 
     def create_pool(self, bigip_id, pool, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
         pool_name = "pool-" + pool['id']
-        uri = "{0}{1}{2}/pool".format(bigip_root, bigip_id, ltm_root)
-        body = {
-            "name": pool_name,
-            "partition": partition
-        }
-        self._create(uri, body, resource=pool_name)
+        self._create(device_uris(bigip_id).pool,
+                     templates.POOL.render(pool_name, partition),
+                     resource=pool_name)
 
     def delete_pool(self, bigip_id, pool, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
         pool_name = "pool-" + pool['id']
-        uri = "{0}{1}{2}/pool/~{3}~{4}".format(
-            bigip_root, bigip_id, ltm_root, partition, pool_name)
-        self._delete(uri, resource=pool_name)
+        uri = item_uri(device_uris(bigip_id).pool, partition, pool_name)
+        self._delete(uri, partition=partition, resource=pool_name)
+        self._release_shared(bigip_id, pool_name)
 
     def create_member(self, bigip_id, member, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
-        member_name = "member-" + member['id'] + ":" + member['protocol_port']
-        pool = self._find_pool_by_member(loadbalancer, member['id'])
+        member_name = ("member-" + member['id'] + ":" +
+                       str(member['protocol_port']))
+        pool = kwargs.get('pool') or \
+            self._find_pool_by_member(loadbalancer, member['id'])
         pool_name = "pool-" + pool['id']
-        uri = "{0}{1}{2}/pool/~{3}~{4}/members".format(
-            bigip_root, bigip_id, ltm_root, partition, pool_name)
-        body = {
-            "name": member_name,
-            "address": member['address'],
-            "partition": partition
-        }
+        uri = item_uri(device_uris(bigip_id).pool, partition,
+                       pool_name) + "/members"
+        body = templates.MEMBER.render(member_name, partition,
+                                       member['address'])
         self._create(uri, body, resource=member_name)
 
     def delete_member(self, bigip_id, member, loadbalancer, **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
-        member_name = "member-" + member['id'] + ":" + member['protocol_port']
-        pool = self._find_pool_by_member(loadbalancer, member['id'])
+        member_name = ("member-" + member['id'] + ":" +
+                       str(member['protocol_port']))
+        pool = kwargs.get('pool') or \
+            self._find_pool_by_member(loadbalancer, member['id'])
         pool_name = "pool-" + pool['id']
-        uri = "{0}{1}{2}/pool/~{3}~{4}/members/~{3}~{5}".format(
-            bigip_root, bigip_id, ltm_root, partition, pool_name, member_name)
-        self._delete(uri, name="member", resource=member_name)
+        uri = item_uri(item_uri(device_uris(bigip_id).pool, partition,
+                                pool_name) + "/members",
+                       partition, member_name)
+        self._delete(uri, name="member", partition=partition,
+                     resource=member_name)
 
     def create_health_monitor(self, bigip_id, health_monitor, loadbalancer,
                               **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
-        monitor_name = "monitor-" + health_monitor['id']
-        uri = "{0}{1}{2}/monitor/http".format(bigip_root, bigip_id, ltm_root)
-        body = {
-            "name": monitor_name,
-            "partition": partition
-        }
-        self._create(uri, body, resource=monitor_name)
+        pool = kwargs.get('pool') or \
+            self._find_pool_by_monitor(loadbalancer, health_monitor)
+        pool_name = "pool-" + pool['id']
+        monitor_type, settings = shared.monitor_settings(health_monitor)
+        collection = "monitor/" + monitor_type
+
+        previous = None
+        if self.conf.shared_objects:
+            monitor_partition = shared.SHARED_PARTITION
+            monitor_name = shared.shared_name(
+                "monitor", dict(settings, type=monitor_type))
+            previous = self._acquire_shared(
+                bigip_id, pool_name, collection,
+                dict(settings, name=monitor_name,
+                     partition=monitor_partition))
+        else:
+            monitor_partition = partition
+            monitor_name = "monitor-" + health_monitor['id']
+            uri = device_uris(bigip_id).ltm + "/" + collection
+            self._create(uri, dict(settings, name=monitor_name,
+                                   partition=partition),
+                         resource=monitor_name)
+
+        uri = item_uri(device_uris(bigip_id).pool, partition, pool_name)
+        body = {"monitor": "/%s/%s" % (monitor_partition, monitor_name)}
+        self._modify(uri, body, partition=partition, resource=pool_name)
+        self._collect(bigip_id, previous)
+
+    def update_health_monitor(self, bigip_id, health_monitor, loadbalancer,
+                              **kwargs):
+        self.create_health_monitor(bigip_id, health_monitor, loadbalancer,
+                                   **kwargs)
 
     def delete_heath_monitor(self, bigip_id, health_monitor, loadbalancer,
                              **kwargs):
         partition = "loadbalancer-" + loadbalancer['id']
-        monitor_name = "monitor-" + health_monitor['id']
-        uri = "{0}{1}{2}/monitor/http/~{3}~{4}".format(
-            bigip_root, bigip_id, ltm_root, partition, monitor_name)
-        self._delete(uri, resource=monitor_name)
+        pool = kwargs.get('pool') or \
+            self._find_pool_by_monitor(loadbalancer, health_monitor)
+        if pool is not None:
+            pool_name = "pool-" + pool['id']
+            uri = item_uri(device_uris(bigip_id).pool, partition, pool_name)
+            try:
+                self._modify(uri, {"monitor": "none"}, partition=partition,
+                             resource=pool_name)
+            except HTTPError as ex:
+                if ex.message.find("code: 404") < 0:
+                    raise ex
+            self._release_shared(bigip_id, pool_name)
+
+        if not self.conf.shared_objects:
+            monitor_type, _ = shared.monitor_settings(health_monitor)
+            monitor_name = "monitor-" + health_monitor['id']
+            uri = item_uri(device_uris(bigip_id).ltm + "/monitor/" +
+                           monitor_type, partition, monitor_name)
+            self._delete(uri, partition=partition, resource=monitor_name)
+
+    def _find_listener(self, loadbalancer, listener_id):
+        for listener in loadbalancer.get('listeners', []):
+            if listener['id'] == listener_id:
+                return listener
+        return None
+
+    def _find_listener_by_l7policy(self, loadbalancer, l7policy_id):
+        for listener in loadbalancer.get('listeners', []):
+            for policy in listener.get('l7policies', []):
+                if policy['id'] == l7policy_id:
+                    return listener
+        return None
+
+    def _publish_policy(self, bigip_id, partition, policy):
+        """Write an LTM policy as a draft and publish it."""
+        name = policy['name']
+        uri = device_uris(bigip_id).ltm + "/policy"
+        try:
+            self._request(uri, method="POST",
+                          body=dict(policy, subPath="Drafts"))
+        except HTTPError as ex:
+            if ex.message.find("code: 409") < 0:
+                raise ex
+            # A draft was left behind by a publish which failed
+            draft_uri = "{0}/~{1}~Drafts~{2}".format(uri, partition, name)
+            self._request(draft_uri, method="PUT",
+                          body=dict(policy, subPath="Drafts"))
+        self._request(uri, method="POST", body={
+            "command": "publish",
+            "name": "/{0}/Drafts/{1}".format(partition, name)
+        })
+
+    def sync_l7policies(self, bigip_id, listener, loadbalancer, **kwargs):
+        """Publish all the l7policies of a listener as one LTM policy.
+
+        The policy is compiled from the whole rule set of the listener,
+        and published with a single draft and publish cycle, whatever
+        the number of rules. Nothing is sent when the compiled policy is
+        the one last published.
+        """
+        partition = "loadbalancer-" + loadbalancer['id']
+        listener_name = "listener-" + listener['id']
+        policy_name = l7.policy_name(listener['id'])
+        uris = device_uris(bigip_id)
+        policy_uri = item_uri(uris.ltm + "/policy", partition, policy_name)
+        virtual_uri = item_uri(uris.virtual, partition, listener_name)
+        cache_scope = scope(bigip_id, partition)
+
+        policy = l7.get_l7_compiler().compile(listener, partition)
+        if self.config_cache.unchanged(cache_scope, policy_uri, policy):
+            LOG.debug("Skip unchanged %s", policy_name)
+            return
+
+        try:
+            if policy is None:
+                self._request(virtual_uri, method="PATCH",
+                              body={"policies": []})
+                self._delete(policy_uri, partition=partition,
+                             resource=policy_name)
+            else:
+                self._publish_policy(bigip_id, partition, policy)
+                self._request(virtual_uri, method="PATCH", body={
+                    "policies": [{"name": policy_name,
+                                  "partition": partition}]
+                })
+        except Exception:
+            self.config_cache.forget(cache_scope, policy_uri)
+            raise
+        self.config_cache.applied(cache_scope, policy_uri, policy)
+
+    def _sync_l7policy(self, bigip_id, l7policy, loadbalancer):
+        listener = self._find_listener(loadbalancer, l7policy['listener_id'])
+        if listener is None:
+            raise l7.L7CompileError("Cannot find listener %s of l7policy %s"
+                                    % (l7policy['listener_id'],
+                                       l7policy['id']))
+        self.sync_l7policies(bigip_id, listener, loadbalancer)
+
+    def _sync_l7rule(self, bigip_id, l7rule, loadbalancer):
+        listener = self._find_listener_by_l7policy(loadbalancer,
+                                                   l7rule['policy_id'])
+        if listener is None:
+            raise l7.L7CompileError("Cannot find l7policy %s of l7rule %s"
+                                    % (l7rule['policy_id'], l7rule['id']))
+        self.sync_l7policies(bigip_id, listener, loadbalancer)
+
+    def create_l7policy(self, bigip_id, l7policy, loadbalancer, **kwargs):
+        self._sync_l7policy(bigip_id, l7policy, loadbalancer)
+
+    def update_l7policy(self, bigip_id, l7policy, loadbalancer, **kwargs):
+        self._sync_l7policy(bigip_id, l7policy, loadbalancer)
+
+    def delete_l7policy(self, bigip_id, l7policy, loadbalancer, **kwargs):
+        self._sync_l7policy(bigip_id, l7policy, loadbalancer)
+
+    def create_l7rule(self, bigip_id, l7rule, loadbalancer, **kwargs):
+        self._sync_l7rule(bigip_id, l7rule, loadbalancer)
+
+    def update_l7rule(self, bigip_id, l7rule, loadbalancer, **kwargs):
+        self._sync_l7rule(bigip_id, l7rule, loadbalancer)
+
+    def delete_l7rule(self, bigip_id, l7rule, loadbalancer, **kwargs):
+        self._sync_l7rule(bigip_id, l7rule, loadbalancer)
@@ -0,0 +1,181 @@
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5sdk.exceptions import HTTPError
+
+from .manager import device_group_root
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt(
+        "inventory_page_size",
+        default=100,
+        help=("Page size ($top) of BIG-IQ device inventory queries")
+    ),
+    cfg.IntOpt(
+        "inventory_full_sync_interval",
+        default=3600,
+        help=("Seconds between full BIG-IP inventory snapshots. Delta "
+              "refreshes cannot see removed devices, so a periodic "
+              "snapshot is taken to drop them")
+    )
+]
+
+TENANT_GROUP_PREFIX = "tenant_"
+
+# Properties of devices and device groups the inventory keeps, the only
+# ones asked of BIG-IQ
+DEVICE_FIELDS = ("uuid", "state", "version", "address", "hostname",
+                 "lastUpdateMicros")
+GROUP_FIELDS = ("name", "lastUpdateMicros")
+
+
+def _device_record(item):
+    return {
+        'uuid': item['uuid'],
+        'state': item.get('state'),
+        'version': item.get('version'),
+        'address': item.get('address'),
+        'hostname': item.get('hostname'),
+        'lastUpdateMicros': item.get('lastUpdateMicros', 0)
+    }
+
+
+class DeviceInventory(object):
+    """In-memory BIG-IP inventory kept current with BIG-IQ deltas.
+
+    The first refresh takes a full snapshot of all BIG-IP devices. Later
+    refreshes only ask BIG-IQ for devices and tenant device groups whose
+    lastUpdateMicros is newer than the highest one seen so far, so the
+    cost of a refresh depends on what changed rather than on fleet size.
+    Tenant group membership is loaded lazily the first time a tenant is
+    scheduled and is then kept current the same way.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._groups = {}
+        self._device_watermark = 0
+        self._group_watermark = 0
+        self._last_full_sync = None
+
+    def _page_size(self):
+        return self.conf.inventory_page_size
+
+    def _full_sync_due(self):
+        if self._last_full_sync is None:
+            return True
+        interval = self.conf.inventory_full_sync_interval
+        return interval > 0 and \
+            time.time() - self._last_full_sync >= interval
+
+    def _merge_devices(self, items):
+        count = 0
+        for item in items:
+            record = _device_record(item)
+            self._devices[record['uuid']] = record
+            self._device_watermark = max(self._device_watermark,
+                                         record['lastUpdateMicros'])
+            count += 1
+        return count
+
+    def _load_group(self, bigiq, tenant_id):
+        uri = "%s/%s%s/devices" % (device_group_root,
+                                   TENANT_GROUP_PREFIX, tenant_id)
+        members = set()
+        try:
+            for item in bigiq.iter_paged(
+                    uri, odata_filter="('product'+eq+'BIG-IP')",
+                    select=DEVICE_FIELDS, page_size=self._page_size()):
+                members.add(item['uuid'])
+                # A device may join a group before the next device delta
+                # picks it up, so remember it right away.
+                if item['uuid'] not in self._devices:
+                    self._merge_devices([item])
+        except HTTPError as ex:
+            # Keep an empty membership, a later group delta reloads it
+            # once the tenant device group shows up.
+            LOG.error("Fail to load device group of tenant %s: %s",
+                      tenant_id, ex.message)
+            members = set()
+        self._groups[tenant_id] = members
+        return members
+
+    def _snapshot(self, bigiq):
+        # Devices stream in, keep the previous ones until all have come
+        previous = (self._devices, self._device_watermark)
+        self._devices = {}
+        self._device_watermark = 0
+        try:
+            self._merge_devices(bigiq.get_devices(
+                select=DEVICE_FIELDS, page_size=self._page_size()))
+            group_watermark = 0
+            for group in bigiq.get_tenant_device_groups(
+                    select=GROUP_FIELDS, page_size=self._page_size()):
+                group_watermark = max(group_watermark,
+                                      group.get('lastUpdateMicros', 0))
+        except Exception:
+            self._devices, self._device_watermark = previous
+            raise
+        self._group_watermark = group_watermark
+
+        for tenant_id in list(self._groups):
+            self._load_group(bigiq, tenant_id)
+
+        self._last_full_sync = time.time()
+        LOG.debug("BIG-IP inventory snapshot: %d devices, %d tenant groups",
+                  len(self._devices), len(self._groups))
+
+    def _delta(self, bigiq):
+        devices = self._merge_devices(bigiq.get_devices(
+            since=self._device_watermark, select=DEVICE_FIELDS,
+            page_size=self._page_size()))
+
+        groups = 0
+        changed = []
+        for group in bigiq.get_tenant_device_groups(
+                since=self._group_watermark, select=GROUP_FIELDS,
+                page_size=self._page_size()):
+            groups += 1
+            self._group_watermark = max(self._group_watermark,
+                                        group.get('lastUpdateMicros', 0))
+            tenant_id = group['name'][len(TENANT_GROUP_PREFIX):]
+            if tenant_id in self._groups:
+                changed.append(tenant_id)
+        for tenant_id in changed:
+            self._load_group(bigiq, tenant_id)
+
+        if devices or groups:
+            LOG.debug("BIG-IP inventory delta: %d devices, %d groups",
+                      devices, groups)
+
+    def refresh(self, bigiq):
+        """Bring the inventory up to date with BIG-IQ."""
+        with self._lock:
+            if self._full_sync_due():
+                self._snapshot(bigiq)
+            else:
+                self._delta(bigiq)
+
+    def get_device(self, bigip_id):
+        return self._devices.get(bigip_id)
+
+    def get_devices(self):
+        return self._devices.values()
+
+    def get_tenant_devices(self, bigiq, tenant_id):
+        """Return the device records in the device group of a tenant."""
+        with self._lock:
+            if self._last_full_sync is None:
+                self._snapshot(bigiq)
+            members = self._groups.get(tenant_id)
+            if members is None:
+                members = self._load_group(bigiq, tenant_id)
+            return [dict(self._devices[uuid], groups=[tenant_id])
+                    for uuid in sorted(members) if uuid in self._devices]
@@ -0,0 +1,182 @@
+import threading
+
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import constants
+
+LOG = logging.getLogger(__name__)
+
+POLICY_PREFIX = "l7-listener-"
+
+# LTM policy condition operand and selector of each l7rule type
+RULE_TYPES = {
+    "HOST_NAME": {"httpHost": True, "host": True},
+    "PATH": {"httpUri": True, "path": True},
+    "FILE_TYPE": {"httpUri": True, "extension": True},
+    "HEADER": {"httpHeader": True},
+    "COOKIE": {"httpCookie": True}
+}
+
+# LTM policy conditions have no regular expression match
+COMPARE_TYPES = {
+    "EQUAL_TO": "equals",
+    "STARTS_WITH": "startsWith",
+    "ENDS_WITH": "endsWith",
+    "CONTAINS": "contains"
+}
+
+_compiler = None
+_compiler_lock = threading.Lock()
+
+
+class L7CompileError(ValueError):
+
+    def __init__(self, message):
+        super(L7CompileError, self).__init__(message)
+        self.message = message
+
+
+def policy_name(listener_id):
+    return POLICY_PREFIX + listener_id
+
+
+def _enabled(objects):
+    return [obj for obj in objects
+            if obj.get('provisioning_status') != constants.PENDING_DELETE and
+            obj.get('admin_state_up', True)]
+
+
+def rule_set(listener):
+    """Return what the LTM policy of a listener is compiled from.
+
+    l7policies come in the order of their position, each with its
+    enabled l7rules, so that equal rule sets compare equal.
+    """
+    policies = sorted(_enabled(listener.get('l7policies', [])),
+                      key=lambda policy: (policy['position'], policy['id']))
+    return tuple(
+        (policy['id'], policy['action'], policy.get('redirect_pool_id'),
+         policy.get('redirect_url'),
+         tuple(sorted((rule['id'], rule['type'], rule['compare_type'],
+                       rule.get('key'), rule['value'],
+                       bool(rule.get('invert')))
+                      for rule in _enabled(policy.get('rules', [])))))
+        for policy in policies)
+
+
+def _condition(index, rule_type, compare_type, key, value, invert):
+    if rule_type not in RULE_TYPES:
+        raise L7CompileError("Unsupported l7rule type %s" % rule_type)
+    if compare_type not in COMPARE_TYPES:
+        raise L7CompileError("Unsupported l7rule compare type %s" %
+                             compare_type)
+    condition = dict(RULE_TYPES[rule_type], name=str(index), request=True,
+                     values=[value])
+    condition[COMPARE_TYPES[compare_type]] = True
+    if rule_type in ("HEADER", "COOKIE"):
+        condition["tmName"] = key
+    if rule_type == "HOST_NAME":
+        condition["caseInsensitive"] = True
+    if invert:
+        condition["not"] = True
+    return condition
+
+
+def _action(partition, action, redirect_pool_id, redirect_url):
+    if action == "REDIRECT_TO_POOL":
+        return {"name": "0", "forward": True, "request": True,
+                "select": True,
+                "pool": "/%s/pool-%s" % (partition, redirect_pool_id)}
+    if action == "REDIRECT_TO_URL":
+        return {"name": "0", "httpReply": True, "redirect": True,
+                "request": True, "location": redirect_url}
+    if action == "REJECT":
+        return {"name": "0", "forward": True, "request": True,
+                "reset": True}
+    raise L7CompileError("Unsupported l7policy action %s" % action)
+
+
+def compile_rule_set(listener_id, partition, rules):
+    """Turn a rule set into one first-match LTM policy document.
+
+    Each l7policy becomes a policy rule whose conditions are its
+    l7rules, all of which must match. l7policies without rules never
+    match and are left out. None means that there is nothing to match.
+    """
+    policy_rules = []
+    for policy_id, action, redirect_pool_id, redirect_url, l7rules \
+            in rules:
+        if not l7rules:
+            continue
+        policy_rules.append({
+            "name": "l7policy-" + policy_id,
+            "ordinal": len(policy_rules),
+            "conditions": [_condition(i, *rule[1:])
+                           for i, rule in enumerate(l7rules)],
+            "actions": [_action(partition, action, redirect_pool_id,
+                                redirect_url)]
+        })
+    if not policy_rules:
+        return None
+    return {
+        "name": policy_name(listener_id),
+        "partition": partition,
+        "strategy": "/Common/first-match",
+        "requires": ["http"],
+        "controls": ["forwarding"],
+        "rules": policy_rules
+    }
+
+
+class L7Compiler(object):
+    """Compile the l7policies of listeners, once per rule set.
+
+    The document compiled for a listener is kept along with the rule set
+    it came from, and only compiled again when that rule set changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled = {}
+        self.hits = 0
+        self.compiles = 0
+
+    def compile(self, listener, partition):
+        rules = rule_set(listener)
+        key = (partition, listener['id'])
+        with self._lock:
+            cached = self._compiled.get(key)
+            if cached is not None and cached[0] == rules:
+                self.hits += 1
+                return cached[1]
+
+        document = compile_rule_set(listener['id'], partition, rules)
+        with self._lock:
+            self._compiled[key] = (rules, document)
+            self.compiles += 1
+        return document
+
+    def forget(self, partition, listener_id):
+        with self._lock:
+            self._compiled.pop((partition, listener_id), None)
+
+    def forget_partition(self, partition):
+        with self._lock:
+            for key in [key for key in self._compiled
+                        if key[0] == partition]:
+                del self._compiled[key]
+
+    def stats(self):
+        with self._lock:
+            return {'listeners': len(self._compiled), 'hits': self.hits,
+                    'compiles': self.compiles}
+
+
+def get_l7_compiler():
+    """Return the L7 compiler shared by all BIG-IQ managers."""
+    global _compiler
+    if _compiler is None:
+        with _compiler_lock:
+            if _compiler is None:
+                _compiler = L7Compiler()
+    return _compiler
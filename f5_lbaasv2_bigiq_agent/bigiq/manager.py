@@ -1,27 +1,107 @@
 from oslo_log import log as logging
 
-from f5sdk.bigiq import ManagementClient
 from f5sdk.exceptions import HTTPError
 
+from f5_lbaasv2_bigiq_agent import deadline
+from f5_lbaasv2_bigiq_agent import tracing
+
+from . import stream
+from .config_cache import get_config_cache
+from .endpoints import get_endpoint_pool
+
 LOG = logging.getLogger(__name__)
 
+bigip_root = ("/mgmt/shared/resolver/device-groups"
+              "/cm-bigip-allBigIpDevices/devices/")
+
+device_group_root = "/mgmt/shared/resolver/device-groups"
+
 
 class BIGIQManager(object):
     """Base BIG-IQ Manager"""
 
     def __init__(self, conf):
         self.conf = conf
-        self.client = ManagementClient(
-            conf.bigiq_host, user=conf.bigiq_user,
-            password=conf.bigiq_password)
+        self.endpoints = get_endpoint_pool(conf)
+        self.config_cache = get_config_cache(conf)
+
+    def _request(self, uri, method="GET", body=None):
+        """Send a BIG-IQ request within the deadline of the operation.
+
+        Reads go to the least busy BIG-IQ, writes to the active one.
+        """
+        endpoint = self.endpoints.pick(method)
+        with deadline.bounded(), endpoint.track():
+            return endpoint.make_request(uri, method=method, body=body)
+
+    def _stream(self, uri):
+        """Send a GET and return its body as an iterator of byte chunks."""
+        endpoint = self.endpoints.reader()
+        client = endpoint.client
+        with tracing.span("bigiq_stream", uri=uri), deadline.bounded(), \
+                endpoint.track():
+            resp = stream.open_stream(client, endpoint.session, uri)
+            if resp.status_code == 401:
+                # The token expired, log in again and send it once more
+                resp.close()
+                endpoint.renew(client)
+                resp = stream.open_stream(endpoint.client, endpoint.session,
+                                          uri)
+        if resp.status_code >= 400:
+            try:
+                raise HTTPError(
+                    "Bad request for URL: %s code: %s reason: %s body: %s" %
+                    (uri, resp.status_code, resp.reason, resp.text))
+            finally:
+                resp.close()
+        return stream.iter_content(resp)
+
+    def iter_paged(self, uri, odata_filter=None, select=None,
+                   page_size=100):
+        """Yield the items of a BIG-IQ collection as they are received.
+
+        Pages are requested with $top/$skip, or by following the nextLink
+        of the previous page, and parsed while they stream in, so memory
+        stays bounded by one item whatever the size of the collection.
+        select is a list of the item properties to return.
+        """
+        query = []
+        if odata_filter:
+            query.append("$filter=" + odata_filter)
+        if select:
+            query.append("$select=" + ",".join(select))
+        separator = "&" if "?" in uri else "?"
+
+        skip = 0
+        page_uri = None
+        while True:
+            if page_uri is None:
+                page_uri = uri + separator + "&".join(
+                    ["$top=%d" % page_size, "$skip=%d" % skip] + query)
+            parser = stream.ItemParser()
+            count = 0
+            for chunk in self._stream(page_uri):
+                for item in parser.feed(chunk):
+                    count += 1
+                    yield item
+            parser.close()
+
+            next_link = parser.meta.get("nextLink")
+            if next_link:
+                page_uri = stream.link_path(next_link)
+            elif count < page_size:
+                return
+            else:
+                page_uri = None
+                skip += page_size
 
     def get_info(self):
-        return self.client.get_info()
+        return self.endpoints.writer().get_info()
 
     def get_tenant_device_group(self, tenant_id):
         uri = "/mgmt/shared/resolver/device-groups/tenant_" + tenant_id
         try:
-            resp = self.client.make_request(uri, method="GET")
+            resp = self._request(uri, method="GET")
             return resp
         except HTTPError as ex:
             LOG.error(HTTPError.message)
@@ -30,17 +110,40 @@ class BIGIQManager(object):
             raise ex
 
     def get_devices_in_tenant_device_group(self, tenant_id):
-        uri = ("/mgmt/shared/resolver/device-groups/tenant_" + tenant_id +
-               "/devices?$filter=('product'+eq+'BIG-IP')")
+        uri = "/mgmt/shared/resolver/device-groups/tenant_" + tenant_id + \
+            "/devices"
         try:
-            resp = self.client.make_request(uri, method="GET")
-            return resp['items']
+            return list(self.iter_paged(
+                uri, odata_filter="('product'+eq+'BIG-IP')"))
         except HTTPError as ex:
             LOG.error(HTTPError.message)
             return []
         except Exception as ex:
             raise ex
 
+    def list_paged(self, uri, odata_filter=None, select=None,
+                   page_size=100):
+        """List a BIG-IQ collection page by page with $top/$skip."""
+        return list(self.iter_paged(uri, odata_filter=odata_filter,
+                                    select=select, page_size=page_size))
+
+    def get_devices(self, since=None, select=None, page_size=100):
+        """Iterate over all BIG-IP devices, or those updated after since."""
+        odata_filter = "('product'+eq+'BIG-IP')"
+        if since:
+            odata_filter += "+and+(lastUpdateMicros+gt+%d)" % since
+        return self.iter_paged(bigip_root, odata_filter=odata_filter,
+                               select=select, page_size=page_size)
+
+    def get_tenant_device_groups(self, since=None, select=None,
+                                 page_size=100):
+        """Iterate over tenant device groups, or those updated after since."""
+        odata_filter = "(name+eq+'tenant_*')"
+        if since:
+            odata_filter += "+and+(lastUpdateMicros+gt+%d)" % since
+        return self.iter_paged(device_group_root, odata_filter=odata_filter,
+                               select=select, page_size=page_size)
+
     def create_loadbalancer(self, bigip_id, loadbalancer, **kwargs):
         pass
 
@@ -50,6 +153,21 @@ class BIGIQManager(object):
     def delete_loadbalancer(self, bigip_id, loadbalancer, **kwargs):
         pass
 
+    def get_loadbalancer_stats(self, bigip_id, loadbalancer, **kwargs):
+        return {}
+
+    def get_partition_fingerprint(self, bigip_id, loadbalancer, **kwargs):
+        """Return names and key properties of a loadbalancer partition.
+
+        None means that the deploy mode cannot tell what is on the
+        device.
+        """
+        return None
+
+    def get_member_status(self, bigip_id, loadbalancer, **kwargs):
+        """Return (pool id, member id, monitor state) of each member."""
+        return []
+
     def create_listener(self, bigip_id, listener, loadbalancer, **kwargs):
         pass
 
@@ -89,6 +207,10 @@ class BIGIQManager(object):
                              **kwargs):
         pass
 
+    def sync_l7policies(self, bigip_id, listener, loadbalancer, **kwargs):
+        """Bring the l7policies of a listener on the device up to date."""
+        pass
+
     def create_l7policy(self, bigip_id, l7policy, loadbalancer, **kwargs):
         pass
 
@@ -0,0 +1,202 @@
+import collections
+import contextlib
+import threading
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from .config_cache import body_hash
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.BoolOpt(
+        "shared_objects",
+        default=False,
+        help=("Create health monitors and HTTP profiles once per distinct "
+              "settings on each BIG-IP, in the Common partition, and share "
+              "them between all pools and listeners with those settings, "
+              "instead of creating one per Neutron object. Shared objects "
+              "are reference counted and deleted once no longer used")
+    )
+]
+
+SHARED_PARTITION = "Common"
+
+SHARED_PREFIX = "lbaas-shared-"
+
+# Neutron health monitor types and the BIG-IP monitor of each
+MONITOR_TYPES = {
+    "HTTP": "http",
+    "HTTPS": "https",
+    "TCP": "tcp",
+    "PING": "gateway-icmp"
+}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _expected_codes(expected_codes):
+    """Turn Neutron expected codes, such as 200,202 or 200-204, to a list."""
+    codes = set()
+    for part in (expected_codes or "200").split(","):
+        low, _, high = part.strip().partition("-")
+        if high:
+            codes.update(range(int(low), int(high) + 1))
+        elif low:
+            codes.add(int(low))
+    return sorted(codes)
+
+
+def monitor_settings(health_monitor):
+    """Return the BIG-IP monitor type and settings of a health monitor.
+
+    Settings come out the same for health monitors which check alike,
+    whatever their name or the order of their expected codes.
+    """
+    monitor_type = MONITOR_TYPES.get(health_monitor.get('type', "HTTP"),
+                                     "http")
+    settings = {
+        "interval": int(health_monitor.get('delay', 5)),
+        "timeout": int(health_monitor.get('timeout', 16)) *
+        int(health_monitor.get('max_retries', 1))
+    }
+    if monitor_type in ("http", "https"):
+        settings["send"] = "%s %s HTTP/1.0\\r\\n\\r\\n" % (
+            (health_monitor.get('http_method') or "GET").upper(),
+            health_monitor.get('url_path') or "/")
+        settings["recv"] = "HTTP/1\\.(0|1) (%s)" % "|".join(
+            str(code) for code in
+            _expected_codes(health_monitor.get('expected_codes')))
+    return monitor_type, settings
+
+
+def http_profile_settings(listener):
+    """Return the settings of the HTTP profile of a listener.
+
+    None means that the built-in http profile does.
+    """
+    headers = listener.get('insert_headers') or {}
+    if str(headers.get('X-Forwarded-For', "")).lower() != "true":
+        return None
+    return {
+        "defaultsFrom": "/Common/http",
+        "insertXforwardedFor": "enabled"
+    }
+
+
+def shared_name(kind, settings):
+    """Name the shared object of a kind with settings on every BIG-IP."""
+    return "%s%s-%s" % (SHARED_PREFIX, kind, body_hash(settings)[:16])
+
+
+class SharedObjects(object):
+    """Neutron objects using each shared object of each BIG-IP.
+
+    An object is used by a pool for its health monitor, or by a listener
+    for its profile, and is known by its path below the LTM root, such as
+    monitor/http/~Common~name. A user references at most one object of a
+    kind; once the last user of an object let go of it, it is collected.
+
+    References only live in memory. Shared objects nobody referenced
+    since a restart are left on the device, to be used again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = collections.defaultdict(set)
+        self._objects = {}
+        self._locks = {}
+        self.collected = 0
+
+    @contextlib.contextmanager
+    def lock(self, bigip_id, path):
+        """Serialize creating and deleting path.
+
+        The lock of path is counted by those holding or waiting for it,
+        and dropped once nobody does and path has no users left.
+        """
+        key = (bigip_id, path)
+        with self._lock:
+            lock, holders = self._locks.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._locks[key] = (lock, holders + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                holders = self._locks[key][1] - 1
+                if holders or key in self._users:
+                    self._locks[key] = (lock, holders)
+                else:
+                    del self._locks[key]
+
+    def acquire(self, bigip_id, user, path):
+        """Reference path on behalf of user.
+
+        Return the object user referenced before, if that was its last
+        user, so that it can be collected.
+        """
+        with self._lock:
+            previous = self._objects.get((bigip_id, user))
+            if previous == path:
+                return None
+            self._objects[(bigip_id, user)] = path
+            self._users[(bigip_id, path)].add(user)
+            if previous is not None:
+                return self._drop(bigip_id, user, previous)
+        return None
+
+    def release(self, bigip_id, user):
+        """Drop the reference of user.
+
+        Return the object it referenced, if that was its last user.
+        """
+        with self._lock:
+            path = self._objects.pop((bigip_id, user), None)
+            if path is None:
+                return None
+            return self._drop(bigip_id, user, path)
+
+    def _drop(self, bigip_id, user, path):
+        key = (bigip_id, path)
+        users = self._users[key]
+        users.discard(user)
+        if users:
+            return None
+        del self._users[key]
+        entry = self._locks.get(key)
+        if entry is not None and not entry[1]:
+            # Nobody holds its lock either
+            del self._locks[key]
+        return path
+
+    def in_use(self, bigip_id, path):
+        with self._lock:
+            return (bigip_id, path) in self._users
+
+    def count_collected(self):
+        with self._lock:
+            self.collected += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'objects': len(self._users),
+                'references': len(self._objects),
+                'locks': len(self._locks),
+                'collected': self.collected
+            }
+
+
+def get_shared_objects():
+    """Return the shared object references of all BIG-IQ managers."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = SharedObjects()
+    return _registry
@@ -0,0 +1,233 @@
+import codecs
+import json
+import re
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+from f5_lbaasv2_bigiq_agent import deadline
+
+# Bytes read from a streamed response at a time
+CHUNK_SIZE = 65536
+
+# Seconds to wait for a streamed response to start, or for its next chunk
+READ_TIMEOUT = 60
+
+_SPECIAL = re.compile(r'["{}\[\],:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SPACE = " \t\r\n"
+
+# Parser states
+_OPEN = 0
+_KEY = 1
+_VALUE = 2
+_ITEMS = 3
+_DONE = 4
+
+
+class ItemParser(object):
+    """Parse a JSON list response incrementally, item by item.
+
+    Chunks of the response body are fed as they arrive, and each element
+    of its items array is returned as soon as it is complete. Only the
+    item being received is buffered, whatever the size of the response.
+    The other top level properties, such as nextLink, end up in meta.
+    """
+
+    def __init__(self, key="items"):
+        self.key = key
+        self.meta = {}
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = _OPEN
+        self._name = None
+        # Value being captured: start offset, nesting depth and string
+        # state, kept across chunks
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        """Add a chunk of the body and return the items it completed."""
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        keep = self._pos if self._start is None else self._start
+        self._buf = self._buf[keep:] + data
+        self._pos -= keep
+        if self._start is not None:
+            self._start -= keep
+
+        items = []
+        while self._step(items):
+            pass
+        return items
+
+    def close(self):
+        if self._state != _DONE:
+            raise ValueError("Truncated JSON list response")
+
+    def _skip(self, chars):
+        buf = self._buf
+        while self._pos < len(buf) and buf[self._pos] in chars:
+            self._pos += 1
+        return self._pos < len(buf)
+
+    def _capture(self, stops):
+        """Scan a value up to a stop character outside of it.
+
+        Return the text of the value once complete, or None when more
+        data is needed.
+        """
+        buf = self._buf
+        if self._start is None:
+            self._start = self._pos
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buf, self._pos)
+                if match is None:
+                    self._pos = len(buf)
+                    return None
+                if match.group() == "\\":
+                    if match.end() == len(buf):
+                        # The escaped character is in the next chunk,
+                        # scan the backslash again along with it
+                        self._pos = match.start()
+                        return None
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                continue
+
+            match = _SPECIAL.search(buf, self._pos)
+            if match is None:
+                self._pos = len(buf)
+                return None
+            char = match.group()
+            self._pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif self._depth == 0 and char in stops:
+                text = buf[self._start:match.start()]
+                self._pos = match.start()
+                self._start = None
+                return text
+            elif char in "}]":
+                self._depth -= 1
+
+    def _step(self, items):
+        if self._state == _OPEN:
+            if not self._skip(_SPACE):
+                return False
+            if self._buf[self._pos] != "{":
+                raise ValueError("JSON list response is not an object")
+            self._pos += 1
+            self._state = _KEY
+            return True
+
+        if self._state == _KEY:
+            if self._start is None:
+                if not self._skip(_SPACE + ","):
+                    return False
+                if self._buf[self._pos] == "}":
+                    self._pos += 1
+                    self._state = _DONE
+                    return False
+            text = self._capture(":")
+            if text is None:
+                return False
+            self._name = json.loads(text)
+            self._pos += 1
+            self._state = _VALUE
+            return True
+
+        if self._state == _VALUE:
+            if self._start is None:
+                if not self._skip(_SPACE):
+                    return False
+                if self._name == self.key and self._buf[self._pos] == "[":
+                    self._pos += 1
+                    self._state = _ITEMS
+                    return True
+            text = self._capture(",}")
+            if text is None:
+                return False
+            self.meta[self._name] = json.loads(text)
+            self._state = _KEY
+            return True
+
+        if self._state == _ITEMS:
+            if self._start is None:
+                if not self._skip(_SPACE + ","):
+                    return False
+                if self._buf[self._pos] == "]":
+                    self._pos += 1
+                    self._state = _KEY
+                    return True
+            text = self._capture(",]")
+            if text is None:
+                return False
+            items.append(json.loads(text))
+            return True
+
+        return False
+
+
+def link_path(link):
+    """Return the path and query of a nextLink, to request it again."""
+    parts = urlsplit(link)
+    if parts.query:
+        return parts.path + "?" + parts.query
+    return parts.path
+
+
+def verify_setting(verify, ca_bundle=None):
+    """Return the requests verify setting of a certificate check.
+
+    The CA bundle, when given, is what certificates are checked against,
+    otherwise the system CAs are.
+    """
+    if verify and ca_bundle:
+        return ca_bundle
+    return bool(verify)
+
+
+def new_session(pool_size, verify=False):
+    """Return a pooled HTTP session for streamed requests to a BIG-IQ."""
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                            pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.verify = verify
+    return session
+
+
+def open_stream(client, session, uri):
+    """Send a GET with the token of an f5sdk client, without reading it."""
+    return session.get(
+        "https://%s:%s%s" % (client.host, client.port, uri),
+        headers={"X-F5-Auth-Token": client.token},
+        stream=True, timeout=deadline.timeout(READ_TIMEOUT))
+
+
+def iter_content(resp):
+    """Yield the body of a streamed response chunk by chunk.
+
+    Waiting for each chunk counts against the deadline of the operation.
+    """
+    chunks = resp.iter_content(CHUNK_SIZE)
+    try:
+        while True:
+            with deadline.bounded():
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        resp.close()
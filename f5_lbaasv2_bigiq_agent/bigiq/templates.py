@@ -0,0 +1,87 @@
+import hashlib
+import json
+from json.encoder import encode_basestring_ascii
+
+RAW_CONTENT_TYPE = "application/json"
+
+
+def raw_request():
+    """Return make_request arguments to send a RawBody as it is.
+
+    They are new on every call: f5sdk adds the auth token to the headers
+    it is given.
+    """
+    return {"body_content_type": "raw",
+            "headers": {"Content-Type": RAW_CONTENT_TYPE}}
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+class RawBody(object):
+    """A request body serialized ahead of time.
+
+    The bytes are sent as they are, and the config cache hashes them as
+    they are, instead of serializing a body dict once for its hash and
+    once more to send it. name and partition are those of the object
+    the body creates.
+    """
+
+    __slots__ = ("data", "name", "partition", "_hash")
+
+    def __init__(self, data, name, partition=None):
+        self.data = data
+        self.name = name
+        self.partition = partition
+        self._hash = None
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = hashlib.sha1(self.data).hexdigest()
+        return self._hash
+
+
+class BodyTemplate(object):
+    """The body of a resource type, with its constant members serialized.
+
+    Members named by fields are filled in for each body, in that order,
+    followed by the constant members, serialized when the template is
+    made. Strings are escaped straight into the body; other values are
+    serialized on their own.
+    """
+
+    def __init__(self, fields, **constants):
+        self.fields = tuple(fields)
+        members = ["%s:%%s" % encode_basestring_ascii(field)
+                   for field in self.fields]
+        members += ["%s:%s" % (encode_basestring_ascii(name),
+                               _dumps(constants[name]).replace("%", "%%"))
+                    for name in sorted(constants)]
+        self._format = "{" + ",".join(members) + "}"
+        self._name = self.fields.index("name")
+        self._partition = self.fields.index("partition") \
+            if "partition" in self.fields else None
+
+    def render(self, *values):
+        """Return the body with the given values of fields."""
+        data = self._format % tuple(
+            _dumps(value) if isinstance(value, (list, dict))
+            else encode_basestring_ascii(value) for value in values)
+        return RawBody(data.encode('ascii'), values[self._name],
+                       None if self._partition is None
+                       else values[self._partition])
+
+
+FOLDER = BodyTemplate(("name", "description", "fullPath"), subPath="/")
+
+VIRTUAL = BodyTemplate(("name", "partition", "destination"),
+                       ipProtocol="tcp")
+
+HTTP_VIRTUAL = BodyTemplate(("name", "partition", "destination", "profiles"),
+                            ipProtocol="tcp")
+
+POOL = BodyTemplate(("name", "partition"))
+
+MEMBER = BodyTemplate(("name", "partition", "address"))
@@ -18,3 +18,6 @@ ERROR = "ERROR"
 # Operating Status
 OFFLINE = "OFFLINE"
 ONLINE = "ONLINE"
+DEGRADED = "DEGRADED"
+DISABLED = "DISABLED"
+NO_MONITOR = "NO_MONITOR"
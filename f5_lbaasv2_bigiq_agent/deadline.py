@@ -0,0 +1,144 @@
+import collections
+import threading
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+_local = threading.local()
+_lock = threading.Lock()
+_dropped = collections.Counter()
+_timed_out = collections.Counter()
+
+
+class DeadlineExceeded(Exception):
+
+    def __init__(self, message):
+        super(DeadlineExceeded, self).__init__(message)
+        self.message = message
+
+
+class Deadline(object):
+    """Point in time by which an operation must have finished.
+
+    It is set when the RPC of the operation arrives, so time spent in
+    the queue counts against it, and each BIG-IQ call made on its behalf
+    only gets what is left.
+    """
+    __slots__ = ("klass", "seconds", "expires", "exceeded")
+
+    def __init__(self, klass, seconds):
+        self.klass = klass
+        self.seconds = seconds
+        self.expires = time.time() + seconds
+        self.exceeded = False
+
+    def remaining(self):
+        return self.expires - time.time()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def error(self):
+        return DeadlineExceeded("%s operation exceeded its deadline of %ds"
+                                % (self.klass, self.seconds))
+
+
+def start(conf, klass):
+    """Return the deadline of a new operation of a priority class."""
+    seconds = float(conf.operation_deadlines.get(klass, 0))
+    if seconds <= 0:
+        return None
+    return Deadline(klass, seconds)
+
+
+def current():
+    return getattr(_local, "deadline", None)
+
+
+class _Scope(object):
+    __slots__ = ("deadline", "previous")
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = current()
+        _local.deadline = self.deadline
+        return self.deadline
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.deadline = self.previous
+        return False
+
+
+def scope(deadline):
+    """Run a block of code on behalf of an operation with a deadline."""
+    return _Scope(deadline)
+
+
+class _Bounded(object):
+    __slots__ = ("deadline", "timer")
+
+    def __init__(self):
+        self.deadline = current()
+        self.timer = None
+
+    def __enter__(self):
+        if self.deadline is None:
+            return self
+        remaining = self.deadline.remaining()
+        if remaining <= 0:
+            timed_out(self.deadline)
+            raise self.deadline.error()
+        self.timer = eventlet.Timeout(remaining, self.deadline.error())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.timer is not None:
+            self.timer.cancel()
+        if isinstance(exc, DeadlineExceeded):
+            timed_out(self.deadline)
+        return False
+
+
+def bounded():
+    """Cut a BIG-IQ call short when the current operation runs late."""
+    return _Bounded()
+
+
+def timeout(default):
+    """Return the seconds a call may block, within the current deadline."""
+    deadline = current()
+    if deadline is None:
+        return default
+    return max(min(default, deadline.remaining()), 0.001)
+
+
+def dropped(deadline, name, lane):
+    with _lock:
+        _dropped[deadline.klass] += 1
+    LOG.warning("Drop queued %s of loadbalancer %s, its %s deadline of "
+                "%ds has passed", name, lane, deadline.klass,
+                deadline.seconds)
+
+
+def timed_out(deadline):
+    if deadline is None or deadline.exceeded:
+        return
+    deadline.exceeded = True
+    with _lock:
+        _timed_out[deadline.klass] += 1
+    LOG.warning("A %s operation exceeded its deadline of %ds",
+                deadline.klass, deadline.seconds)
+
+
+def stats():
+    """Return the operations of each class which ran out of time."""
+    with _lock:
+        return dict((klass, {'dropped': _dropped[klass],
+                             'timed_out': _timed_out[klass]})
+                    for klass in set(_dropped) | set(_timed_out))
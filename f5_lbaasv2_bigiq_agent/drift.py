@@ -0,0 +1,216 @@
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import constants
+from f5_lbaasv2_bigiq_agent.bigiq import config_cache
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt(
+        "drift_sample_size",
+        default=20,
+        help=("Number of loadbalancers checked for configuration drift "
+              "in each periodic run. Set it to 0 to disable drift "
+              "detection")
+    ),
+    cfg.IntOpt(
+        "drift_check_budget",
+        default=10,
+        help=("Seconds a periodic drift check may spend before it leaves "
+              "the rest of its sample to the next run")
+    ),
+    cfg.BoolOpt(
+        "drift_repair",
+        default=False,
+        help=("Repair loadbalancers found to differ from the desired "
+              "state, instead of only reporting them. Repairs delete "
+              "what the desired state does not list in a loadbalancer "
+              "partition, so only set it once nothing else writes there")
+    )
+]
+
+CREATE_ORDER = {"folder": 0, "pool": 1, "member": 2, "virtual": 3}
+
+
+def _live(objects):
+    return [obj for obj in objects
+            if obj.get('provisioning_status') != constants.PENDING_DELETE]
+
+
+def desired_fingerprint(loadbalancer):
+    """Return the fingerprint a loadbalancer partition should have."""
+    partition = "loadbalancer-" + loadbalancer['id']
+    fingerprint = {"folder/" + partition: ""}
+
+    for listener in _live(loadbalancer.get('listeners', [])):
+        key = "virtual/listener-" + listener['id']
+        fingerprint[key] = (loadbalancer['vip_address'] + ":" +
+                            str(listener['protocol_port']))
+
+    for pool in _live(loadbalancer.get('pools', [])):
+        pool_name = "pool-" + pool['id']
+        fingerprint["pool/" + pool_name] = ""
+        for member in _live(pool.get('members', [])):
+            key = "member/%s/member-%s:%s" % (
+                pool_name, member['id'], member['protocol_port'])
+            fingerprint[key] = member['address']
+
+    return fingerprint
+
+
+def _diff(desired, actual):
+    """Return the keys which are missing or differ, and the extra ones."""
+    changed = [key for key, value in desired.items()
+               if actual.get(key) != value]
+    extra = [key for key in actual if key not in desired]
+    return sorted(changed), sorted(extra)
+
+
+def apply_diff(bigiq, bigip_id, loadbalancer, changed, extra):
+    """Create missing or changed objects, and delete extra ones."""
+    listeners = dict(("listener-" + listener['id'], listener)
+                     for listener in loadbalancer.get('listeners', []))
+    pools = dict(("pool-" + pool['id'], pool)
+                 for pool in loadbalancer.get('pools', []))
+
+    # Parents are created before their children, and deleted after.
+    for key in sorted(changed, key=lambda k: (
+            CREATE_ORDER[k.split("/", 1)[0]], k)):
+        kind, name = key.split("/", 1)
+        if kind == "folder":
+            bigiq.create_loadbalancer(bigip_id, loadbalancer)
+        elif kind == "pool":
+            bigiq.create_pool(bigip_id, pools[name], loadbalancer)
+        elif kind == "member":
+            pool_name, member_name = name.split("/", 1)
+            pool = pools[pool_name]
+            for member in pool.get('members', []):
+                if member_name == "member-%s:%s" % (
+                        member['id'], member['protocol_port']):
+                    bigiq.create_member(bigip_id, member, loadbalancer,
+                                        pool=pool)
+        elif kind == "virtual":
+            bigiq.create_listener(bigip_id, listeners[name],
+                                  loadbalancer)
+
+    # Members of extra pools go away with their pool.
+    extra_pools = set(key.split("/", 1)[1] for key in extra
+                      if key.startswith("pool/"))
+    for key in sorted(extra, key=lambda k: (
+            -CREATE_ORDER[k.split("/", 1)[0]], k)):
+        kind, name = key.split("/", 1)
+        if kind == "virtual" and name.startswith("listener-"):
+            bigiq.delete_listener(
+                bigip_id, {'id': name[len("listener-"):]}, loadbalancer)
+        elif kind == "pool" and name.startswith("pool-"):
+            bigiq.delete_pool(
+                bigip_id, {'id': name[len("pool-"):]}, loadbalancer)
+        elif kind == "member":
+            pool_name, member_name = name.split("/", 1)
+            if pool_name in extra_pools or \
+                    not member_name.startswith("member-"):
+                continue
+            member_id, port = \
+                member_name[len("member-"):].rsplit(":", 1)
+            bigiq.delete_member(
+                bigip_id, {'id': member_id, 'protocol_port': port},
+                loadbalancer, pool={'id': pool_name[len("pool-"):]})
+
+
+def rebuild_partition(bigiq, bigip_id, loadbalancer):
+    """Create the whole partition of a loadbalancer on a BIG-IP."""
+    apply_diff(bigiq, bigip_id, loadbalancer,
+               sorted(desired_fingerprint(loadbalancer)), [])
+    for pool in _live(loadbalancer.get('pools', [])):
+        if pool.get('healthmonitor'):
+            bigiq.create_health_monitor(bigip_id, pool['healthmonitor'],
+                                        loadbalancer, pool=pool)
+    for listener in _live(loadbalancer.get('listeners', [])):
+        if listener.get('l7policies'):
+            bigiq.sync_l7policies(bigip_id, listener, loadbalancer)
+
+
+def remove_partition(bigiq, bigip_id, loadbalancer):
+    """Delete the whole partition of a loadbalancer from a BIG-IP."""
+    apply_diff(bigiq, bigip_id, loadbalancer, [],
+               sorted(desired_fingerprint(loadbalancer)))
+    bigiq.delete_loadbalancer(bigip_id, loadbalancer)
+
+
+class DriftDetector(object):
+    """Compare a rotating sample of loadbalancers with the devices.
+
+    Each run takes the loadbalancers after the one where the last run
+    stopped, and compares the fingerprint of each partition with the one
+    derived from the desired state, until the sample size or the time
+    budget is used up. Loadbalancers that differ are reported, and with
+    drift_repair only they are repaired, with the regular BIG-IQ manager
+    calls.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self._cursor = None
+        self.checked = 0
+        self.drifted = 0
+
+    def _sample(self, lb_ids):
+        lb_ids = sorted(lb_ids)
+        if self._cursor is not None:
+            after = [lb_id for lb_id in lb_ids if lb_id > self._cursor]
+            lb_ids = after + [lb_id for lb_id in lb_ids
+                              if lb_id <= self._cursor]
+        return lb_ids[:self.conf.drift_sample_size]
+
+    def run(self, bigiq, placements, desired, skip=None):
+        """Check a sample of placed loadbalancers against desired state.
+
+        skip tells whether a loadbalancer has work in flight, in which
+        case it is left for a later run.
+        """
+        if self.conf.drift_sample_size <= 0:
+            return
+
+        deadline = time.time() + self.conf.drift_check_budget
+        for lb_id in self._sample([lb_id for lb_id in placements
+                                   if lb_id in desired]):
+            if time.time() >= deadline:
+                break
+            self._cursor = lb_id
+            if skip and skip(lb_id):
+                continue
+            try:
+                self._check(bigiq, placements[lb_id], desired[lb_id])
+            except Exception as ex:
+                LOG.error("Fail to check drift of loadbalancer %s: %s",
+                          lb_id, ex)
+
+    def _check(self, bigiq, bigip_id, loadbalancer):
+        actual = bigiq.get_partition_fingerprint(bigip_id, loadbalancer)
+        if actual is None:
+            return
+        self.checked += 1
+
+        changed, extra = _diff(desired_fingerprint(loadbalancer), actual)
+        if not changed and not extra:
+            return
+
+        self.drifted += 1
+        LOG.warning("Loadbalancer %s drifted on BIG-IP %s: %d missing or "
+                    "changed, %d extra objects", loadbalancer['id'],
+                    bigip_id, len(changed), len(extra))
+
+        # What is on the device is unknown now, don't let remembered
+        # hashes skip the repair.
+        partition = "loadbalancer-" + loadbalancer['id']
+        bigiq.config_cache.invalidate(
+            config_cache.scope(bigip_id, partition))
+
+        if self.conf.drift_repair:
+            apply_diff(bigiq, bigip_id, loadbalancer, changed, extra)
+
+    def stats(self):
+        return {'checked': self.checked, 'drifted': self.drifted}
@@ -0,0 +1,156 @@
+import collections
+import time
+
+from eventlet import semaphore
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import constants
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt(
+        "evacuation_concurrency",
+        default=50,
+        help=("Number of loadbalancers an evacuation rebuilds in parallel "
+              "on their new BIG-IPs")
+    ),
+    cfg.IntOpt(
+        "evacuation_target_concurrency",
+        default=10,
+        help=("Most loadbalancers an evacuation rebuilds at once on any "
+              "one BIG-IP, so that the devices taking over are not "
+              "flooded")
+    ),
+    cfg.IntOpt(
+        "evacuation_status_batch_size",
+        default=1,
+        help=("Number of loadbalancer statuses packed into one message to "
+              "the plugin during an evacuation. 1 sends one "
+              "update_loadbalancer_status message per loadbalancer; only "
+              "raise it with a plugin driver that implements "
+              "update_loadbalancers_status")
+    )
+]
+
+# Seconds after which pending statuses are sent, even in a partial batch
+STATUS_INTERVAL = 5.0
+
+
+class Evacuation(object):
+    """Progress of moving every loadbalancer off a failed BIG-IP.
+
+    Each loadbalancer is rebuilt on its new BIG-IP and only then placed
+    there, one at a time, so an evacuation that stopped halfway resumes
+    with the loadbalancers still placed on the failed device. Rebuilds
+    on each target are bounded by a semaphore of their own. Statuses are
+    collected and sent to the plugin in batches.
+
+    The partitions of the loadbalancers moved are left on the failed
+    BIG-IP, which cannot be reached. They are kept as stale, to be
+    removed once the device is back.
+    """
+
+    def __init__(self, conf, plugin_rpc, bigip_id, lb_ids):
+        self.conf = conf
+        self.plugin_rpc = plugin_rpc
+        self.bigip_id = bigip_id
+        self.total = len(lb_ids)
+        self.moved = 0
+        self.failed = 0
+        self.skipped = 0
+        self.targets = collections.Counter()
+        # Graph of each loadbalancer moved, whose partition is left on the
+        # failed BIG-IP
+        self.stale = {}
+        self.started_at = time.time()
+        self.finished_at = None
+        self._slots = {}
+        self._statuses = {}
+        self._reported_at = self.started_at
+
+    @property
+    def running(self):
+        return self.finished_at is None
+
+    def slot(self, target):
+        """Return the semaphore bounding the rebuilds on a target."""
+        if target not in self._slots:
+            self._slots[target] = semaphore.Semaphore(
+                max(1, self.conf.evacuation_target_concurrency))
+        return self._slots[target]
+
+    def moved_to(self, loadbalancer, target):
+        self.moved += 1
+        self.targets[target] += 1
+        self.stale[loadbalancer['id']] = loadbalancer
+        self._status(loadbalancer['id'], constants.ACTIVE, constants.ONLINE)
+
+    def cleaned(self, lb_id):
+        """Tell that the stale partition of a loadbalancer is removed."""
+        self.stale.pop(lb_id, None)
+
+    def fail(self, loadbalancer):
+        self.failed += 1
+        self._status(loadbalancer['id'], constants.ERROR,
+                     loadbalancer.get('operating_status'))
+
+    def skip(self, lb_id):
+        self.skipped += 1
+
+    def _status(self, lb_id, provisioning_status, operating_status):
+        self._statuses[lb_id] = {'provisioning_status': provisioning_status,
+                                 'operating_status': operating_status}
+        if len(self._statuses) >= self.conf.evacuation_status_batch_size or \
+                time.time() - self._reported_at >= STATUS_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Send the pending statuses to the plugin, in batches."""
+        statuses = self._statuses
+        self._statuses = {}
+        self._reported_at = time.time()
+
+        lb_ids = sorted(statuses)
+        batch_size = self.conf.evacuation_status_batch_size
+        try:
+            if batch_size <= 1:
+                for lb_id in lb_ids:
+                    self.plugin_rpc.update_loadbalancer_status(
+                        lb_id, statuses[lb_id]['provisioning_status'],
+                        statuses[lb_id]['operating_status'])
+                return len(lb_ids)
+
+            for i in range(0, len(lb_ids), batch_size):
+                self.plugin_rpc.update_loadbalancers_status(
+                    dict((lb_id, statuses[lb_id])
+                         for lb_id in lb_ids[i:i + batch_size]))
+        except Exception as ex:
+            LOG.exception("Fail to report statuses of loadbalancers "
+                          "evacuated off BIG-IP %s: %s", self.bigip_id, ex)
+        return len(lb_ids)
+
+    def finish(self):
+        self.flush()
+        self.finished_at = time.time()
+        LOG.info("Evacuated BIG-IP %s in %.1fs: %d moved, %d failed, %d "
+                 "skipped", self.bigip_id,
+                 self.finished_at - self.started_at, self.moved,
+                 self.failed, self.skipped)
+
+    def stats(self):
+        done = self.moved + self.failed + self.skipped
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'running': self.running,
+            'total': self.total,
+            'moved': self.moved,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'remaining': self.total - done,
+            'stale': len(self.stale),
+            'elapsed': round(elapsed, 1),
+            'rate': round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            'targets': dict(self.targets)
+        }
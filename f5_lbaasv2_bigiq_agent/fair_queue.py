@@ -0,0 +1,286 @@
+import collections
+import functools
+import heapq
+import itertools
+import threading
+import time
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import deadline
+from f5_lbaasv2_bigiq_agent import journal
+
+LOG = logging.getLogger(__name__)
+
+# Priority classes of agent RPC work
+DELETE = "delete"
+UPDATE = "update"
+CREATE = "create"
+STATS = "stats"
+
+CLASSES = (DELETE, UPDATE, CREATE, STATS)
+
+OPTS = [
+    cfg.IntOpt(
+        "rpc_queue_workers",
+        default=16,
+        help=("Number of workers serving the fair RPC work queue. Set it "
+              "to 0 to run handlers directly in the RPC dispatcher")
+    ),
+    cfg.DictOpt(
+        "rpc_class_weights",
+        default={DELETE: 8, UPDATE: 4, CREATE: 2, STATS: 1},
+        help=("Weight of each priority class in the fair RPC work queue")
+    ),
+    cfg.IntOpt(
+        "rpc_queue_max_wait",
+        default=60,
+        help=("Seconds after which queued work is served ahead of its "
+              "fair share, so that low priority work never starves")
+    ),
+    cfg.DictOpt(
+        "operation_deadlines",
+        default={DELETE: 600, UPDATE: 300, CREATE: 300, STATS: 60},
+        help=("Seconds an operation of each priority class has from the "
+              "arrival of its RPC until it is done, queue time included. "
+              "Queued work past its deadline is dropped, BIG-IQ calls "
+              "only get the time left, and the loadbalancer of an "
+              "operation out of time is set to ERROR. Set a class to 0 "
+              "for no deadline")
+    )
+]
+
+
+class _Work(object):
+    __slots__ = ("func", "args", "kwargs", "klass", "tenant_id", "lane",
+                 "callback", "deadline", "expired", "enqueued", "ready",
+                 "tag", "taken")
+
+    def __init__(self, func, args, kwargs, klass, tenant_id, lane,
+                 callback, deadline, expired):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.klass = klass
+        self.tenant_id = tenant_id
+        self.lane = lane
+        self.callback = callback
+        self.deadline = deadline
+        self.expired = expired
+        self.enqueued = time.time()
+        self.ready = None
+        self.tag = 0.0
+        self.taken = False
+
+
+class FairQueue(object):
+    """Weighted fair queue of RPC work across tenants and classes.
+
+    Every (tenant, priority class) pair is a flow weighted by its class.
+    Work is served in order of its virtual finish tag, so a tenant with
+    thousands of queued creates gets its fair share and no more, while
+    other tenants' deletes get ahead of it.
+
+    Work on one loadbalancer is kept in a lane and becomes eligible only
+    after the previous work on that loadbalancer finished, which keeps
+    its order intact. Eligible work that waited longer than max_wait is
+    served first.
+    """
+
+    def __init__(self, weights, max_wait):
+        self._weights = dict((klass, float(weight))
+                             for klass, weight in weights.items())
+        self._max_wait = max_wait
+        self._cond = threading.Condition()
+        self._heap = []
+        self._aged = collections.deque()
+        self._eligible = 0
+        self._lanes = {}
+        self._finish = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        self._depth = collections.Counter()
+        self._served = collections.Counter()
+        self._wait_total = collections.Counter()
+        self._wait_max = {}
+
+    def _make_ready(self, work):
+        flow = (work.tenant_id, work.klass)
+        weight = self._weights.get(work.klass, 1.0)
+        start = max(self._vtime, self._finish.get(flow, 0.0))
+        work.tag = start + 1.0 / weight
+        work.ready = time.time()
+        self._finish[flow] = work.tag
+        heapq.heappush(self._heap, (work.tag, next(self._seq), work))
+        self._aged.append(work)
+        self._eligible += 1
+        self._cond.notify()
+
+    def put(self, work):
+        with self._cond:
+            self._depth[work.klass] += 1
+            if work.lane is None:
+                self._make_ready(work)
+            elif work.lane in self._lanes:
+                self._lanes[work.lane].append(work)
+            else:
+                self._lanes[work.lane] = collections.deque()
+                self._make_ready(work)
+
+    def _take(self):
+        while self._aged and self._aged[0].taken:
+            self._aged.popleft()
+        if self._aged and \
+                time.time() - self._aged[0].ready >= self._max_wait:
+            return self._aged.popleft()
+
+        while True:
+            _, _, work = heapq.heappop(self._heap)
+            if not work.taken:
+                return work
+
+    def get(self):
+        """Block until work is eligible, then return the next one."""
+        with self._cond:
+            while self._eligible == 0:
+                self._cond.wait()
+
+            work = self._take()
+            work.taken = True
+            self._eligible -= 1
+            self._vtime = max(self._vtime, work.tag)
+
+            wait = time.time() - work.enqueued
+            self._depth[work.klass] -= 1
+            self._served[work.klass] += 1
+            self._wait_total[work.klass] += wait
+            self._wait_max[work.klass] = max(
+                self._wait_max.get(work.klass, 0.0), wait)
+            return work
+
+    def done(self, work):
+        """Release the lane of finished work."""
+        if work.lane is None:
+            return
+        with self._cond:
+            lane = self._lanes[work.lane]
+            if lane:
+                self._make_ready(lane.popleft())
+            else:
+                del self._lanes[work.lane]
+
+    def busy(self, lane):
+        """Tell whether work on a lane is queued or running."""
+        return lane in self._lanes
+
+    def stats(self):
+        """Return queue depth and queue time of each priority class."""
+        with self._cond:
+            stats = {}
+            for klass in CLASSES:
+                served = self._served[klass]
+                stats[klass] = {
+                    'depth': self._depth[klass],
+                    'served': served,
+                    'avg_wait': round(
+                        self._wait_total[klass] / served, 3) if served
+                    else 0.0,
+                    'max_wait': round(self._wait_max.get(klass, 0.0), 3)
+                }
+            return stats
+
+
+class FairQueueDispatcher(object):
+    """Run queued RPC work on a fixed set of green workers."""
+
+    def __init__(self, conf):
+        self.queue = FairQueue(conf.rpc_class_weights,
+                               conf.rpc_queue_max_wait)
+        for _ in range(conf.rpc_queue_workers):
+            eventlet.spawn_n(self._work)
+
+    def submit(self, klass, func, args, kwargs, tenant_id=None, lane=None,
+               callback=None, deadline=None, expired=None):
+        """Queue work, which is dropped unrun once deadline has passed.
+
+        expired is then called instead of func, to report the failure.
+        """
+        self.queue.put(_Work(func, args, kwargs, klass, tenant_id, lane,
+                             callback, deadline, expired))
+
+    def _run(self, work):
+        if work.deadline is not None and work.deadline.expired():
+            deadline.dropped(work.deadline, work.func.__name__, work.lane)
+            if work.expired:
+                work.expired()
+            return
+        with deadline.scope(work.deadline):
+            work.func(*work.args, **work.kwargs)
+
+    def _work(self):
+        while True:
+            work = self.queue.get()
+            try:
+                self._run(work)
+            except Exception as ex:
+                LOG.exception("Fail to run queued %s: %s",
+                              work.func.__name__, ex)
+            finally:
+                try:
+                    if work.callback:
+                        work.callback()
+                finally:
+                    self.queue.done(work)
+
+    def busy(self, lane):
+        return self.queue.busy(lane)
+
+    def stats(self):
+        return self.queue.stats()
+
+
+def queued(klass):
+    """Queue an RPC handler of F5BIGIQAgentManager by priority class.
+
+    The handler returns as soon as its work is queued. If the handler is
+    journaled, the intent is journaled before it is queued, so that
+    queued work survives an agent crash.
+
+    The operation gets the deadline of its class from now. When it has
+    passed by the time the work is served, the handler does not run and
+    the manager reports the operation as expired instead.
+    """
+    def decorator(func):
+        handler = getattr(func, "unjournaled", None)
+
+        @functools.wraps(func)
+        def wrapper(self, context, **kwargs):
+            limit = deadline.start(self.conf, klass)
+            dispatcher = getattr(self, "dispatcher", None)
+            if dispatcher is None:
+                with deadline.scope(limit):
+                    return func(self, context, **kwargs)
+
+            loadbalancer = kwargs.get('loadbalancer') or {}
+            tenant_id = loadbalancer.get('tenant_id')
+            lane = loadbalancer.get('id')
+
+            def expired():
+                if klass != STATS:
+                    self._operation_expired(func.__name__, kwargs)
+
+            if handler is None:
+                dispatcher.submit(klass, func, (self, context), kwargs,
+                                  tenant_id, lane, deadline=limit,
+                                  expired=expired)
+                return
+
+            op_id = journal.begin_operation(self, func.__name__, kwargs)
+            dispatcher.submit(klass, handler, (self, context), kwargs,
+                              tenant_id, lane,
+                              lambda: journal.end_operation(self, op_id),
+                              limit, expired)
+        return wrapper
+    return decorator
@@ -0,0 +1,253 @@
+import functools
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt(
+        "journal_path",
+        default=None,
+        help=("Path of the write-ahead operation journal. Leave it unset "
+              "to disable the journal")
+    ),
+    cfg.IntOpt(
+        "journal_sync_delay",
+        default=5,
+        help=("Milliseconds to wait for more intents before an fsync, so "
+              "that concurrent handlers share one fsync")
+    ),
+    cfg.IntOpt(
+        "journal_compact_threshold",
+        default=1000,
+        help=("Number of completed operations after which the journal is "
+              "rewritten with only in-flight operations and placements")
+    ),
+    cfg.StrOpt(
+        "journal_recovery",
+        default="replay",
+        choices=["replay", "rollback"],
+        help=("What to do on startup with operations that were in flight "
+              "when the agent stopped: replay them against BIG-IQ, or "
+              "set their loadbalancer to ERROR")
+    )
+]
+
+# Each record is framed as payload length and CRC32, followed by the
+# JSON payload. A torn record at the tail is detected and truncated.
+HEADER = struct.Struct("!II")
+
+BEGIN = "b"
+END = "e"
+PLACE = "p"
+UNPLACE = "u"
+
+
+def _frame(record):
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff) + \
+        payload
+
+
+def _read_records(fd):
+    """Yield (record, end offset) until EOF or the first torn record."""
+    offset = 0
+    while True:
+        header = fd.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        length, crc = HEADER.unpack(header)
+        payload = fd.read(length)
+        if len(payload) < length or \
+                zlib.crc32(payload) & 0xffffffff != crc:
+            return
+        offset += HEADER.size + length
+        yield json.loads(payload.decode('utf-8')), offset
+
+
+class OperationJournal(object):
+    """Append-only write-ahead journal of agent operations.
+
+    A handler records its intent before calling BIG-IQ, and its
+    completion once the loadbalancer status has been reported. Intents
+    are fsynced before the handler proceeds; handlers that arrive while
+    an fsync is pending share it. Completions are not synced on their
+    own: losing one only means a finished operation is replayed, and
+    every handler tolerates that.
+
+    The journal also keeps loadbalancer placements, so that replayed
+    operations find the BIG-IP they belong to.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.path = conf.journal_path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._next_id = 1
+        self._written = 0
+        self._synced = 0
+        self._completed = 0
+        self._inflight = {}
+        self._placements = {}
+        self._tenants = {}
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load()
+        self._fd = open(self.path, "ab")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        good = 0
+        with open(self.path, "rb") as fd:
+            for record, good in _read_records(fd):
+                self._apply(record)
+            fd.seek(0, os.SEEK_END)
+            size = fd.tell()
+
+        if good < size:
+            LOG.warning("Truncate torn journal tail of %s at %d",
+                        self.path, good)
+            with open(self.path, "r+b") as fd:
+                fd.truncate(good)
+
+    def _apply(self, record):
+        op = record['op']
+        if op == BEGIN:
+            self._inflight[record['id']] = record
+            self._next_id = max(self._next_id, record['id'] + 1)
+        elif op == END:
+            self._inflight.pop(record['id'], None)
+        elif op == PLACE:
+            self._placements[record['lb']] = record['bigip']
+            if record.get('tenant'):
+                self._tenants[record['lb']] = record['tenant']
+        elif op == UNPLACE:
+            self._placements.pop(record['lb'], None)
+            self._tenants.pop(record['lb'], None)
+
+    def _append(self, record):
+        data = _frame(record)
+        with self._lock:
+            self._fd.write(data)
+            self._apply(record)
+            self._written += 1
+            return self._written
+
+    def _sync(self, seq):
+        with self._sync_lock:
+            if self._synced >= seq:
+                # Somebody else fsynced our record while we waited.
+                return
+            if self.conf.journal_sync_delay > 0:
+                eventlet.sleep(self.conf.journal_sync_delay / 1000.0)
+            with self._lock:
+                self._fd.flush()
+                target = self._written
+            os.fsync(self._fd.fileno())
+            self._synced = target
+
+    def begin(self, method, args):
+        """Durably record an intent and return its operation id."""
+        with self._lock:
+            op_id = self._next_id
+            self._next_id += 1
+        record = {'op': BEGIN, 'id': op_id, 'method': method,
+                  'args': args, 'ts': time.time()}
+        self._sync(self._append(record))
+        return op_id
+
+    def end(self, op_id):
+        """Record that an operation finished."""
+        self._append({'op': END, 'id': op_id})
+        self._completed += 1
+        if self._completed >= self.conf.journal_compact_threshold:
+            self.compact()
+
+    def place(self, lb_id, bigip_id, tenant_id=None):
+        self._sync(self._append({'op': PLACE, 'lb': lb_id,
+                                 'bigip': bigip_id, 'tenant': tenant_id}))
+
+    def unplace(self, lb_id):
+        self._append({'op': UNPLACE, 'lb': lb_id})
+
+    def placements(self):
+        return dict(self._placements)
+
+    def tenants(self):
+        """Return the tenant of each placed loadbalancer, when known."""
+        return dict(self._tenants)
+
+    def inflight(self):
+        """Return the operations that never completed, oldest first."""
+        return [self._inflight[op_id] for op_id in sorted(self._inflight)]
+
+    def compact(self):
+        """Rewrite the journal with only live placements and intents."""
+        with self._sync_lock:
+            with self._lock:
+                tmp_path = self.path + ".compact"
+                with open(tmp_path, "wb") as fd:
+                    for lb_id, bigip_id in self._placements.items():
+                        fd.write(_frame({'op': PLACE, 'lb': lb_id,
+                                         'bigip': bigip_id,
+                                         'tenant': self._tenants.get(lb_id)}))
+                    for op_id in sorted(self._inflight):
+                        fd.write(_frame(self._inflight[op_id]))
+                    fd.flush()
+                    os.fsync(fd.fileno())
+                self._fd.close()
+                os.rename(tmp_path, self.path)
+                self._fd = open(self.path, "ab")
+                self._synced = self._written
+                self._completed = 0
+        LOG.debug("Compacted journal %s: %d placements, %d in flight",
+                  self.path, len(self._placements), len(self._inflight))
+
+
+def begin_operation(manager, method, args):
+    """Journal an intent for the manager, if it keeps a journal."""
+    journal = getattr(manager, "journal", None)
+    if journal is None:
+        return None
+    try:
+        return journal.begin(method, args)
+    except Exception as ex:
+        LOG.exception("Fail to journal %s: %s", method, ex)
+        return None
+
+
+def end_operation(manager, op_id):
+    if op_id is not None:
+        manager.journal.end(op_id)
+
+
+def journaled(func):
+    """Journal an RPC handler of F5BIGIQAgentManager.
+
+    The handler keyword arguments are recorded before it runs, and its
+    completion after it returns, whether it succeeded or not. The bare
+    handler stays reachable as the unjournaled attribute, for callers
+    which journal the operation themselves.
+    """
+    @functools.wraps(func)
+    def wrapper(self, context, **kwargs):
+        op_id = begin_operation(self, func.__name__, kwargs)
+        try:
+            return func(self, context, **kwargs)
+        finally:
+            end_operation(self, op_id)
+    wrapper.unjournaled = func
+    return wrapper
@@ -0,0 +1,194 @@
+import collections
+import json
+import re
+import threading
+
+import eventlet
+
+from f5sdk.exceptions import HTTPError
+
+from f5_lbaasv2_bigiq_agent.bigiq.icontrol import BIGIQManagerIControl
+from f5_lbaasv2_bigiq_agent.bigiq.config_cache import get_config_cache
+from f5_lbaasv2_bigiq_agent.bigiq import direct
+from f5_lbaasv2_bigiq_agent.bigiq import endpoints
+
+_QUERY = re.compile(r"\$(top|skip)=(\d+)")
+
+# Simulated responses are streamed in chunks this small, so that parsing
+# across chunk boundaries is exercised
+STREAM_CHUNK_SIZE = 512
+
+
+def _error(uri, code):
+    message = "Bad request for URL: %s code: %d reason: simulated" % (
+        uri, code)
+    ex = HTTPError(message)
+    # The agent reads it, as exceptions have it on Python 2
+    ex.message = message
+    return ex
+
+
+class FakeBIGIQClient(object):
+    """Answer BIG-IQ and rest-proxy requests from memory.
+
+    It stands for f5sdk ManagementClient. BIG-IP devices are made up and
+    all belong to every tenant device group. Objects created through the
+    rest-proxy are kept, so that later reads, conflicts and deletes
+    behave like on a device. Each request takes latency seconds.
+    """
+
+    def __init__(self, devices=4, latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._objects = {}
+        self.calls = collections.Counter()
+        self._devices = [{
+            'uuid': "bigip-%04d" % i,
+            'product': "BIG-IP",
+            'state': "ACTIVE",
+            'version': "15.1.0",
+            'address': "192.0.2.%d" % (i + 1),
+            'hostname': "bigip-%04d.example.com" % i,
+            'lastUpdateMicros': 1
+        } for i in range(devices)]
+
+    def get_info(self):
+        return {'version': "7.1.0"}
+
+    def make_request(self, uri, method="GET", body=None, **kwargs):
+        if kwargs.get("body_content_type") == "raw":
+            body = json.loads(body.decode('utf-8'))
+        with self._lock:
+            self.calls[method] += 1
+        if self.latency:
+            eventlet.sleep(self.latency)
+
+        path, _, query = uri.partition("?")
+        path = path.rstrip("/")
+        if method == "GET":
+            return self._get(uri, path, query)
+        if method == "POST":
+            if body.get("command") == "publish":
+                return self._publish(uri, path, body["name"])
+            if body.get("subPath") == "Drafts":
+                key = "%s/~%s~Drafts~%s" % (path, body["partition"],
+                                            body["name"])
+            elif body.get("partition"):
+                key = "%s/~%s~%s" % (path, body["partition"], body["name"])
+            else:
+                key = "%s/~%s" % (path, body["name"])
+            with self._lock:
+                if key in self._objects:
+                    raise _error(uri, 409)
+                self._objects[key] = body
+            return body
+        if method in ("PUT", "PATCH"):
+            with self._lock:
+                self._objects.setdefault(path, {}).update(body or {})
+            return body
+        if method == "DELETE":
+            with self._lock:
+                if self._objects.pop(path, None) is None:
+                    raise _error(uri, 404)
+            return None
+        raise _error(uri, 405)
+
+    def _publish(self, uri, path, name):
+        # Publishing a draft LTM policy moves it out of Drafts
+        partition, _, name = name.strip("/").partition("/Drafts/")
+        with self._lock:
+            draft = self._objects.pop(
+                "%s/~%s~Drafts~%s" % (path, partition, name), None)
+            if draft is None:
+                raise _error(uri, 404)
+            self._objects["%s/~%s~%s" % (path, partition, name)] = \
+                dict(draft, subPath="/")
+        return None
+
+    def _get(self, uri, path, query):
+        if path.endswith("/devices"):
+            paging = dict(_QUERY.findall(query))
+            skip = int(paging.get("skip", 0))
+            top = int(paging.get("top", len(self._devices)))
+            return {'items': self._devices[skip:skip + top]}
+        if path.endswith("/device-groups"):
+            return {'items': []}
+        if path.endswith("/stats"):
+            return {'entries': {}}
+
+        with self._lock:
+            if path in self._objects:
+                return self._objects[path]
+            prefix = path + "/"
+            items = [body for key, body in self._objects.items()
+                     if key.startswith(prefix) and "/" not in
+                     key[len(prefix):]]
+        if items or "$filter" in query:
+            paging = dict(_QUERY.findall(query))
+            skip = int(paging.get("skip", 0))
+            top = int(paging.get("top", len(items)))
+            return {'items': items[skip:skip + top]}
+        raise _error(uri, 404)
+
+    def stats(self):
+        return {'calls': sum(self.calls.values()),
+                'by_method': dict(self.calls)}
+
+
+class RecordedBIGIQClient(FakeBIGIQClient):
+    """Answer requests with responses recorded from a real BIG-IQ.
+
+    The recording has one JSON object per line with method, uri, status,
+    body and elapsed seconds. Requests are matched on method and URI,
+    with the answers of a request replayed in turn; requests that were
+    not recorded are answered by the in-memory fake.
+    """
+
+    def __init__(self, path, devices=4, latency=0.0):
+        super(RecordedBIGIQClient, self).__init__(devices, latency)
+        self._recorded = collections.defaultdict(collections.deque)
+        with open(path) as fd:
+            for line in fd:
+                if line.strip():
+                    record = json.loads(line)
+                    self._recorded[(record['method'],
+                                    record['uri'])].append(record)
+        self.replayed = 0
+
+    def make_request(self, uri, method="GET", body=None, **kwargs):
+        answers = self._recorded.get((method, uri))
+        if not answers:
+            return super(RecordedBIGIQClient, self).make_request(
+                uri, method=method, body=body, **kwargs)
+
+        record = answers[0]
+        answers.rotate(-1)
+        with self._lock:
+            self.calls[method] += 1
+            self.replayed += 1
+        eventlet.sleep(record.get('elapsed', 0))
+        if record.get('status', 200) >= 400:
+            raise _error(uri, record['status'])
+        return record.get('body')
+
+    def stats(self):
+        stats = super(RecordedBIGIQClient, self).stats()
+        stats['replayed'] = self.replayed
+        return stats
+
+
+class SimulatedBIGIQManager(BIGIQManagerIControl):
+    """iControl BIG-IQ manager which talks to a simulated client."""
+
+    def __init__(self, conf, client):
+        self.conf = conf
+        self.endpoints = endpoints.EndpointPool(
+            conf, [endpoints.Endpoint("simulated", client=client)])
+        self.config_cache = get_config_cache(conf)
+        self.transport = direct.get_direct_transport(conf)
+
+    def _stream(self, uri):
+        body = self._request(uri, method="GET") or {}
+        data = json.dumps(body).encode("utf-8")
+        return [data[i:i + STREAM_CHUNK_SIZE]
+                for i in range(0, len(data), STREAM_CHUNK_SIZE)]
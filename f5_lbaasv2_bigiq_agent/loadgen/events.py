@@ -0,0 +1,248 @@
+import copy
+import uuid
+
+from f5_lbaasv2_bigiq_agent import constants
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+LOADBALANCER = "loadbalancer"
+LISTENER = "listener"
+POOL = "pool"
+MEMBER = "member"
+HEALTH_MONITOR = "health_monitor"
+L7POLICY = "l7policy"
+
+KINDS = (LOADBALANCER, LISTENER, POOL, MEMBER, HEALTH_MONITOR, L7POLICY)
+
+# Loadbalancers tried before an operation falls back to a create
+SEARCH_TRIES = 20
+
+DEFAULT_OPS = {CREATE: 6, UPDATE: 3, DELETE: 1}
+DEFAULT_KINDS = {LOADBALANCER: 1, LISTENER: 2, POOL: 2, MEMBER: 8,
+                 HEALTH_MONITOR: 1, L7POLICY: 1}
+
+
+def parse_mix(text, names):
+    """Parse a name=weight,... mix, keeping only known names."""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in names:
+            raise ValueError("Unknown mix entry %s, expected one of %s" %
+                             (name, ", ".join(names)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _id():
+    return str(uuid.uuid4())
+
+
+def _status():
+    return {'provisioning_status': constants.PENDING_CREATE,
+            'operating_status': constants.OFFLINE,
+            'admin_state_up': True}
+
+
+class EventStream(object):
+    """Generate LBaaS v2 plugin casts, the way neutron-lbaas sends them.
+
+    Every cast carries the whole loadbalancer graph, which grows with
+    the objects created on it, so payloads have the sizes an agent sees
+    in production. Operations and object kinds are drawn from weighted
+    mixes; an operation with no object to act on creates a loadbalancer
+    instead.
+    """
+
+    def __init__(self, rand, ops=None, kinds=None, tenants=10):
+        self.rand = rand
+        self.ops = ops or DEFAULT_OPS
+        self.kinds = kinds or DEFAULT_KINDS
+        self.tenants = ["tenant-%04d" % i for i in range(tenants)]
+        self.loadbalancers = {}
+
+    def _pick(self, weights):
+        total = sum(weights.values())
+        point = self.rand.uniform(0, total)
+        for name in sorted(weights):
+            point -= weights[name]
+            if point <= 0:
+                return name
+        return sorted(weights)[-1]
+
+    def _new_loadbalancer(self):
+        lb_id = _id()
+        loadbalancer = dict(_status(), **{
+            'id': lb_id,
+            'name': "lb-" + lb_id[:8],
+            'description': "synthetic loadbalancer",
+            'tenant_id': self.rand.choice(self.tenants),
+            'vip_address': "10.%d.%d.%d" % (self.rand.randint(0, 255),
+                                            self.rand.randint(0, 255),
+                                            self.rand.randint(1, 254)),
+            'vip_port_id': _id(),
+            'vip_subnet_id': _id(),
+            'provider': {'provider_name': "f5networks"},
+            'flavor_id': None,
+            'listeners': [],
+            'pools': []
+        })
+        return loadbalancer
+
+    def _new(self, kind, loadbalancer):
+        obj_id = _id()
+        common = dict(_status(), id=obj_id, tenant_id=loadbalancer[
+            'tenant_id'], name="%s-%s" % (kind, obj_id[:8]),
+            description="")
+        if kind == LISTENER:
+            used = set(listener['protocol_port']
+                       for listener in loadbalancer['listeners'])
+            port = self.rand.choice([p for p in (80, 443, 8080, 8443, 9000)
+                                     if p not in used] or [10000 + len(used)])
+            return dict(common, protocol="HTTP", protocol_port=port,
+                        connection_limit=-1, default_pool_id=None,
+                        default_tls_container_id=None, sni_containers=[],
+                        l7policies=[])
+        if kind == POOL:
+            return dict(common, protocol="HTTP",
+                        lb_algorithm="ROUND_ROBIN",
+                        session_persistence=None, healthmonitor=None,
+                        members=[], listener_id=None)
+        if kind == MEMBER:
+            return dict(common, address="172.16.%d.%d" % (
+                self.rand.randint(0, 255), self.rand.randint(1, 254)),
+                protocol_port=8080, weight=1, subnet_id=_id(),
+                pool_id=None)
+        if kind == HEALTH_MONITOR:
+            return dict(common, type="HTTP", delay=5, timeout=3,
+                        max_retries=3, http_method="GET", url_path="/",
+                        expected_codes="200", pool_id=None)
+        if kind == L7POLICY:
+            return dict(common, action="REJECT", position=1,
+                        redirect_pool_id=None, redirect_url=None,
+                        listener_id=None, rules=[])
+
+    def _children(self, kind, loadbalancer):
+        if kind == LISTENER:
+            return loadbalancer['listeners']
+        if kind == POOL:
+            return loadbalancer['pools']
+        if kind == MEMBER:
+            return [member for pool in loadbalancer['pools']
+                    for member in pool['members']]
+        if kind == HEALTH_MONITOR:
+            return [pool['healthmonitor'] for pool in loadbalancer['pools']
+                    if pool['healthmonitor']]
+        if kind == L7POLICY:
+            return [policy for listener in loadbalancer['listeners']
+                    for policy in listener['l7policies']]
+
+    def _attach(self, kind, obj, loadbalancer):
+        if kind == LISTENER:
+            loadbalancer['listeners'].append(obj)
+            return True
+        if kind == POOL:
+            loadbalancer['pools'].append(obj)
+            return True
+        if kind == MEMBER and loadbalancer['pools']:
+            pool = self.rand.choice(loadbalancer['pools'])
+            obj['pool_id'] = pool['id']
+            pool['members'].append(obj)
+            return True
+        if kind == HEALTH_MONITOR:
+            pools = [pool for pool in loadbalancer['pools']
+                     if not pool['healthmonitor']]
+            if pools:
+                pool = self.rand.choice(pools)
+                obj['pool_id'] = pool['id']
+                pool['healthmonitor'] = obj
+                return True
+        if kind == L7POLICY and loadbalancer['listeners']:
+            listener = self.rand.choice(loadbalancer['listeners'])
+            obj['listener_id'] = listener['id']
+            listener['l7policies'].append(obj)
+            return True
+        return False
+
+    def _detach(self, kind, obj, loadbalancer):
+        if kind == LISTENER:
+            loadbalancer['listeners'].remove(obj)
+        elif kind == POOL:
+            loadbalancer['pools'].remove(obj)
+        elif kind == MEMBER:
+            for pool in loadbalancer['pools']:
+                if obj in pool['members']:
+                    pool['members'].remove(obj)
+        elif kind == HEALTH_MONITOR:
+            for pool in loadbalancer['pools']:
+                if pool['healthmonitor'] is obj:
+                    pool['healthmonitor'] = None
+        elif kind == L7POLICY:
+            for listener in loadbalancer['listeners']:
+                if obj in listener['l7policies']:
+                    listener['l7policies'].remove(obj)
+
+    def _create_loadbalancer(self):
+        loadbalancer = self._new_loadbalancer()
+        self.loadbalancers[loadbalancer['id']] = loadbalancer
+        return "create_loadbalancer", {
+            'loadbalancer': copy.deepcopy(loadbalancer)}
+
+    def _child_event(self, op, kind, loadbalancer):
+        if op == CREATE:
+            obj = self._new(kind, loadbalancer)
+            if not self._attach(kind, obj, loadbalancer):
+                return None
+            return "create_" + kind, {
+                kind: copy.deepcopy(obj),
+                'loadbalancer': copy.deepcopy(loadbalancer)}
+
+        children = self._children(kind, loadbalancer)
+        if not children:
+            return None
+        obj = self.rand.choice(children)
+
+        if op == DELETE:
+            self._detach(kind, obj, loadbalancer)
+            return "delete_" + kind, {
+                kind: copy.deepcopy(obj),
+                'loadbalancer': copy.deepcopy(loadbalancer)}
+
+        old = copy.deepcopy(obj)
+        obj['description'] = "updated %s" % _id()[:8]
+        return "update_" + kind, {
+            'old_' + kind: old, kind: copy.deepcopy(obj),
+            'loadbalancer': copy.deepcopy(loadbalancer)}
+
+    def next_event(self):
+        """Return the handler name and arguments of the next cast."""
+        op = self._pick(self.ops)
+        kind = self._pick(self.kinds)
+        if op == CREATE and kind == LOADBALANCER or not self.loadbalancers:
+            return self._create_loadbalancer()
+
+        lb_ids = sorted(self.loadbalancers)
+        if kind == LOADBALANCER:
+            lb_id = self.rand.choice(lb_ids)
+            loadbalancer = self.loadbalancers[lb_id]
+            if op == DELETE:
+                del self.loadbalancers[lb_id]
+                return "delete_loadbalancer", {
+                    'loadbalancer': copy.deepcopy(loadbalancer)}
+            old = copy.deepcopy(loadbalancer)
+            loadbalancer['description'] = "updated %s" % _id()[:8]
+            return "update_loadbalancer", {
+                'old_loadbalancer': old,
+                'loadbalancer': copy.deepcopy(loadbalancer)}
+
+        # Look for a loadbalancer the operation applies to, for instance
+        # one with a pool when a member is created.
+        for _ in range(SEARCH_TRIES):
+            lb_id = self.rand.choice(lb_ids)
+            event = self._child_event(op, kind, self.loadbalancers[lb_id])
+            if event:
+                return event
+        return self._create_loadbalancer()
@@ -0,0 +1,214 @@
+"""Replay recorded production RPC casts against a simulated BIG-IQ.
+
+The casts an agent recorded with rpc_record_path are fed, in order, to
+an in-process agent manager wired to the in-memory fake BIG-IQ, at the
+pace they arrived, N times faster, or as fast as possible. Latency and
+throughput of the replay are reported next to those of the recorded run,
+derived from the loadbalancer statuses the agent reported back then.
+
+    f5-lbaasv2-bigiq-replay /var/lib/neutron/rpc.rec.gz --speed 4 \
+        --output replay.json -- --config-file agent.conf
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import constants
+from f5_lbaasv2_bigiq_agent import rpc_recorder
+from f5_lbaasv2_bigiq_agent.bigiq import get_bigiq_mgr
+from f5_lbaasv2_bigiq_agent.bigiq import set_bigiq_mgr_factory
+from f5_lbaasv2_bigiq_agent.loadgen import backend
+from f5_lbaasv2_bigiq_agent.loadgen import runner
+
+LOG = logging.getLogger(__name__)
+
+
+def _lb_id(kwargs):
+    return (kwargs.get('loadbalancer') or {}).get('id')
+
+
+def load_recording(path):
+    """Return the settings of a recording and its casts and statuses."""
+    settings = {}
+    records = []
+    for record in rpc_recorder.read_records(path):
+        if record['type'] == rpc_recorder.START:
+            if not settings:
+                settings = record
+        else:
+            records.append(record)
+    return settings, records
+
+
+def original_report(settings, records):
+    """Tell how the recorded run did, from the statuses it reported."""
+    recorder = runner.Recorder(
+        batched=settings.get('write_behind_window', 0) > 0)
+    first = last = None
+    for record in records:
+        if record['type'] == rpc_recorder.CAST:
+            lb_id = _lb_id(record['kwargs'])
+            if lb_id:
+                recorder.started(lb_id, record['method'], now=record['ts'])
+                if first is None:
+                    first = record['ts']
+        elif record['type'] == rpc_recorder.STATUS:
+            recorder.done(record['lb'],
+                          record['status'] == constants.ERROR,
+                          now=record['ts'])
+        last = record['ts']
+    return runner.summarize(recorder, (last - first) if first else 0.0)
+
+
+def _place(mgr, casts):
+    """Schedule the loadbalancers created before the recording began."""
+    created = set()
+    bigiq = get_bigiq_mgr(mgr.conf)
+    for record in casts:
+        loadbalancer = record['kwargs'].get('loadbalancer') or {}
+        lb_id = loadbalancer.get('id')
+        if not lb_id or lb_id in created:
+            continue
+        created.add(lb_id)
+        if record['method'] != "create_loadbalancer":
+            mgr._schedule_loadbalancer(bigiq, loadbalancer)
+
+
+def replay(args, conf, records):
+    client = backend.FakeBIGIQClient(args.devices,
+                                     args.rest_latency / 1000.0)
+    set_bigiq_mgr_factory(
+        lambda conf: backend.SimulatedBIGIQManager(conf, client))
+
+    recorder = runner.Recorder(batched=conf.write_behind_window > 0)
+    mgr = runner.LoadGenAgentManager(conf, recorder)
+    casts = [record for record in records
+             if record['type'] == rpc_recorder.CAST]
+    _place(mgr, casts)
+    client.calls.clear()
+
+    start = time.time()
+    offset = 0.0
+    previous = None
+    for record in casts:
+        if previous is not None:
+            gap = record['ts'] - previous
+            if args.max_gap > 0:
+                gap = min(gap, args.max_gap)
+            offset += max(gap, 0.0)
+        previous = record['ts']
+        if args.speed > 0:
+            delay = start + offset / args.speed - time.time()
+            if delay > 0:
+                eventlet.sleep(delay)
+
+        lb_id = _lb_id(record['kwargs'])
+        if lb_id:
+            recorder.started(lb_id, record['method'])
+        try:
+            getattr(mgr, record['method'])(mgr.context, **record['kwargs'])
+        except Exception as ex:
+            LOG.error("Fail to replay %s: %s", record['method'], ex)
+        eventlet.sleep(0)
+
+    deadline = time.time() + args.timeout
+    while recorder.in_flight() and time.time() < deadline:
+        eventlet.sleep(0.01)
+
+    report = runner.summarize(recorder, time.time() - start)
+    report['rest_calls'] = client.stats()
+    return report
+
+
+def _ratio(replayed, original):
+    if not original:
+        return None
+    return round(float(replayed) / original, 3)
+
+
+def compare(original, replayed):
+    """Return replay throughput and latencies relative to the original."""
+    comparison = {
+        'throughput': _ratio(replayed['throughput'], original['throughput'])
+    }
+    for name in ("p50", "p90", "p99", "max"):
+        comparison['latency_' + name] = _ratio(
+            replayed['latency'].get(name), original['latency'].get(name))
+    return comparison
+
+
+def _parse_args(argv):
+    # Agent options follow --, after the recording
+    oslo_args = []
+    if "--" in argv:
+        index = argv.index("--")
+        argv, oslo_args = argv[:index], argv[index + 1:]
+
+    parser = argparse.ArgumentParser(
+        description="Replay recorded RPC casts against a simulated BIG-IQ")
+    parser.add_argument("recording",
+                        help="recording written by the agent, along with "
+                             "its rotated files")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="times faster than recorded, 0 to send casts "
+                             "as fast as possible")
+    parser.add_argument("--max-gap", type=float, default=0,
+                        help="longest pause in seconds between two casts, "
+                             "0 to keep recorded pauses")
+    parser.add_argument("--devices", type=int, default=4,
+                        help="BIG-IP devices of the fake BIG-IQ")
+    parser.add_argument("--rest-latency", type=float, default=20,
+                        help="milliseconds each BIG-IQ request takes")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="seconds to wait for the last casts")
+    parser.add_argument("--output", default="replay.json")
+    args = parser.parse_args(argv)
+    args.oslo_args = oslo_args
+    return args
+
+
+def _print_side(name, report):
+    latency = report['latency'] or dict.fromkeys(("p50", "p99", "max"), 0)
+    print("%-9s %6d events %8.1fs %8.2f events/s  p50 %.3fs p99 %.3fs "
+          "max %.3fs  errors %d" % (
+              name, report['completed'], report['elapsed'],
+              report['throughput'], latency['p50'], latency['p99'],
+              latency['max'], report['errors']))
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    conf = runner._setup_conf(args.oslo_args)
+    # The replay must not record itself
+    conf.set_override("rpc_record_path", None)
+
+    settings, records = load_recording(args.recording)
+    original = original_report(settings, records)
+    replayed = replay(args, conf, records)
+    report = {
+        'original': original,
+        'replay': replayed,
+        'relative': compare(original, replayed),
+        'settings': dict((name, value) for name, value in vars(args).items()
+                         if name != "oslo_args")
+    }
+
+    _print_side("original", original)
+    _print_side("replay", replayed)
+    print("relative " + " ".join(
+        "%s %s" % (name, value)
+        for name, value in sorted(report['relative'].items())))
+    with open(args.output, "w") as fd:
+        json.dump(report, fd, indent=2, sort_keys=True)
+    print("Report written to %s" % args.output)
+    return 0 if replayed['lost'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Measure the CPU cost of building iControl requests for member churn.
+
+Member creates and deletes spread over a few devices are built both
+ways: with URIs formatted and bodies built as dicts, hashed for the
+config cache and serialized to be sent, as the agent did before request
+templates; and with the per-device URI prefixes and body templates,
+whose bytes are hashed and sent as they are.
+
+    python -m f5_lbaasv2_bigiq_agent.loadgen.requestbench --requests 100000
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+
+from f5_lbaasv2_bigiq_agent.bigiq import templates
+from f5_lbaasv2_bigiq_agent.bigiq.config_cache import body_hash
+from f5_lbaasv2_bigiq_agent.bigiq.icontrol import device_uris
+from f5_lbaasv2_bigiq_agent.bigiq.icontrol import item_uri
+from f5_lbaasv2_bigiq_agent.bigiq.icontrol import ltm_root
+from f5_lbaasv2_bigiq_agent.bigiq.manager import bigip_root
+
+_cpu = getattr(time, "process_time", None) or time.clock
+
+
+def dict_requests(bigip_id, partition, pool_name, member_name, address):
+    uri = "{0}{1}{2}/pool/~{3}~{4}/members".format(
+        bigip_root, bigip_id, ltm_root, partition, pool_name)
+    body = {
+        "name": member_name,
+        "address": address,
+        "partition": partition
+    }
+    key = "{0}/~{1}~{2}".format(uri, partition, body["name"])
+    # Hashed when checked against the config cache, serialized to be
+    # sent, and hashed again once applied
+    body_hash(body)
+    data = json.dumps(body)
+    body_hash(body)
+    delete_uri = "{0}{1}{2}/pool/~{3}~{4}/members/~{3}~{5}".format(
+        bigip_root, bigip_id, ltm_root, partition, pool_name, member_name)
+    return key, data, delete_uri
+
+
+def template_requests(bigip_id, partition, pool_name, member_name, address):
+    uri = item_uri(device_uris(bigip_id).pool, partition,
+                   pool_name) + "/members"
+    body = templates.MEMBER.render(member_name, partition, address)
+    key = item_uri(uri, body.partition, body.name)
+    body_hash(body)
+    data = body.data
+    body_hash(body)
+    delete_uri = item_uri(item_uri(device_uris(bigip_id).pool, partition,
+                                   pool_name) + "/members",
+                          partition, member_name)
+    return key, data, delete_uri
+
+
+def _members(count, devices):
+    return [("bigip-%04d" % (i % devices),
+             "loadbalancer-%08d-0000-4000-8000-%012d" % (i // 10, i // 10),
+             "pool-%08d-0000-4000-8000-%012d" % (i // 10, i // 10),
+             "member-%08d-0000-4000-8000-%012d:80" % (i, i),
+             "10.%d.%d.%d" % (i // 65536 % 256, i // 256 % 256, i % 256))
+            for i in range(count)]
+
+
+def _check(members):
+    """Make sure both ways build the same requests."""
+    for member in members[:100]:
+        old = dict_requests(*member)
+        new = template_requests(*member)
+        if old[0] != new[0] or old[2] != new[2] or \
+                json.loads(old[1]) != json.loads(new[1].decode('utf-8')):
+            raise AssertionError("Requests differ for %s: %s %s" % (
+                member[3], old, new))
+
+
+def _measure(build, members, repeat):
+    best = None
+    for _ in range(repeat):
+        start = _cpu()
+        for member in members:
+            build(*member)
+        elapsed = _cpu() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(members)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Measure the CPU cost of building iControl requests")
+    parser.add_argument("--requests", type=int, default=100000,
+                        help="member creates and deletes built each run")
+    parser.add_argument("--devices", type=int, default=4,
+                        help="BIG-IP devices the members are spread over")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs of each way, the fastest is kept")
+    parser.add_argument("--output", default=None,
+                        help="file where the report is written as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    members = _members(args.requests, args.devices)
+    _check(members)
+
+    old = _measure(dict_requests, members, args.repeat)
+    new = _measure(template_requests, members, args.repeat)
+    report = {
+        'requests': args.requests,
+        'devices': args.devices,
+        'dict_us': round(old * 1e6, 3),
+        'template_us': round(new * 1e6, 3),
+        'speedup': round(old / new, 2) if new else None
+    }
+    print("dict      %8.3f us per create and delete" % report['dict_us'])
+    print("template  %8.3f us per create and delete" %
+          report['template_us'])
+    print("speedup   %8.2fx" % report['speedup'])
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(report, fd, indent=2, sort_keys=True)
+        print("Report written to %s" % args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
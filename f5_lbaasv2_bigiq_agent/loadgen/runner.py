@@ -0,0 +1,289 @@
+"""Drive the agent with synthetic LBaaS events and measure its capacity.
+
+The agent manager runs in process, with its fair queue and journal as
+configured, against a simulated BIG-IQ: an in-memory fake, or responses
+recorded from a real one. Plugin casts are generated with realistic
+payloads and each event is timed until the agent reports the status of
+its loadbalancer back to the plugin.
+
+    f5-lbaasv2-bigiq-loadgen --events 5000 --rest-latency 20 \
+        --output loadgen.json -- --config-file agent.conf
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import random
+import socket
+import sys
+import time
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import agent
+from f5_lbaasv2_bigiq_agent import agent_manager
+from f5_lbaasv2_bigiq_agent import constants
+from f5_lbaasv2_bigiq_agent.bigiq import set_bigiq_mgr_factory
+from f5_lbaasv2_bigiq_agent.loadgen import backend
+from f5_lbaasv2_bigiq_agent.loadgen import events
+
+LOG = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+
+
+def _ignore(*args, **kwargs):
+    pass
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    result = dict(("p%d" % p, round(values[min(len(values) - 1,
+                                               len(values) * p // 100)], 4))
+                  for p in PERCENTILES)
+    result['max'] = round(values[-1], 4)
+    result['count'] = len(values)
+    return result
+
+
+class Recorder(object):
+    """Stand for the plugin RPC, and time events until their status.
+
+    Every handler ends with a loadbalancer status update or destroyed
+    cast, and work on one loadbalancer runs in order, so the n-th status
+    of a loadbalancer ends its n-th event. With write-behind, one status
+    ends all the events of the loadbalancer sent so far.
+    """
+
+    def __init__(self, batched=False):
+        self.batched = batched
+        self._pending = collections.defaultdict(collections.deque)
+        self.latencies = collections.defaultdict(list)
+        self.completed = 0
+        self.errors = 0
+        self.submitted = 0
+
+    def started(self, lb_id, method, now=None):
+        self._pending[lb_id].append((now or time.time(), method))
+        self.submitted += 1
+
+    def in_flight(self):
+        return self.submitted - self.completed
+
+    def done(self, lb_id, error=False, now=None):
+        """End the events of a loadbalancer its status was reported for."""
+        pending = self._pending.get(lb_id)
+        if not pending:
+            return
+        ended = list(pending) if self.batched else [pending.popleft()]
+        if self.batched:
+            pending.clear()
+        if not pending:
+            del self._pending[lb_id]
+        now = now or time.time()
+        for start, method in ended:
+            self.latencies[method].append(now - start)
+        self.completed += len(ended)
+        if error:
+            self.errors += len(ended)
+
+    def update_loadbalancer_status(self, loadbalancer_id,
+                                   provisioning_status, operating_status):
+        self.done(loadbalancer_id, provisioning_status == constants.ERROR)
+
+    def loadbalancer_destroyed(self, loadbalancer_id):
+        self.done(loadbalancer_id)
+
+    def __getattr__(self, name):
+        return _ignore
+
+
+def summarize(recorder, elapsed):
+    """Return throughput and latencies of the events of a recorder."""
+    all_latencies = [value for values in recorder.latencies.values()
+                     for value in values]
+    return {
+        'events': recorder.submitted,
+        'completed': recorder.completed,
+        'errors': recorder.errors,
+        'lost': recorder.in_flight(),
+        'elapsed': round(elapsed, 3),
+        'throughput': round(recorder.completed / elapsed, 2)
+        if elapsed > 0 else 0.0,
+        'latency': percentiles(all_latencies),
+        'latency_by_event': dict(
+            (method, percentiles(values))
+            for method, values in recorder.latencies.items())
+    }
+
+
+class LoadGenAgentManager(agent_manager.F5BIGIQAgentManager):
+    """Agent manager whose plugin RPC is the load generator recorder."""
+
+    def __init__(self, conf, recorder):
+        self.recorder = recorder
+        super(LoadGenAgentManager, self).__init__(conf)
+
+    def _setup_rpc(self):
+        self.plugin_rpc = self.recorder
+        self.state_rpc = None
+
+
+def _sample_queue(mgr, recorder, start, interval, samples):
+    while True:
+        depth = 0
+        if mgr.dispatcher:
+            depth = sum(klass['depth']
+                        for klass in mgr.dispatcher.stats().values())
+        samples.append({'time': round(time.time() - start, 3),
+                        'queue_depth': depth,
+                        'in_flight': recorder.in_flight()})
+        eventlet.sleep(interval)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Drive the F5 BIG-IQ agent with synthetic LBaaS events")
+    parser.add_argument("--events", type=int, default=1000,
+                        help="number of plugin casts to send")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="casts per second, 0 to send them at once")
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="most events waiting for their status")
+    parser.add_argument("--ops", default="create=6,update=3,delete=1",
+                        help="weights of create, update and delete")
+    parser.add_argument("--kinds",
+                        default="loadbalancer=1,listener=2,pool=2,member=8,"
+                                "health_monitor=1,l7policy=1",
+                        help="weights of the object kinds")
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=4,
+                        help="BIG-IP devices of the fake BIG-IQ")
+    parser.add_argument("--rest-latency", type=float, default=20,
+                        help="milliseconds each BIG-IQ request takes")
+    parser.add_argument("--recorded", default=None,
+                        help="JSON lines of recorded BIG-IQ responses")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--sample-interval", type=float, default=1.0,
+                        help="seconds between queue depth samples")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="seconds to wait for the last events")
+    parser.add_argument("--output", default="loadgen.json")
+    parser.add_argument("oslo_args", nargs=argparse.REMAINDER,
+                        help="agent options such as --config-file, "
+                             "after --")
+    args = parser.parse_args(argv)
+    args.oslo_args = [a for a in args.oslo_args if a != "--"]
+    return args
+
+
+def _setup_conf(oslo_args):
+    conf = cfg.CONF
+    agent.register_opts(conf)
+    conf.register_opts([cfg.StrOpt("host", default=socket.gethostname())])
+    conf.register_opts([cfg.IntOpt("report_interval", default=0)], "AGENT")
+    conf.set_default("agent_id", "loadgen")
+    logging.register_options(conf)
+    conf(args=oslo_args, project="neutron")
+    # Nothing listens for agent state here
+    conf.set_override("report_interval", 0, "AGENT")
+    logging.setup(conf, "f5-lbaasv2-bigiq-loadgen")
+    return conf
+
+
+def run(args, conf):
+    latency = args.rest_latency / 1000.0
+    if args.recorded:
+        client = backend.RecordedBIGIQClient(args.recorded, args.devices,
+                                             latency)
+    else:
+        client = backend.FakeBIGIQClient(args.devices, latency)
+    set_bigiq_mgr_factory(
+        lambda conf: backend.SimulatedBIGIQManager(conf, client))
+
+    recorder = Recorder(batched=conf.write_behind_window > 0)
+    mgr = LoadGenAgentManager(conf, recorder)
+    stream = events.EventStream(
+        random.Random(args.seed),
+        events.parse_mix(args.ops, (events.CREATE, events.UPDATE,
+                                    events.DELETE)),
+        events.parse_mix(args.kinds, events.KINDS),
+        args.tenants)
+
+    samples = []
+    start = time.time()
+    sampler = eventlet.spawn(_sample_queue, mgr, recorder, start,
+                             args.sample_interval, samples)
+
+    for i in range(args.events):
+        if args.rate > 0:
+            delay = start + i / args.rate - time.time()
+            if delay > 0:
+                eventlet.sleep(delay)
+        while recorder.in_flight() >= args.concurrency:
+            eventlet.sleep(0.001)
+        method, kwargs = stream.next_event()
+        recorder.started(kwargs['loadbalancer']['id'], method)
+        getattr(mgr, method)(mgr.context, **kwargs)
+        eventlet.sleep(0)
+
+    deadline = time.time() + args.timeout
+    while recorder.in_flight() and time.time() < deadline:
+        eventlet.sleep(0.01)
+    elapsed = time.time() - start
+    sampler.kill()
+
+    rest = client.stats()
+    created = len(recorder.latencies.get("create_loadbalancer", []))
+    report = summarize(recorder, elapsed)
+    report.update({
+        'loadbalancers_per_minute': round(created * 60.0 / elapsed, 1),
+        'rest_calls': rest,
+        'rest_calls_per_event': round(
+            float(rest['calls']) / max(recorder.completed, 1), 2),
+        'queue_depth': samples,
+        'settings': dict((name, value) for name, value in vars(args).items()
+                         if name != "oslo_args")
+    })
+    return report
+
+
+def _print_report(report):
+    print("%d events in %.1fs: %.1f events/s, %.1f loadbalancers/min" % (
+        report['completed'], report['elapsed'], report['throughput'],
+        report['loadbalancers_per_minute']))
+    print("errors %d, lost %d" % (report['errors'], report['lost']))
+    latency = report['latency']
+    if latency:
+        print("latency p50 %.3fs p90 %.3fs p99 %.3fs max %.3fs" % (
+            latency['p50'], latency['p90'], latency['p99'],
+            latency['max']))
+    for method, latency in sorted(report['latency_by_event'].items()):
+        print("  %-24s %6d  p50 %.3fs p99 %.3fs" % (
+            method, latency['count'], latency['p50'], latency['p99']))
+    print("REST calls %d, %.2f per event" % (
+        report['rest_calls']['calls'], report['rest_calls_per_event']))
+    depths = [sample['queue_depth'] for sample in report['queue_depth']]
+    if depths:
+        print("queue depth max %d, mean %.1f" % (
+            max(depths), float(sum(depths)) / len(depths)))
+
+
+def main(argv=None):
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    conf = _setup_conf(args.oslo_args)
+    report = run(args, conf)
+    _print_report(report)
+    with open(args.output, "w") as fd:
+        json.dump(report, fd, indent=2, sort_keys=True)
+    print("Report written to %s" % args.output)
+    return 0 if report['lost'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
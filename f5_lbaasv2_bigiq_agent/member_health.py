@@ -0,0 +1,253 @@
+import json
+import os
+import re
+import threading
+import time
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import constants
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt(
+        "health_listen_port",
+        default=0,
+        help=("Port of the local HTTP listener taking member status "
+              "events pushed by BIG-IQ or BIG-IP. Set it to 0 to disable "
+              "the listener")
+    ),
+    cfg.StrOpt(
+        "health_listen_address",
+        default="127.0.0.1",
+        help=("Address of the member status event listener")
+    ),
+    cfg.StrOpt(
+        "health_event_file",
+        default=None,
+        help=("Log file to follow for BIG-IP monitor status messages, "
+              "such as a remote syslog target of the BIG-IPs")
+    ),
+    cfg.IntOpt(
+        "health_poll_interval",
+        default=60,
+        help=("Seconds between two polls of member status when no "
+              "events are pushed. Set it to 0 to disable polling")
+    ),
+    cfg.IntOpt(
+        "health_push_poll_interval",
+        default=900,
+        help=("Seconds between two polls of member status when events "
+              "are pushed, which only catches lost events")
+    )
+]
+
+# Monitor states of BIG-IP pool members
+STATES = {
+    "up": constants.ONLINE,
+    "down": constants.OFFLINE,
+    "forced down": constants.OFFLINE,
+    "user-down": constants.OFFLINE,
+    "unchecked": constants.NO_MONITOR,
+    "user disabled": constants.DISABLED,
+    "disabled": constants.DISABLED
+}
+
+# mcpd message logged when the monitor status of a pool member changes
+MONITOR_MESSAGE = re.compile(
+    r"Pool /[^/\s]+/pool-(?P<pool>[0-9a-fA-F-]+) member "
+    r"/[^/\s]+/member-(?P<member>[0-9a-fA-F-]+):\d+ "
+    r"monitor status (?P<state>[a-z -]+?)\.")
+
+
+def parse_event(event):
+    """Return (pool id, member id, operating status) of an event.
+
+    An event is either a dict with pool, member and state, named like
+    the agent names them on the BIG-IP or by bare id, or a monitor status
+    message logged by the BIG-IP. None is returned for anything else.
+    """
+    if isinstance(event, dict):
+        if "message" in event:
+            return parse_event(event["message"])
+        pool = event.get("pool", "")
+        member = event.get("member", "")
+        state = event.get("state", event.get("status", ""))
+        if pool.startswith("pool-"):
+            pool = pool[len("pool-"):]
+        if member.startswith("member-"):
+            member = member[len("member-"):].rsplit(":", 1)[0]
+    else:
+        match = MONITOR_MESSAGE.search(event)
+        if not match:
+            return None
+        pool, member, state = match.group("pool", "member", "state")
+
+    status = STATES.get(state.strip().lower())
+    if not pool or not member or status is None:
+        return None
+    return pool, member, status
+
+
+def pool_status(statuses):
+    """Derive the operating status of a pool from its members'."""
+    monitored = [status for status in statuses
+                 if status in (constants.ONLINE, constants.OFFLINE)]
+    if not monitored:
+        return constants.NO_MONITOR if statuses else constants.OFFLINE
+    online = monitored.count(constants.ONLINE)
+    if online == len(monitored):
+        return constants.ONLINE
+    if online == 0:
+        return constants.OFFLINE
+    return constants.DEGRADED
+
+
+class MemberHealth(object):
+    """Report member and pool operating status as it changes.
+
+    Status comes from events pushed to a local HTTP listener or appended
+    to a followed log file, and from a periodic poll of the BIG-IPs,
+    which runs rarely when events are pushed. Only changes are sent to
+    the plugin, whatever their source.
+    """
+
+    def __init__(self, conf, plugin_rpc):
+        self.conf = conf
+        self.plugin_rpc = plugin_rpc
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._pool_status = {}
+        self._last_poll = 0
+        self.events = 0
+        self.changes = 0
+
+    @property
+    def pushed(self):
+        return bool(self.conf.health_listen_port or
+                    self.conf.health_event_file)
+
+    def start(self):
+        if self.conf.health_listen_port:
+            eventlet.spawn_n(self._listen)
+        if self.conf.health_event_file:
+            eventlet.spawn_n(self._follow, self.conf.health_event_file)
+
+    def update(self, pool_id, member_id, status):
+        """Take the operating status of a member, and report changes."""
+        with self._lock:
+            members = self._pools.setdefault(pool_id, {})
+            member_changed = members.get(member_id) != status
+            members[member_id] = status
+            new_pool_status = pool_status(list(members.values()))
+            pool_changed = self._pool_status.get(pool_id) != new_pool_status
+            self._pool_status[pool_id] = new_pool_status
+
+        if member_changed:
+            self.changes += 1
+            self.plugin_rpc.update_member_status(
+                member_id, operating_status=status)
+        if pool_changed:
+            # Only the operating status changed, the provisioning status
+            # is left to the handlers, and would default to ERROR
+            self.plugin_rpc.update_pool_status(
+                pool_id, provisioning_status=None,
+                operating_status=new_pool_status)
+
+    def forget(self, loadbalancer):
+        for pool in loadbalancer.get('pools', []):
+            self.forget_pool(pool['id'])
+
+    def forget_pool(self, pool_id):
+        with self._lock:
+            self._pools.pop(pool_id, None)
+            self._pool_status.pop(pool_id, None)
+
+    def forget_member(self, member_id):
+        with self._lock:
+            for members in self._pools.values():
+                members.pop(member_id, None)
+
+    def handle(self, event):
+        parsed = parse_event(event)
+        if parsed is None:
+            return False
+        self.events += 1
+        try:
+            self.update(*parsed)
+        except Exception as ex:
+            LOG.error("Fail to report member status event %s: %s",
+                      parsed, ex)
+        return True
+
+    def poll_due(self):
+        interval = self.conf.health_push_poll_interval if self.pushed \
+            else self.conf.health_poll_interval
+        if interval <= 0 or time.time() - self._last_poll < interval:
+            return False
+        self._last_poll = time.time()
+        return True
+
+    def _app(self, environ, start_response):
+        if environ["REQUEST_METHOD"] != "POST":
+            start_response("405 Method Not Allowed", [])
+            return [b""]
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length).decode("utf-8", "replace")
+        try:
+            events = json.loads(body)
+            if not isinstance(events, list):
+                events = [events]
+        except ValueError:
+            events = body.splitlines()
+
+        accepted = sum(1 for event in events if self.handle(event))
+        start_response("202 Accepted", [("Content-Type", "application/json")])
+        return [json.dumps({"accepted": accepted}).encode("utf-8")]
+
+    def _listen(self):
+        from eventlet import wsgi
+
+        address = (self.conf.health_listen_address,
+                   self.conf.health_listen_port)
+        try:
+            sock = eventlet.listen(address)
+        except Exception as ex:
+            LOG.error("Fail to listen for member status events on %s:%d: "
+                      "%s", address[0], address[1], ex)
+            return
+        LOG.info("Listening for member status events on %s:%d", *address)
+        wsgi.server(sock, self._app, log=None, log_output=False)
+
+    def _follow(self, path):
+        fd = None
+        inode = None
+        while True:
+            try:
+                if fd is None:
+                    fd = open(path)
+                    inode = os.fstat(fd.fileno()).st_ino
+                    fd.seek(0, os.SEEK_END)
+                line = fd.readline()
+                if line:
+                    self.handle(line)
+                    continue
+                # Reopen the file once it was rotated
+                if os.stat(path).st_ino != inode:
+                    fd.close()
+                    fd = open(path)
+                    inode = os.fstat(fd.fileno()).st_ino
+                    continue
+            except (IOError, OSError) as ex:
+                LOG.debug("Cannot follow %s: %s", path, ex)
+                if fd is not None:
+                    fd.close()
+                    fd = None
+            eventlet.sleep(1)
+
+    def stats(self):
+        return {'events': self.events, 'changes': self.changes,
+                'pushed': self.pushed}
@@ -1,10 +1,8 @@
-from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 import oslo_messaging as messaging
 
-from neutron.common import rpc
-
 from f5_lbaasv2_bigiq_agent import constants
+from f5_lbaasv2_bigiq_agent import tracing
 
 LOG = logging.getLogger(__name__)
 
@@ -18,6 +16,8 @@ class LBaaSv2PluginRPC(object):
         """Initialize LBaaSv2PluginRPC."""
         super(LBaaSv2PluginRPC, self).__init__()
 
+        from neutron.common import rpc
+
         if topic:
             self.topic = topic
         else:
@@ -68,7 +68,7 @@ class LBaaSv2PluginRPC(object):
         func = getattr(callee, kwargs['rpc_method'])
         return func(context, msg['method'], **msg['args'])
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def set_agent_admin_state(self, admin_state_up):
         """Set the admin_state_up of for this agent"""
         succeeded = False
@@ -86,7 +86,35 @@ class LBaaSv2PluginRPC(object):
 
         return succeeded
 
-    @log_helpers.log_method_call
+    @tracing.traced
+    def get_loadbalancer_ids(self, marker=None, limit=None, timeout=None):
+        """Return a page of the loadbalancer ids bound to this host.
+
+        Ids are sorted, and the page starts after marker.
+        """
+        return self._call(
+            self.context,
+            self._make_msg('get_loadbalancer_ids',
+                           host=self.host,
+                           marker=marker,
+                           limit=limit),
+            topic=self.topic,
+            timeout=timeout
+        )
+
+    @tracing.traced
+    def get_service_definitions(self, loadbalancer_ids, timeout=None):
+        """Return the full loadbalancer graphs of the given ids."""
+        return self._call(
+            self.context,
+            self._make_msg('get_service_definitions',
+                           host=self.host,
+                           loadbalancer_ids=loadbalancer_ids),
+            topic=self.topic,
+            timeout=timeout
+        )
+
+    @tracing.traced
     def update_loadbalancer_status(self,
                                    loadbalancer_id,
                                    provisioning_status=None,
@@ -101,7 +129,21 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
+    def update_loadbalancers_status(self, statuses):
+        """Update the database with status of several loadbalancers.
+
+        statuses maps loadbalancer ids to their provisioning_status and
+        operating_status.
+        """
+        return self._cast(
+            self.context,
+            self._make_msg('update_loadbalancers_status',
+                           statuses=statuses),
+            topic=self.topic
+        )
+
+    @tracing.traced
     def update_loadbalancer_stats(self, loadbalancer_id, stats):
         """Update the database with loadbalancer stats."""
         return self._cast(
@@ -112,7 +154,20 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
+    def update_loadbalancers_stats(self, stats):
+        """Update the database with stats of several loadbalancers.
+
+        stats maps loadbalancer ids to the counters which changed.
+        """
+        return self._cast(
+            self.context,
+            self._make_msg('update_loadbalancers_stats',
+                           stats=stats),
+            topic=self.topic
+        )
+
+    @tracing.traced
     def loadbalancer_destroyed(self, loadbalancer_id):
         """Delete the loadbalancer from the database."""
         return self._cast(
@@ -122,7 +177,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def update_listener_status(self,
                                listener_id,
                                provisioning_status=constants.ERROR,
@@ -137,7 +192,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def listener_destroyed(self, listener_id):
         """Delete listener from database."""
         return self._cast(
@@ -147,7 +202,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def update_pool_status(self,
                            pool_id,
                            provisioning_status=constants.ERROR,
@@ -162,7 +217,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def pool_destroyed(self, pool_id):
         """Delete pool from database."""
         return self._cast(
@@ -172,7 +227,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def update_member_status(self,
                              member_id,
                              provisioning_status=None,
@@ -187,7 +242,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def member_destroyed(self, member_id):
         """Delete member from database."""
         return self._cast(
@@ -197,7 +252,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def update_health_monitor_status(
             self,
             health_monitor_id,
@@ -213,7 +268,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def health_monitor_destroyed(self, health_monitor_id):
         """Delete health_monitor from database."""
         return self._cast(
@@ -223,7 +278,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def update_l7rule_status(
             self,
             l7rule_id,
@@ -240,7 +295,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def l7rule_destroyed(self, l7rule_id):
         """Delete health_monitor from database."""
         return self._cast(
@@ -250,7 +305,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def update_l7policy_status(
             self,
             l7policy_id,
@@ -265,7 +320,7 @@ class LBaaSv2PluginRPC(object):
             topic=self.topic
         )
 
-    @log_helpers.log_method_call
+    @tracing.traced
     def l7policy_destroyed(self, l7policy_id):
         return self._cast(
             self.context,
@@ -0,0 +1,163 @@
+import collections
+import gc
+import os
+import sys
+import threading
+import time
+import traceback
+
+import eventlet
+from eventlet import patcher
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt(
+        "profile_dir",
+        default="/var/lib/neutron/f5-lbaasv2-bigiq-agent/profiles",
+        help=("Directory where on-demand profiles of the agent are "
+              "written")
+    ),
+    cfg.IntOpt(
+        "profile_duration",
+        default=30,
+        help=("Seconds an on-demand profile runs, unless the request "
+              "asks for another duration")
+    ),
+    cfg.IntOpt(
+        "profile_sample_interval",
+        default=10,
+        help=("Milliseconds between two stack samples of an on-demand "
+              "profile")
+    )
+]
+
+# The sampler must keep running while the hub is busy, so it uses a
+# native thread and sleep rather than the monkey patched ones.
+_threading = patcher.original("threading")
+_time = patcher.original("time")
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append("%s:%s" % (os.path.basename(code.co_filename),
+                                code.co_name))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profiler(object):
+    """Profile the running agent for a while, without stopping it.
+
+    A profile runs cProfile over every green thread, and samples the
+    stack of the running green thread from a native thread. When it ends,
+    it writes the cProfile stats in pstats format, the samples as folded
+    stacks for flamegraph.pl or speedscope, and the stacks of all green
+    threads at that time.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self._profile = None
+        self._samples = None
+        self._sampling = False
+        self._started_at = None
+
+    @property
+    def running(self):
+        return self._profile is not None
+
+    def start(self, duration=None):
+        """Start a profile which stops itself after duration seconds."""
+        if self.running:
+            LOG.warning("A profile is already running")
+            return False
+
+        import cProfile
+
+        duration = duration or self.conf.profile_duration
+        self._samples = collections.Counter()
+        self._sampling = True
+        self._started_at = time.time()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+        sampler = _threading.Thread(target=self._sample,
+                                    args=(_threading.current_thread().ident,),
+                                    name="f5-profile-sampler")
+        sampler.daemon = True
+        sampler.start()
+
+        eventlet.spawn_after(duration, self.stop)
+        LOG.info("Profiling the agent for %d seconds", duration)
+        return True
+
+    def _sample(self, thread_id):
+        interval = self.conf.profile_sample_interval / 1000.0
+        while self._sampling:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self._samples[_folded(frame)] += 1
+            _time.sleep(interval)
+
+    def stop(self):
+        if not self.running:
+            return
+        self._sampling = False
+        self._profile.disable()
+        profile = self._profile
+        self._profile = None
+
+        try:
+            prefix = self._write(profile)
+            LOG.info("Wrote agent profile to %s.*", prefix)
+        except Exception as ex:
+            LOG.exception("Fail to write agent profile: %s", ex)
+
+    def _write(self, profile):
+        directory = self.conf.profile_dir
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        prefix = os.path.join(directory, "profile-%s-%d" % (
+            time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started_at)),
+            os.getpid()))
+
+        profile.dump_stats(prefix + ".pstats")
+
+        with open(prefix + ".folded", "w") as fd:
+            for stack, count in sorted(self._samples.items()):
+                fd.write("%s %d\n" % (stack, count))
+
+        with open(prefix + ".greenlets", "w") as fd:
+            for stack in green_stacks():
+                fd.write(stack)
+                fd.write("\n")
+        return prefix
+
+
+def green_stacks():
+    """Return the formatted stack of every green thread."""
+    import greenlet
+
+    stacks = []
+    for obj in gc.get_objects():
+        if isinstance(obj, greenlet.greenlet) and obj.gr_frame is not None:
+            stacks.append("".join(traceback.format_stack(obj.gr_frame)))
+    return stacks
+
+
+def get_profiler(conf):
+    """Return the profiler of the agent process."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler(conf)
+    return _profiler
@@ -0,0 +1,117 @@
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.BoolOpt(
+        "resync_on_startup",
+        default=True,
+        help=("Fetch the loadbalancers bound to this agent from the "
+              "plugin at startup, and reconcile them with the devices")
+    ),
+    cfg.IntOpt(
+        "resync_interval",
+        default=0,
+        help=("Seconds between two reconciliations with the plugin after "
+              "startup. Set it to 0 to only reconcile at startup")
+    ),
+    cfg.IntOpt(
+        "resync_page_size",
+        default=100,
+        help=("Number of loadbalancers fetched from the plugin in one "
+              "RPC call while reconciling")
+    ),
+    cfg.IntOpt(
+        "resync_rpc_timeout",
+        default=120,
+        help=("Seconds to wait for the plugin to answer one page")
+    )
+]
+
+
+def _fetch(plugin_rpc, marker, page_size, timeout):
+    lb_ids = plugin_rpc.get_loadbalancer_ids(marker=marker, limit=page_size,
+                                             timeout=timeout)
+    if not lb_ids:
+        return [], []
+    services = plugin_rpc.get_service_definitions(lb_ids, timeout=timeout)
+    return lb_ids, services or []
+
+
+def iter_service_pages(plugin_rpc, page_size, timeout=None):
+    """Yield the loadbalancer graphs bound to this host, page by page.
+
+    The next page is fetched while the caller handles the current one,
+    and no more than these two pages are held at once.
+    """
+    fetch = eventlet.spawn(_fetch, plugin_rpc, None, page_size, timeout)
+    while True:
+        lb_ids, services = fetch.wait()
+        if len(lb_ids) < page_size:
+            fetch = None
+        else:
+            fetch = eventlet.spawn(_fetch, plugin_rpc, lb_ids[-1],
+                                   page_size, timeout)
+        if services:
+            yield services
+        if fetch is None:
+            return
+
+
+class Reconciler(object):
+    """Bring the agent in line with the loadbalancers of the plugin.
+
+    Loadbalancers the agent placed get their desired state from the
+    plugin, for drift detection to compare the devices with. Those it
+    does not know about are handed to adopt, which only places them
+    where their partition is found, and those the plugin no longer binds
+    to this host are only reported.
+    """
+
+    def __init__(self, conf, plugin_rpc):
+        self.conf = conf
+        self.plugin_rpc = plugin_rpc
+        self.runs = 0
+        self.refreshed = 0
+        self.adopted = 0
+        self.orphans = 0
+
+    def run(self, placements, desired, adopt):
+        seen = set()
+        refreshed = adopted = 0
+        for services in iter_service_pages(self.plugin_rpc,
+                                           self.conf.resync_page_size,
+                                           self.conf.resync_rpc_timeout):
+            for loadbalancer in services:
+                lb_id = loadbalancer['id']
+                seen.add(lb_id)
+                if lb_id in placements:
+                    desired[lb_id] = loadbalancer
+                    refreshed += 1
+                else:
+                    try:
+                        adopt(loadbalancer)
+                        adopted += 1
+                    except Exception as ex:
+                        LOG.error("Fail to adopt loadbalancer %s: %s",
+                                  lb_id, ex)
+
+        orphans = sorted(set(placements) - seen)
+        for lb_id in orphans:
+            LOG.warning("Loadbalancer %s is placed on BIG-IP %s but no "
+                        "longer bound to this agent", lb_id,
+                        placements[lb_id])
+
+        self.runs += 1
+        self.refreshed = refreshed
+        self.adopted = adopted
+        self.orphans = len(orphans)
+        LOG.info("Reconciled %d loadbalancers with the plugin: %d "
+                 "refreshed, %d adopted, %d orphans", len(seen), refreshed,
+                 adopted, len(orphans))
+
+    def stats(self):
+        return {'runs': self.runs, 'refreshed': self.refreshed,
+                'adopted': self.adopted, 'orphans': self.orphans}
@@ -0,0 +1,253 @@
+import collections
+import functools
+import gzip
+import json
+import os
+import time
+import zlib
+
+from eventlet import patcher
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt(
+        "rpc_record_path",
+        default=None,
+        help=("File where inbound RPC casts are recorded, compressed, for "
+              "replay with f5-lbaasv2-bigiq-replay. Leave it unset to "
+              "disable the recorder")
+    ),
+    cfg.IntOpt(
+        "rpc_record_max_bytes",
+        default=64 * 1024 * 1024,
+        help=("Compressed size after which the recording is rotated")
+    ),
+    cfg.IntOpt(
+        "rpc_record_backups",
+        default=5,
+        help=("Number of rotated recordings kept, as .1 for the latest "
+              "up to .N for the oldest")
+    ),
+    cfg.IntOpt(
+        "rpc_record_queue_size",
+        default=10000,
+        help=("Records waiting to be written, after which new ones are "
+              "dropped rather than slowing the agent down")
+    ),
+    cfg.ListOpt(
+        "rpc_record_scrub",
+        default=["password", "secret", "token", "passphrase", "private_key",
+                 "credential"],
+        help=("Arguments whose name contains any of these words are "
+              "recorded as *** instead of their value")
+    )
+]
+
+# Record types
+START = "start"
+CAST = "cast"
+STATUS = "status"
+
+SCRUBBED = "***"
+
+# Status recorded when a loadbalancer is reported destroyed
+DESTROYED = "DESTROYED"
+
+# Seconds between two writes of the records queued meanwhile
+FLUSH_INTERVAL = 1.0
+
+# The writer compresses and writes while green threads run, so it uses a
+# native thread rather than a green one.
+_threading = patcher.original("threading")
+_time = patcher.original("time")
+
+
+def scrub(value, words):
+    """Return a copy of call arguments without the secrets they carry."""
+    if isinstance(value, dict):
+        return dict(
+            (key, SCRUBBED if value[key] is not None and
+             any(word in str(key).lower() for word in words)
+             else scrub(value[key], words))
+            for key in value)
+    if isinstance(value, (list, tuple)):
+        return [scrub(item, words) for item in value]
+    return value
+
+
+def recording_files(path):
+    """Return the files of a recording, oldest first."""
+    rotated = []
+    index = 1
+    while os.path.exists("%s.%d" % (path, index)):
+        rotated.append("%s.%d" % (path, index))
+        index += 1
+    files = list(reversed(rotated))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_records(path):
+    """Yield the records of a recording and its rotated files in order.
+
+    A file ends at its first truncated or torn record, as left by an
+    agent that stopped while writing.
+    """
+    for name in recording_files(path):
+        with gzip.open(name, "rb") as fd:
+            try:
+                for line in fd:
+                    yield json.loads(line.decode('utf-8'))
+            except (EOFError, IOError, ValueError, zlib.error) as ex:
+                LOG.warning("Stop reading %s at a torn record: %s",
+                            name, ex)
+
+
+class RPCRecorder(object):
+    """Append-only, compressed recording of inbound RPC casts.
+
+    Each cast is recorded with its method, its arguments with secrets
+    scrubbed, and its arrival time, along with the loadbalancer statuses
+    the agent reports, which tell when each cast was done. Handlers only
+    queue their record; a background thread compresses and writes them,
+    and rotates the file once it reaches its maximum size.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.path = conf.rpc_record_path
+        self.words = [word.lower() for word in conf.rpc_record_scrub]
+        self._pending = collections.deque()
+        self._lock = _threading.Lock()
+        self._raw = None
+        self._fd = None
+        self.recorded = 0
+        self.dropped = 0
+        self.rotated = 0
+        self.errors = 0
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            # The last run may have left a torn record behind, every run
+            # starts a file of its own
+            self._rotate()
+
+        writer = _threading.Thread(target=self._write,
+                                   name="f5-rpc-recorder")
+        writer.daemon = True
+        writer.start()
+
+    def _queue(self, record):
+        if len(self._pending) >= self.conf.rpc_record_queue_size:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+
+    def cast(self, method, kwargs):
+        self._queue({'type': CAST, 'ts': time.time(), 'method': method,
+                     'kwargs': scrub(kwargs, self.words)})
+
+    def status(self, lb_id, provisioning_status):
+        self._queue({'type': STATUS, 'ts': time.time(), 'lb': lb_id,
+                     'status': provisioning_status})
+
+    def _open(self):
+        self._raw = open(self.path, "ab")
+        self._fd = gzip.GzipFile(fileobj=self._raw, mode="ab",
+                                 compresslevel=6)
+        if self._raw.tell() == 0:
+            # Each file tells how its casts were handled
+            self._fd.write(self._line({
+                'type': START, 'ts': time.time(),
+                'write_behind_window': self.conf.write_behind_window,
+                'rpc_queue_workers': self.conf.rpc_queue_workers}))
+
+    def _close(self):
+        try:
+            if self._fd is not None:
+                self._fd.close()
+        finally:
+            if self._raw is not None:
+                self._raw.close()
+            self._fd = self._raw = None
+
+    def _rotate(self):
+        self._close()
+        self.rotated += 1
+        backups = self.conf.rpc_record_backups
+        if backups <= 0:
+            os.remove(self.path)
+        else:
+            for index in range(backups - 1, 0, -1):
+                name = "%s.%d" % (self.path, index)
+                if os.path.exists(name):
+                    os.rename(name, "%s.%d" % (self.path, index + 1))
+            os.rename(self.path, self.path + ".1")
+
+    def _line(self, record):
+        return (json.dumps(record, separators=(',', ':'), default=str) +
+                "\n").encode('utf-8')
+
+    def _write(self):
+        while True:
+            _time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Write the queued records out."""
+        if not self._pending:
+            return
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        try:
+            if self._fd is None:
+                self._open()
+            while self._pending:
+                self._fd.write(self._line(self._pending.popleft()))
+                self.recorded += 1
+            self._fd.flush()
+            if self._raw.tell() >= self.conf.rpc_record_max_bytes:
+                self._rotate()
+        except Exception:
+            # Logging from a native thread could block on green locks,
+            # failures are only counted
+            self.errors += 1
+            try:
+                self._close()
+            except Exception:
+                pass
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        return {'recorded': self.recorded, 'queued': len(self._pending),
+                'dropped': self.dropped, 'rotated': self.rotated,
+                'errors': self.errors}
+
+
+def recorded(func):
+    """Record each inbound cast of an RPC handler of F5BIGIQAgentManager.
+
+    The cast is recorded on arrival, before it is batched, queued or
+    journaled, so that a replay sees the same burst shape.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, context, **kwargs):
+        recorder = getattr(self, "rpc_recorder", None)
+        if recorder is not None:
+            recorder.cast(name, kwargs)
+        return func(self, context, **kwargs)
+    return wrapper
@@ -1,15 +1,50 @@
 import importlib
-import pkgutil
 
-from inspect import isclass
+# Filters shipped with the agent, imported when a scheduler asks for them
+FILTERS = {
+    "ActiveFilter":
+        "f5_lbaasv2_bigiq_agent.scheduler.filter.base_filter.ActiveFilter",
+    "RandomFilter":
+        "f5_lbaasv2_bigiq_agent.scheduler.filter.base_filter.RandomFilter",
+    "LeastLoadedFilter":
+        "f5_lbaasv2_bigiq_agent.scheduler.filter.spread_filter."
+        "LeastLoadedFilter",
+    "RoundRobinFilter":
+        "f5_lbaasv2_bigiq_agent.scheduler.filter.spread_filter."
+        "RoundRobinFilter",
+    "TenantAntiAffinityFilter":
+        "f5_lbaasv2_bigiq_agent.scheduler.filter.spread_filter."
+        "TenantAntiAffinityFilter"
+}
+
+# Entry point group where other packages register their filters
+FILTER_NAMESPACE = "f5_lbaasv2_bigiq_agent.bigip_filters"
 
 filter_cls_map = {}
 
-__path__ = pkgutil.extend_path(__path__, __name__)
-for _, module_name, _ in pkgutil.walk_packages(path=__path__,
-                                               prefix=__name__+'.'):
-    module = importlib.import_module(module_name)
-    for attribute_name in dir(module):
-        attribute = getattr(module, attribute_name)
-        if isclass(attribute) and attribute_name != "BaseFilter":
-            filter_cls_map[attribute_name] = attribute
+
+def _load_entry_point(name):
+    # pkg_resources scans every installed distribution, so only pay for
+    # it when a filter is not a built-in one.
+    import pkg_resources
+
+    for entry_point in pkg_resources.iter_entry_points(FILTER_NAMESPACE,
+                                                       name):
+        return entry_point.load()
+    return None
+
+
+def get_filter_class(name):
+    """Return the filter class registered under name, or None."""
+    filter_class = filter_cls_map.get(name)
+    if filter_class is None:
+        path = FILTERS.get(name)
+        if path:
+            module_name, _, class_name = path.rpartition(".")
+            module = importlib.import_module(module_name)
+            filter_class = getattr(module, class_name)
+        else:
+            filter_class = _load_entry_point(name)
+        if filter_class is not None:
+            filter_cls_map[name] = filter_class
+    return filter_class
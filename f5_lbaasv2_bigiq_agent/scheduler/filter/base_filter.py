@@ -2,17 +2,27 @@ import random
 
 
 class BaseFilter(object):
-    """Base class of filters."""
+    """Base class of filters.
+
+    The scheduler sets loadbalancer to the one being placed before each
+    filter_all call.
+    """
+    inventory = None
+    load = None
+    loadbalancer = None
+
     def filter_one(self, bigip):
         return True
 
     def filter_all(self, bigips):
-        return filter(self.filter_one, bigips)
+        return [bigip for bigip in bigips if self.filter_one(bigip)]
 
 
 class ActiveFilter(BaseFilter):
     """Active BIG-IP filter."""
     def filter_one(self, bigip):
+        if self.inventory is not None:
+            bigip = self.inventory.get_device(bigip['uuid']) or bigip
         if bigip.get('state') and bigip['state'] == "ACTIVE":
             return True
         else:
@@ -22,4 +32,6 @@ class ActiveFilter(BaseFilter):
 class RandomFilter(BaseFilter):
     """Random BIG-IP filter."""
     def filter_all(self, bigips):
+        if not bigips:
+            return []
         return [bigips[random.randint(0, len(bigips) - 1)]]
@@ -0,0 +1,59 @@
+import threading
+
+from .base_filter import BaseFilter
+
+
+def _uuid(bigip):
+    return bigip['uuid']
+
+
+class LeastLoadedFilter(BaseFilter):
+    """Pick the BIG-IP with the fewest loadbalancers.
+
+    Ties go to the lowest uuid, so that every agent picks the same one.
+    """
+    def filter_all(self, bigips):
+        if not bigips:
+            return []
+        if self.load is None:
+            return [min(bigips, key=_uuid)]
+        return [min(bigips, key=lambda bigip: (
+            self.load.load(bigip['uuid']), bigip['uuid']))]
+
+
+class RoundRobinFilter(BaseFilter):
+    """Pick the BIG-IPs in turn, in uuid order."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = None
+
+    def filter_all(self, bigips):
+        if not bigips:
+            return []
+        ordered = sorted(bigips, key=_uuid)
+        with self._lock:
+            chosen = ordered[0]
+            if self._last is not None:
+                for bigip in ordered:
+                    if bigip['uuid'] > self._last:
+                        chosen = bigip
+                        break
+            self._last = chosen['uuid']
+        return [chosen]
+
+
+class TenantAntiAffinityFilter(BaseFilter):
+    """Keep the BIG-IPs holding the fewest loadbalancers of the tenant.
+
+    It narrows the candidates without picking one, so it goes before
+    LeastLoadedFilter or RoundRobinFilter in bigip_filters.
+    """
+    def filter_all(self, bigips):
+        if not bigips or self.load is None or not self.loadbalancer:
+            return list(bigips)
+        tenant_id = self.loadbalancer.get('tenant_id')
+        counts = dict((bigip['uuid'],
+                       self.load.tenant_load(bigip['uuid'], tenant_id))
+                      for bigip in bigips)
+        fewest = min(counts.values())
+        return [bigip for bigip in bigips if counts[bigip['uuid']] == fewest]
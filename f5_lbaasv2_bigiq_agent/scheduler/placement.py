@@ -0,0 +1,67 @@
+import collections
+import threading
+
+
+class DeviceLoad(object):
+    """Count the loadbalancers placed on each BIG-IP, and per tenant.
+
+    Spreading filters read the counts when they pick a BIG-IP, and the
+    rebalancer reads them to find hot devices, so both are kept up to
+    date on every placement instead of being derived from the placement
+    map each time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._placements = {}
+        self._load = collections.Counter()
+        self._tenant_load = collections.Counter()
+
+    def place(self, lb_id, bigip_id, tenant_id=None):
+        with self._lock:
+            self._unplace(lb_id)
+            self._placements[lb_id] = (bigip_id, tenant_id)
+            self._load[bigip_id] += 1
+            if tenant_id:
+                self._tenant_load[(bigip_id, tenant_id)] += 1
+
+    def _unplace(self, lb_id):
+        placement = self._placements.pop(lb_id, None)
+        if placement is None:
+            return
+        bigip_id, tenant_id = placement
+        self._load[bigip_id] -= 1
+        if self._load[bigip_id] <= 0:
+            del self._load[bigip_id]
+        if tenant_id:
+            key = (bigip_id, tenant_id)
+            self._tenant_load[key] -= 1
+            if self._tenant_load[key] <= 0:
+                del self._tenant_load[key]
+
+    def unplace(self, lb_id):
+        with self._lock:
+            self._unplace(lb_id)
+
+    def load(self, bigip_id):
+        """Return the number of loadbalancers placed on a BIG-IP."""
+        return self._load.get(bigip_id, 0)
+
+    def tenant_load(self, bigip_id, tenant_id):
+        """Return the number of a tenant's loadbalancers on a BIG-IP."""
+        return self._tenant_load.get((bigip_id, tenant_id), 0)
+
+    def bigip(self, lb_id):
+        placement = self._placements.get(lb_id)
+        return placement[0] if placement else None
+
+    def tenant(self, lb_id):
+        placement = self._placements.get(lb_id)
+        return placement[1] if placement else None
+
+    def placed_on(self, bigip_id):
+        """Return the loadbalancers placed on a BIG-IP, sorted."""
+        with self._lock:
+            return sorted(lb_id for lb_id, (placed, _)
+                          in self._placements.items()
+                          if placed == bigip_id)
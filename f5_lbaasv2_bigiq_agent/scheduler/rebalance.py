@@ -0,0 +1,111 @@
+import collections
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.FloatOpt(
+        "rebalance_threshold",
+        default=0.2,
+        help=("A BIG-IP is hot when it holds more loadbalancers than the "
+              "average of its tenant device group by this fraction, and "
+              "a rebalance moves loadbalancers off it")
+    ),
+    cfg.IntOpt(
+        "rebalance_batch_size",
+        default=10,
+        help=("Number of loadbalancers a rebalance moves in parallel")
+    ),
+    cfg.IntOpt(
+        "rebalance_max_moves",
+        default=100,
+        help=("Most loadbalancers moved by one rebalance")
+    )
+]
+
+Move = collections.namedtuple("Move", ("lb_id", "tenant_id", "source",
+                                       "target"))
+
+
+class Rebalancer(object):
+    """Plan loadbalancer moves off hot BIG-IPs.
+
+    Loadbalancers only move inside the device group of their tenant, to
+    the active device with the fewest loadbalancers, then the fewest of
+    the same tenant, then the lowest uuid. The plan is computed up front
+    on planned counts, so two moves never pile onto the same device.
+    """
+
+    def __init__(self, conf, inventory, load):
+        self.conf = conf
+        self.inventory = inventory
+        self.load = load
+
+    def _active(self, bigips):
+        active = []
+        for bigip in bigips:
+            device = self.inventory.get_device(bigip['uuid']) or bigip
+            if device.get('state') == "ACTIVE":
+                active.append(bigip['uuid'])
+        return sorted(active)
+
+    def plan(self, bigiq, lb_ids, max_moves=None, exclude=()):
+        """Return the moves which even out the given loadbalancers.
+
+        BIG-IPs in exclude take no part, neither as source nor target.
+        """
+        if max_moves is None:
+            max_moves = self.conf.rebalance_max_moves
+
+        by_tenant = collections.defaultdict(list)
+        for lb_id in lb_ids:
+            tenant_id = self.load.tenant(lb_id)
+            if tenant_id:
+                by_tenant[tenant_id].append(lb_id)
+
+        planned = collections.Counter()
+        tenant_planned = collections.Counter()
+        moves = []
+        for tenant_id in sorted(by_tenant):
+            devices = [uuid for uuid in self._active(
+                self.inventory.get_tenant_devices(bigiq, tenant_id))
+                if uuid not in exclude]
+            if len(devices) < 2:
+                continue
+
+            def load(uuid):
+                return self.load.load(uuid) + planned[uuid]
+
+            def tenant_load(uuid):
+                return self.load.tenant_load(uuid, tenant_id) + \
+                    tenant_planned[(uuid, tenant_id)]
+
+            candidates = collections.defaultdict(list)
+            for lb_id in sorted(by_tenant[tenant_id]):
+                placed = self.load.bigip(lb_id)
+                if placed in devices:
+                    candidates[placed].append(lb_id)
+
+            for source in sorted(devices, key=load, reverse=True):
+                for lb_id in candidates[source]:
+                    if len(moves) >= max_moves:
+                        return moves
+                    average = float(sum(load(uuid) for uuid in devices)) / \
+                        len(devices)
+                    if load(source) <= average * \
+                            (1 + self.conf.rebalance_threshold):
+                        break
+                    target = min(
+                        (uuid for uuid in devices if uuid != source),
+                        key=lambda uuid: (load(uuid), tenant_load(uuid),
+                                          uuid))
+                    if load(target) + 1 >= load(source):
+                        break
+                    moves.append(Move(lb_id, tenant_id, source, target))
+                    planned[source] -= 1
+                    planned[target] += 1
+                    tenant_planned[(source, tenant_id)] -= 1
+                    tenant_planned[(target, tenant_id)] += 1
+        return moves
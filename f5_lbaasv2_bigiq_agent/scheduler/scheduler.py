@@ -1,6 +1,6 @@
 from oslo_log import log as logging
 
-from .filter import filter_cls_map
+from .filter import get_filter_class
 
 
 LOG = logging.getLogger(__name__)
@@ -8,18 +8,33 @@ LOG = logging.getLogger(__name__)
 
 class BIGIPScheduler(object):
     """Base class of filters."""
-    filter_instances = []
 
-    def __init__(self, filter_names):
+    def __init__(self, filter_names, inventory=None, load=None):
+        self.inventory = inventory
+        self.load = load
+        self.filter_instances = []
         for filter_name in filter_names:
-            filter_class = filter_cls_map.get(filter_name)
+            filter_class = get_filter_class(filter_name)
             if filter_class is None:
                 LOG.error("Filter class not found: %s", filter_name)
             else:
-                self.filter_instances.append(filter_class())
+                filter_instance = filter_class()
+                filter_instance.inventory = inventory
+                filter_instance.load = load
+                self.filter_instances.append(filter_instance)
 
-    def schedule(self, bigips):
+    def get_candidates(self, bigiq, tenant_id):
+        """Return the inventory devices of a tenant device group."""
+        return self.inventory.get_tenant_devices(bigiq, tenant_id)
+
+    def schedule(self, bigips, loadbalancer=None):
         candidates = bigips
         for ins in self.filter_instances:
-            candidates = ins.filter_all(candidates)
+            # Set like inventory and load, so that filters written for
+            # filter_all(bigips) keep working
+            ins.loadbalancer = loadbalancer
+            try:
+                candidates = ins.filter_all(candidates)
+            finally:
+                ins.loadbalancer = None
         return candidates
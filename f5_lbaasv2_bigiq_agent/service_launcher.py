@@ -1,6 +1,25 @@
+from oslo_config import cfg
 from oslo_service import service
 from oslo_service import systemd
 
+from neutron.common import rpc as n_rpc
+
+from f5_lbaasv2_bigiq_agent import profiler
+
+
+class F5BIGIQAgentService(n_rpc.Service):
+    """F5 BIG-IQ agent service class."""
+
+    def start(self):
+        """Start the F5 agent service."""
+        self.tg.add_timer(
+            cfg.CONF.periodic_interval,
+            self.manager.run_periodic_tasks,
+            None,
+            None
+        )
+        super(F5BIGIQAgentService, self).start()
+
 
 class F5ServiceLauncher(service.ServiceLauncher):
 
@@ -12,6 +31,10 @@ class F5ServiceLauncher(service.ServiceLauncher):
         self.signal_handler.add_handler('SIGINT', self._fast_exit)
         self.signal_handler.add_handler('SIGHUP', self._reload_service)
         self.signal_handler.add_handler('SIGALRM', self._on_timeout_exit)
+        self.signal_handler.add_handler('SIGUSR1', self._profile)
+
+    def _profile(self, signo, frame):
+        profiler.get_profiler(cfg.CONF).start()
 
     def wait(self):
         systemd.notify_once()
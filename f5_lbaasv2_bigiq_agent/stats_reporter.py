@@ -0,0 +1,165 @@
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.FloatOpt(
+        "stats_relative_threshold",
+        default=0.05,
+        help=("Report a loadbalancer counter once it moved by this "
+              "fraction of the value last reported")
+    ),
+    cfg.IntOpt(
+        "stats_absolute_threshold",
+        default=1048576,
+        help=("Report a loadbalancer byte counter once it moved by this "
+              "many bytes since the value last reported")
+    ),
+    cfg.IntOpt(
+        "stats_connections_threshold",
+        default=10,
+        help=("Report a loadbalancer connection count once it moved by "
+              "this many connections since the value last reported")
+    ),
+    cfg.IntOpt(
+        "stats_max_staleness",
+        default=900,
+        help=("Seconds after which a loadbalancer counter is reported, "
+              "even if it did not move past a threshold")
+    ),
+    cfg.IntOpt(
+        "stats_batch_size",
+        default=1,
+        help=("Number of loadbalancers packed into one stats message to "
+              "the plugin. 1 sends one update_loadbalancer_stats message "
+              "per loadbalancer; only raise it with a plugin driver that "
+              "implements update_loadbalancers_stats")
+    )
+]
+
+# Cumulative counters, which start over when a BIG-IP reboots or fails
+# over, and gauges, which are reported as they are.
+COUNTERS = ("bytes_in", "bytes_out", "total_connections")
+GAUGES = ("active_connections",)
+
+# Metrics moved by stats_absolute_threshold bytes, the others by
+# stats_connections_threshold connections
+BYTES = ("bytes_in", "bytes_out")
+
+
+class _LoadBalancerStats(object):
+    __slots__ = ("raw", "offset", "sent", "sent_at")
+
+    def __init__(self):
+        self.raw = {}
+        self.offset = {}
+        self.sent = {}
+        # When each counter was last sent
+        self.sent_at = {}
+
+
+class StatsReporter(object):
+    """Report loadbalancer stats to the plugin only when they matter.
+
+    The reporter remembers the raw counters read from the BIG-IP and the
+    values last sent to Neutron for each loadbalancer. A counter is sent
+    when it moved past the relative threshold or the absolute threshold
+    of its kind, or when it has not been sent for stats_max_staleness
+    seconds. A raw counter that went backwards was
+    reset on the device, and the values before the reset are carried
+    over, so Neutron keeps seeing monotonic totals.
+
+    Batched messages carry only the counters that moved. Single
+    loadbalancer messages always carry all counters, because the plugin
+    replaces the whole stats record with them.
+    """
+
+    def __init__(self, conf, plugin_rpc):
+        self.conf = conf
+        self.plugin_rpc = plugin_rpc
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._pending = {}
+
+    def _moved(self, name, value, last):
+        if last is None:
+            return True
+        if last == 0:
+            return value != 0
+        delta = abs(value - last)
+        if name in BYTES:
+            threshold = self.conf.stats_absolute_threshold
+        else:
+            threshold = self.conf.stats_connections_threshold
+        if delta >= threshold:
+            return True
+        return float(delta) / last >= self.conf.stats_relative_threshold
+
+    def _normalize(self, lb_stats, raw):
+        values = {}
+        for name in COUNTERS:
+            if name not in raw:
+                continue
+            value = int(raw[name])
+            last_raw = lb_stats.raw.get(name)
+            if last_raw is not None and value < last_raw:
+                LOG.debug("Counter %s was reset on the device", name)
+                lb_stats.offset[name] = \
+                    lb_stats.offset.get(name, 0) + last_raw
+            lb_stats.raw[name] = value
+            values[name] = lb_stats.offset.get(name, 0) + value
+        for name in GAUGES:
+            if name in raw:
+                values[name] = int(raw[name])
+        return values
+
+    def offer(self, loadbalancer_id, raw):
+        """Take raw stats read from the device for a loadbalancer."""
+        now = time.time()
+        with self._lock:
+            lb_stats = self._stats.setdefault(loadbalancer_id,
+                                              _LoadBalancerStats())
+            values = self._normalize(lb_stats, raw)
+
+            stale = now - self.conf.stats_max_staleness
+            changed = dict(
+                (name, value) for name, value in values.items()
+                if lb_stats.sent_at.get(name, 0) <= stale or
+                self._moved(name, value, lb_stats.sent.get(name)))
+            if not changed:
+                return
+
+            lb_stats.sent.update(changed)
+            for name in changed:
+                lb_stats.sent_at[name] = now
+            self._pending.setdefault(loadbalancer_id, {}).update(changed)
+
+    def forget(self, loadbalancer_id):
+        with self._lock:
+            self._stats.pop(loadbalancer_id, None)
+            self._pending.pop(loadbalancer_id, None)
+
+    def flush(self):
+        """Send pending stats to the plugin, in batches."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            full = dict((lb_id, dict(self._stats[lb_id].sent))
+                        for lb_id in pending if lb_id in self._stats)
+
+        batch_size = self.conf.stats_batch_size
+        if batch_size <= 1:
+            for lb_id, stats in full.items():
+                self.plugin_rpc.update_loadbalancer_stats(lb_id, stats)
+            return len(full)
+
+        lb_ids = sorted(pending)
+        for i in range(0, len(lb_ids), batch_size):
+            batch = dict((lb_id, pending[lb_id])
+                         for lb_id in lb_ids[i:i + batch_size])
+            self.plugin_rpc.update_loadbalancers_stats(batch)
+        return len(lb_ids)
@@ -0,0 +1,192 @@
+import functools
+import itertools
+import json
+import random
+import threading
+import time
+
+import eventlet
+from eventlet import queue as eventlet_queue
+from oslo_config import cfg
+from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.FloatOpt(
+        "trace_payload_sample_rate",
+        default=0.0,
+        help=("Fraction of traced calls whose full arguments are also "
+              "logged at debug level. Spans themselves only carry ids")
+    ),
+    cfg.IntOpt(
+        "trace_queue_size",
+        default=10000,
+        help=("Spans waiting to be logged, after which new spans are "
+              "dropped rather than slowing the agent down")
+    )
+]
+
+_SCALARS = (bool, int, float, str, type(u""))
+
+
+def _ids(args, kwargs):
+    """Reduce call arguments to the ids they carry."""
+    ids = []
+    for name, value in itertools.chain(
+            (("arg%d" % i, value) for i, value in enumerate(args)),
+            sorted(kwargs.items())):
+        if isinstance(value, dict):
+            if 'id' in value:
+                ids.append((name, value['id']))
+            else:
+                ids.append((name, "<%d items>" % len(value)))
+        elif value is None or isinstance(value, _SCALARS):
+            ids.append((name, value))
+    return ids
+
+
+class Span(object):
+    __slots__ = ("id", "parent", "name", "ids", "start", "elapsed",
+                 "outcome", "payload")
+
+    def __init__(self, span_id, parent, name, ids, payload):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.ids = ids
+        self.start = time.time()
+        self.elapsed = None
+        self.outcome = "ok"
+        self.payload = payload
+
+    def __str__(self):
+        return "span %s parent=%s %s %s %.3fs %s" % (
+            self.id, self.parent, self.name,
+            " ".join("%s=%s" % item for item in self.ids),
+            self.elapsed, self.outcome)
+
+
+class Tracer(object):
+    """Record spans of handlers and BIG-IQ calls, off the hot path.
+
+    Spans are only recorded when debug logging is on. A span keeps the
+    ids of its arguments, never the arguments themselves, unless it is
+    sampled for a payload dump, and all formatting happens in a
+    background green thread draining a bounded queue.
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.queue_size = 10000
+        self.dropped = 0
+        self._local = threading.local()
+        self._next_id = itertools.count(1)
+        self._lock = threading.Lock()
+        self._queue = None
+
+    def setup(self, conf):
+        self.sample_rate = conf.trace_payload_sample_rate
+        self.queue_size = conf.trace_queue_size
+
+    def enabled(self):
+        return LOG.isEnabledFor(logging.DEBUG)
+
+    def begin(self, name, ids, payload=None):
+        if payload is not None and \
+                (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            payload = None
+        span = Span(next(self._next_id), getattr(self._local, "span", None),
+                    name, ids, payload)
+        self._local.span = span.id
+        return span
+
+    def end(self, span, error=None):
+        span.elapsed = time.time() - span.start
+        if error is not None:
+            span.outcome = "error %s" % type(error).__name__
+        self._local.span = span.parent
+        self._emit(span)
+
+    def _emit(self, span):
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = eventlet_queue.LightQueue(self.queue_size)
+                    eventlet.spawn_n(self._write)
+        try:
+            self._queue.put_nowait(span)
+        except eventlet_queue.Full:
+            self.dropped += 1
+
+    def _write(self):
+        while True:
+            span = self._queue.get()
+            try:
+                LOG.debug("%s", span)
+                if span.payload is not None:
+                    LOG.debug("span %s payload: %s", span.id,
+                              json.dumps(span.payload, default=str,
+                                         sort_keys=True))
+            except Exception as ex:
+                LOG.warning("Fail to write span %s: %s", span.id, ex)
+
+    def stats(self):
+        return {'queued': self._queue.qsize() if self._queue else 0,
+                'dropped': self.dropped}
+
+
+_tracer = Tracer()
+
+
+def setup(conf):
+    _tracer.setup(conf)
+
+
+def stats():
+    return _tracer.stats()
+
+
+class _SpanContext(object):
+    __slots__ = ("name", "ids", "span")
+
+    def __init__(self, name, ids):
+        self.name = name
+        self.ids = ids
+        self.span = None
+
+    def __enter__(self):
+        if _tracer.enabled():
+            self.span = _tracer.begin(self.name, self.ids)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            _tracer.end(self.span, exc)
+        return False
+
+
+def span(name, **ids):
+    """Trace a block of code under name, tagged with the given ids."""
+    return _SpanContext(name, sorted(ids.items()))
+
+
+def traced(func):
+    """Trace each call of a method, in place of log_method_call."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not _tracer.enabled():
+            return func(self, *args, **kwargs)
+
+        span = _tracer.begin(name, _ids(args, kwargs),
+                             payload={'args': args, 'kwargs': kwargs})
+        try:
+            result = func(self, *args, **kwargs)
+        except Exception as ex:
+            _tracer.end(span, ex)
+            raise
+        _tracer.end(span)
+        return result
+    return wrapper
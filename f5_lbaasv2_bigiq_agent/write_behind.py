@@ -0,0 +1,217 @@
+import collections
+import functools
+import threading
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from f5_lbaasv2_bigiq_agent import journal
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt(
+        "write_behind_window",
+        default=0,
+        help=("Milliseconds during which changes to the objects of one "
+              "loadbalancer are collected before they are applied "
+              "together, with a single status update. Set it to 0 to "
+              "apply each change as it comes")
+    ),
+    cfg.IntOpt(
+        "write_behind_max_changes",
+        default=100,
+        help=("Number of collected changes of one loadbalancer after "
+              "which they are applied without waiting for the window to "
+              "close")
+    )
+]
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+# An object created then deleted in one window, never sent to a device
+CANCEL = "cancel"
+
+# Objects are created parents first, and deleted children first
+APPLY_ORDER = ("listener", "pool", "health_monitor", "member", "l7policy")
+
+# Kind and attribute of the parent each kind of object goes in
+PARENTS = {"health_monitor": ("pool", "pool_id"),
+           "member": ("pool", "pool_id"),
+           "l7policy": ("listener", "listener_id")}
+
+
+class Change(object):
+    __slots__ = ("kind", "op", "method", "kwargs", "op_ids", "own_graph")
+
+    def __init__(self, kind, op, method, kwargs, op_id):
+        self.kind = kind
+        self.op = op
+        self.method = method
+        self.kwargs = kwargs
+        self.op_ids = [op_id] if op_id is not None else []
+        # Applied against the loadbalancer graph it was queued with,
+        # instead of the latest one
+        self.own_graph = False
+
+    @property
+    def obj(self):
+        return self.kwargs[self.kind]
+
+    def merge(self, later):
+        """Fold a later change to the same object into this one."""
+        later.op_ids = self.op_ids + later.op_ids
+        if self.op == CREATE and later.op == UPDATE:
+            # Still to be created, with the updated body
+            later.op = CREATE
+            later.method = self.method
+            later.kwargs = dict(self.kwargs, **{
+                self.kind: later.kwargs[self.kind]})
+        elif self.op == UPDATE and later.op == UPDATE:
+            # The old object is the one before the first update
+            old = "old_" + self.kind
+            if old in self.kwargs:
+                later.kwargs = dict(later.kwargs,
+                                    **{old: self.kwargs[old]})
+        elif self.op in (CREATE, CANCEL) and later.op == DELETE:
+            # Never on the device, it only has to be reported destroyed
+            later.op = CANCEL
+        return later
+
+
+def _detach_orphans(changes):
+    """Settle the changes to children of objects deleted in the batch.
+
+    The latest graph no longer lists such a parent. Creating or updating
+    a child is cancelled, as the child goes along with its parent.
+    Deleting one is applied against the graph it was queued with, which
+    still lists the parent deleted right after it.
+    """
+    deleted = set((change.kind, change.obj['id']) for change in changes
+                  if change.op in (DELETE, CANCEL))
+    for change in changes:
+        parent = PARENTS.get(change.kind)
+        if parent is None or \
+                (parent[0], change.obj.get(parent[1])) not in deleted:
+            continue
+        if change.op == DELETE:
+            change.own_graph = True
+        else:
+            change.op = CANCEL
+    return changes
+
+
+def _order(change):
+    rank = APPLY_ORDER.index(change.kind)
+    if change.op == DELETE:
+        return (1, -rank)
+    return (0, rank)
+
+
+class _Batch(object):
+    __slots__ = ("loadbalancer", "changes", "timer")
+
+    def __init__(self):
+        self.loadbalancer = None
+        self.changes = collections.OrderedDict()
+        self.timer = None
+
+
+class WriteBehind(object):
+    """Collect changes of each loadbalancer and apply them together.
+
+    A change to an object of a loadbalancer opens a window of
+    write_behind_window milliseconds; changes arriving in it are merged
+    by object into a dirty set, which is handed to the apply function
+    once the window closes or write_behind_max_changes is reached, along
+    with the latest loadbalancer graph seen. Changes to the children of
+    an object deleted in the same window do not need that graph, see
+    _detach_orphans.
+    """
+
+    def __init__(self, conf, apply_func):
+        self.conf = conf
+        self.apply_func = apply_func
+        self._lock = threading.Lock()
+        self._batches = {}
+        self.batches = 0
+        self.changes = 0
+
+    def add(self, kind, op, method, kwargs, op_id=None):
+        loadbalancer = kwargs['loadbalancer']
+        lb_id = loadbalancer['id']
+        change = Change(kind, op, method, kwargs, op_id)
+        key = (kind, change.obj['id'])
+
+        with self._lock:
+            batch = self._batches.get(lb_id)
+            if batch is None:
+                batch = self._batches[lb_id] = _Batch()
+                batch.timer = eventlet.spawn_after(
+                    self.conf.write_behind_window / 1000.0,
+                    self.flush, lb_id)
+            batch.loadbalancer = loadbalancer
+            previous = batch.changes.pop(key, None)
+            batch.changes[key] = previous.merge(change) if previous \
+                else change
+            self.changes += 1
+            full = len(batch.changes) >= self.conf.write_behind_max_changes
+
+        if full:
+            self.flush(lb_id)
+
+    def flush(self, lb_id):
+        """Apply the collected changes of a loadbalancer right away."""
+        with self._lock:
+            batch = self._batches.pop(lb_id, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.batches += 1
+        changes = sorted(_detach_orphans(list(batch.changes.values())),
+                         key=_order)
+        try:
+            self.apply_func(batch.loadbalancer, changes)
+        except Exception as ex:
+            LOG.exception("Fail to apply %d changes of loadbalancer %s: %s",
+                          len(changes), lb_id, ex)
+
+    def pending(self, lb_id):
+        return lb_id in self._batches
+
+    def stats(self):
+        return {'batches': self.batches, 'changes': self.changes,
+                'open': len(self._batches)}
+
+
+def batched(kind, op):
+    """Collect an object handler of F5BIGIQAgentManager for write-behind.
+
+    With write-behind enabled, the handler returns once the change is
+    journaled and collected. Its journal entry ends when the batch it
+    belongs to was applied.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, context, **kwargs):
+            write_behind = getattr(self, "write_behind", None)
+            if write_behind is None:
+                return func(self, context, **kwargs)
+            op_id = journal.begin_operation(self, func.__name__, kwargs)
+            write_behind.add(kind, op, func.__name__, kwargs, op_id)
+        return wrapper
+    return decorator
+
+
+def flushing(func):
+    """Apply collected changes before a loadbalancer handler runs."""
+    @functools.wraps(func)
+    def wrapper(self, context, **kwargs):
+        write_behind = getattr(self, "write_behind", None)
+        loadbalancer = kwargs.get('loadbalancer')
+        if write_behind is not None and loadbalancer:
+            write_behind.flush(loadbalancer['id'])
+        return func(self, context, **kwargs)
+    return wrapper
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""Measure how long the agent takes to start consuming its RPC topic.
+
+The agent is started several times with the given config files. Each
+run lasts until the agent logs that it consumes its topic, and reports
+both the wall time seen from here and the phases the agent logged.
+
+    bench_startup.py -n 5 -- --config-file /etc/neutron/neutron.conf \
+        --config-file /etc/neutron/services/f5/f5-lbaasv2-bigiq-agent.conf
+
+Logs are read from the agent stderr, or from --log-file when the config
+sends them to a file.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+CONSUMING = re.compile(r"Consuming (\S+), ([0-9.]+)s after process start")
+PHASES = re.compile(r"Agent startup: (.*)$")
+
+
+def _lines(proc, log_file):
+    if log_file is None:
+        for line in iter(proc.stderr.readline, b""):
+            yield line.decode("utf-8", "replace")
+        return
+
+    while not os.path.exists(log_file):
+        time.sleep(0.05)
+    with open(log_file) as fd:
+        fd.seek(0, os.SEEK_END)
+        while proc.poll() is None:
+            line = fd.readline()
+            if line:
+                yield line
+            else:
+                time.sleep(0.05)
+
+
+def run_once(command, log_file, timeout):
+    start = time.time()
+    proc = subprocess.Popen(command, stderr=subprocess.PIPE)
+    result = {"wall": None, "agent": None, "phases": None}
+    try:
+        for line in _lines(proc, log_file):
+            match = PHASES.search(line)
+            if match:
+                result["phases"] = match.group(1)
+            match = CONSUMING.search(line)
+            if match:
+                result["wall"] = time.time() - start
+                result["agent"] = float(match.group(2))
+                break
+            if time.time() - start > timeout:
+                break
+    finally:
+        proc.send_signal(signal.SIGINT)
+        proc.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark F5 BIG-IQ agent startup")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--agent", default="f5-lbaasv2-bigiq-agent")
+    parser.add_argument("--log-file", default=None)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("agent_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    agent_args = [a for a in args.agent_args if a != "--"]
+    walls = []
+    for i in range(args.runs):
+        result = run_once([args.agent] + agent_args, args.log_file,
+                          args.timeout)
+        if result["wall"] is None:
+            print("run %d: agent did not consume its topic within %ds" %
+                  (i + 1, args.timeout))
+            return 1
+        walls.append(result["wall"])
+        print("run %d: %.3fs wall, %.3fs in agent (%s)" %
+              (i + 1, result["wall"], result["agent"], result["phases"]))
+
+    walls.sort()
+    print("min %.3fs, median %.3fs, max %.3fs" %
+          (walls[0], walls[len(walls) // 2], walls[-1]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Push member status events to the agent member health listener.
+
+Members flap between up and down, in the form BIG-IP logs monitor status
+changes, so the whole path from listener to plugin RPC can be tried
+without a BIG-IP:
+
+    emit_health_events.py --url http://127.0.0.1:8499/ \
+        --pool 3f1c... --member 9a2e... --member 77b0... -n 10
+
+With --json, events are sent as JSON objects instead of log lines.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+
+try:
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib2 import Request, urlopen
+
+MESSAGE = ("01070638:5: Pool /loadbalancer-{lb}/pool-{pool} member "
+           "/loadbalancer-{lb}/member-{member}:{port} monitor status "
+           "{state}. [ /Common/http: {state} ]")
+
+
+def _event(args, member, state):
+    if args.json:
+        return {"pool": "pool-" + args.pool,
+                "member": "member-%s:%d" % (member, args.port),
+                "state": state}
+    return MESSAGE.format(lb=args.loadbalancer, pool=args.pool,
+                          member=member, port=args.port, state=state)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Emit member status events to the F5 BIG-IQ agent")
+    parser.add_argument("--url", default="http://127.0.0.1:8499/")
+    parser.add_argument("--loadbalancer", default="lb")
+    parser.add_argument("--pool", required=True)
+    parser.add_argument("--member", action="append", required=True)
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("-n", "--rounds", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    for i in range(args.rounds):
+        state = "down" if i % 2 else "up"
+        events = [_event(args, member, state) for member in args.member]
+        if args.json:
+            body = json.dumps(events)
+            content_type = "application/json"
+        else:
+            body = "\n".join(events)
+            content_type = "text/plain"
+        request = Request(args.url, data=body.encode("utf-8"),
+                          headers={"Content-Type": content_type})
+        resp = urlopen(request)
+        print("round %d: %s %s" % (i + 1, state, resp.read().decode()))
+        if i + 1 < args.rounds:
+            time.sleep(args.interval)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
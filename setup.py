@@ -24,7 +24,23 @@ setuptools.setup(
     ],
     entry_points={
         'console_scripts': [
-            'f5-lbaasv2-bigiq-agent = f5_lbaasv2_bigiq_agent.agent:main'
+            'f5-lbaasv2-bigiq-agent = f5_lbaasv2_bigiq_agent.agent:main',
+            'f5-lbaasv2-bigiq-loadgen = '
+            'f5_lbaasv2_bigiq_agent.loadgen.runner:main',
+            'f5-lbaasv2-bigiq-replay = '
+            'f5_lbaasv2_bigiq_agent.loadgen.replay:main'
+        ],
+        'f5_lbaasv2_bigiq_agent.bigip_filters': [
+            'ActiveFilter = f5_lbaasv2_bigiq_agent.scheduler.filter.'
+            'base_filter:ActiveFilter',
+            'RandomFilter = f5_lbaasv2_bigiq_agent.scheduler.filter.'
+            'base_filter:RandomFilter',
+            'LeastLoadedFilter = f5_lbaasv2_bigiq_agent.scheduler.filter.'
+            'spread_filter:LeastLoadedFilter',
+            'RoundRobinFilter = f5_lbaasv2_bigiq_agent.scheduler.filter.'
+            'spread_filter:RoundRobinFilter',
+            'TenantAntiAffinityFilter = f5_lbaasv2_bigiq_agent.scheduler.'
+            'filter.spread_filter:TenantAntiAffinityFilter'
         ]
     },
     install_requires=[]
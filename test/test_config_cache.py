@@ -0,0 +1,55 @@
+import unittest
+
+from f5_lbaasv2_bigiq_agent.bigiq import config_cache
+
+POOL = "/mgmt/tm/ltm/pool/~loadbalancer-1~pool-1"
+MEMBER = POOL + "/members/~loadbalancer-1~member-1:80"
+SCOPE = config_cache.scope("bigip-1", "loadbalancer-1")
+
+
+class Conf(object):
+    config_hash_skip = True
+    config_hash_path = None
+
+
+class TestConfigHashCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = config_cache.ConfigHashCache(Conf())
+        self.cache.applied(SCOPE, POOL, {'monitor': "none"})
+        self.cache.applied(SCOPE, MEMBER, {'address': "10.0.0.1"})
+
+    def test_applied_body_is_skipped(self):
+        self.assertTrue(self.cache.unchanged(SCOPE, POOL,
+                                             {'monitor': "none"}))
+        self.assertFalse(self.cache.unchanged(SCOPE, POOL,
+                                              {'monitor': "http"}))
+        self.assertEqual(self.cache.stats()['skipped'], 1)
+
+    def test_nothing_skipped_unless_enabled(self):
+        self.cache.conf = Conf()
+        self.cache.conf.config_hash_skip = False
+        self.assertFalse(self.cache.unchanged(SCOPE, POOL,
+                                              {'monitor': "none"}))
+
+    def test_skip_is_off_by_default(self):
+        option = [opt for opt in config_cache.OPTS
+                  if opt.name == "config_hash_skip"][0]
+        self.assertFalse(option.default)
+
+    def test_forget_keeps_resources_below(self):
+        self.cache.forget(SCOPE, POOL)
+        self.assertFalse(self.cache.unchanged(SCOPE, POOL,
+                                              {'monitor': "none"}))
+        self.assertTrue(self.cache.unchanged(SCOPE, MEMBER,
+                                             {'address': "10.0.0.1"}))
+        self.cache.forget(SCOPE, "/unknown")
+
+    def test_invalidate_drops_resources_below(self):
+        self.cache.invalidate(SCOPE, POOL)
+        self.assertFalse(self.cache.unchanged(SCOPE, MEMBER,
+                                              {'address': "10.0.0.1"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import time
+import unittest
+
+import eventlet
+
+from f5_lbaasv2_bigiq_agent import deadline
+
+
+class Conf(object):
+    operation_deadlines = {"create": "300", "stats": "0"}
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_start(self):
+        limit = deadline.start(Conf(), "create")
+        self.assertEqual(limit.klass, "create")
+        self.assertFalse(limit.expired())
+        self.assertTrue(299 < limit.remaining() <= 300)
+        self.assertIsNone(deadline.start(Conf(), "stats"))
+        self.assertIsNone(deadline.start(Conf(), "delete"))
+
+    def test_expired(self):
+        limit = deadline.Deadline("update", 10)
+        limit.expires = time.time() - 1
+        self.assertTrue(limit.expired())
+        self.assertIsInstance(limit.error(), deadline.DeadlineExceeded)
+
+    def test_scope_nests(self):
+        outer = deadline.Deadline("update", 10)
+        inner = deadline.Deadline("create", 5)
+        self.assertIsNone(deadline.current())
+        with deadline.scope(outer):
+            with deadline.scope(inner):
+                self.assertIs(deadline.current(), inner)
+            self.assertIs(deadline.current(), outer)
+        self.assertIsNone(deadline.current())
+
+    def test_timeout(self):
+        self.assertEqual(deadline.timeout(30), 30)
+        with deadline.scope(deadline.Deadline("update", 5)):
+            self.assertTrue(4 < deadline.timeout(30) <= 5)
+            self.assertEqual(deadline.timeout(1), 1)
+        limit = deadline.Deadline("update", 5)
+        limit.expires = time.time() - 1
+        with deadline.scope(limit):
+            self.assertEqual(deadline.timeout(30), 0.001)
+
+
+class TestBounded(unittest.TestCase):
+
+    def test_without_deadline(self):
+        with deadline.bounded():
+            eventlet.sleep(0)
+
+    def test_cuts_a_late_call_short(self):
+        limit = deadline.Deadline("stats", 0.05)
+        start = time.time()
+        with deadline.scope(limit):
+            with self.assertRaises(deadline.DeadlineExceeded):
+                with deadline.bounded():
+                    eventlet.sleep(5)
+        self.assertLess(time.time() - start, 1)
+        self.assertTrue(limit.exceeded)
+
+    def test_refuses_a_call_past_the_deadline(self):
+        limit = deadline.Deadline("delete", 10)
+        limit.expires = time.time() - 1
+        calls = []
+        with deadline.scope(limit):
+            with self.assertRaises(deadline.DeadlineExceeded):
+                with deadline.bounded():
+                    calls.append(1)
+        self.assertEqual(calls, [])
+
+    def test_timed_out_counted_once(self):
+        limit = deadline.Deadline("counted", 10)
+        deadline.timed_out(limit)
+        deadline.timed_out(limit)
+        self.assertEqual(deadline.stats()["counted"],
+                         {'dropped': 0, 'timed_out': 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
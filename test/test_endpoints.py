@@ -0,0 +1,142 @@
+import itertools
+import time
+import unittest
+
+from f5sdk.exceptions import HTTPError
+
+from f5_lbaasv2_bigiq_agent.bigiq import endpoints
+
+
+class Conf(object):
+    bigiq_token_lifetime = 0
+    bigiq_probe_timeout = 5
+    bigiq_probe_failures = 1
+
+
+class FakeBIGIQ(object):
+    """Hand out tokens, and refuse them once expired."""
+
+    def __init__(self):
+        self.tokens = itertools.count(1)
+        self.valid = set()
+        self.requests = []
+        self.broken = False
+
+    def login(self):
+        token = next(self.tokens)
+        if not self.broken:
+            self.valid.add(token)
+        return FakeClient(self, token)
+
+    def expire(self):
+        self.valid.clear()
+
+
+class FakeClient(object):
+
+    def __init__(self, bigiq, token):
+        self.bigiq = bigiq
+        self.token = token
+
+    def make_request(self, uri, **kwargs):
+        self.bigiq.requests.append((uri, self.token))
+        if self.token not in self.bigiq.valid:
+            raise HTTPError("Bad request for URL: %s code: 401 reason: "
+                            "Unauthorized body: " % uri)
+        if uri == "/missing":
+            raise HTTPError("Bad request for URL: %s code: 404 reason: "
+                            "Not Found body: " % uri)
+        return {"uri": uri, "method": kwargs.get("method", "GET")}
+
+    def get_info(self):
+        self.make_request("/mgmt/tm/sys/version")
+        return {"version": "7.1.0"}
+
+
+class TestEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.bigiq = FakeBIGIQ()
+        self.conf = Conf()
+        self.endpoint = endpoints.Endpoint("bigiq-1", self.conf,
+                                           login=self.bigiq.login)
+
+    def test_logs_in_once(self):
+        self.endpoint.make_request("/a")
+        self.endpoint.make_request("/b", method="POST")
+        self.assertEqual(self.endpoint.logins, 1)
+        self.assertEqual(self.bigiq.requests, [("/a", 1), ("/b", 1)])
+
+    def test_expired_token_logs_in_again(self):
+        self.endpoint.make_request("/a")
+        self.bigiq.expire()
+
+        self.assertEqual(self.endpoint.make_request("/b"),
+                         {"uri": "/b", "method": "GET"})
+        self.assertEqual(self.endpoint.logins, 2)
+        self.assertEqual(self.bigiq.requests,
+                         [("/a", 1), ("/b", 1), ("/b", 2)])
+
+        # The new token is kept for later requests
+        self.endpoint.make_request("/c")
+        self.assertEqual(self.bigiq.requests[-1], ("/c", 2))
+        self.assertEqual(self.endpoint.logins, 2)
+
+    def test_refused_again_is_raised(self):
+        self.endpoint.make_request("/a")
+        self.bigiq.broken = True
+        self.bigiq.expire()
+
+        with self.assertRaises(HTTPError) as caught:
+            self.endpoint.make_request("/b")
+        self.assertTrue(endpoints.unauthorized(caught.exception))
+        self.assertEqual(len(self.bigiq.requests), 3)
+
+    def test_other_errors_are_not_retried(self):
+        self.assertRaises(HTTPError, self.endpoint.make_request, "/missing")
+        self.assertEqual(self.endpoint.logins, 1)
+        self.assertEqual(len(self.bigiq.requests), 1)
+
+    def test_token_lifetime(self):
+        self.conf.bigiq_token_lifetime = 240
+        self.endpoint.make_request("/a")
+        self.endpoint._logged_in_at = time.time() - 241
+
+        self.endpoint.make_request("/b")
+        self.assertEqual(self.endpoint.logins, 2)
+        self.assertEqual(self.bigiq.requests, [("/a", 1), ("/b", 2)])
+
+    def test_handed_over_client(self):
+        client = self.bigiq.login()
+        endpoint = endpoints.Endpoint("simulated", client=client)
+        endpoint.make_request("/a")
+        self.assertIs(endpoint.client, client)
+
+
+class TestEndpointPool(unittest.TestCase):
+
+    def test_expired_token_keeps_the_node_healthy(self):
+        bigiq = FakeBIGIQ()
+        endpoint = endpoints.Endpoint("bigiq-1", Conf(), login=bigiq.login)
+        pool = endpoints.EndpointPool(Conf(), [endpoint])
+        pool.probe()
+        bigiq.expire()
+
+        pool.probe()
+        self.assertTrue(endpoint.healthy)
+        self.assertEqual(pool.stats()['endpoints']['bigiq-1']['logins'], 2)
+
+    def test_node_refusing_logins_is_unhealthy(self):
+        bigiq = FakeBIGIQ()
+        endpoint = endpoints.Endpoint("bigiq-1", Conf(), login=bigiq.login)
+        pool = endpoints.EndpointPool(Conf(), [endpoint])
+        pool.probe()
+        bigiq.broken = True
+        bigiq.expire()
+
+        pool.probe()
+        self.assertFalse(endpoint.healthy)
+
+
+if __name__ == "__main__":
+    unittest.main()
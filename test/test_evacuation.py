@@ -0,0 +1,89 @@
+import unittest
+
+from f5_lbaasv2_bigiq_agent import evacuation
+from f5_lbaasv2_bigiq_agent.scheduler import placement
+from f5_lbaasv2_bigiq_agent.scheduler import rebalance
+
+
+class Conf(object):
+    evacuation_target_concurrency = 10
+    evacuation_status_batch_size = 1
+    rebalance_max_moves = 100
+    rebalance_threshold = 0.2
+
+
+class PluginRPC(object):
+
+    def __init__(self):
+        self.statuses = []
+
+    def update_loadbalancer_status(self, lb_id, provisioning_status,
+                                   operating_status):
+        self.statuses.append((lb_id, provisioning_status))
+
+
+class Inventory(object):
+
+    def __init__(self, bigip_ids):
+        self.devices = dict((bigip_id, {'uuid': bigip_id, 'state': "ACTIVE"})
+                            for bigip_id in bigip_ids)
+
+    def get_device(self, bigip_id):
+        return self.devices.get(bigip_id)
+
+    def get_tenant_devices(self, bigiq, tenant_id):
+        return list(self.devices.values())
+
+
+class TestEvacuation(unittest.TestCase):
+
+    def setUp(self):
+        self.plugin_rpc = PluginRPC()
+        self.progress = evacuation.Evacuation(Conf(), self.plugin_rpc,
+                                              "b1", ["lb1", "lb2", "lb3"])
+
+    def test_moved_partitions_are_stale(self):
+        self.progress.moved_to({'id': "lb1"}, "b2")
+        self.progress.fail({'id': "lb2", 'operating_status': "ONLINE"})
+        self.progress.skip("lb3")
+        self.assertEqual(list(self.progress.stale), ["lb1"])
+        self.assertEqual(self.plugin_rpc.statuses,
+                         [("lb1", "ACTIVE"), ("lb2", "ERROR")])
+
+        self.progress.finish()
+        stats = self.progress.stats()
+        self.assertFalse(stats['running'])
+        self.assertEqual((stats['moved'], stats['failed'], stats['skipped'],
+                          stats['remaining'], stats['stale']),
+                         (1, 1, 1, 0, 1))
+
+    def test_cleaned(self):
+        self.progress.moved_to({'id': "lb1"}, "b2")
+        self.progress.cleaned("lb1")
+        self.progress.cleaned("lb2")
+        self.assertEqual(self.progress.stats()['stale'], 0)
+
+
+class TestRebalanceExclude(unittest.TestCase):
+
+    def setUp(self):
+        self.load = placement.DeviceLoad()
+        for i in range(6):
+            self.load.place("lb%d" % i, "b1", "t1")
+        self.rebalancer = rebalance.Rebalancer(
+            Conf(), Inventory(["b1", "b2", "b3"]), self.load)
+
+    def test_moves_spread_over_devices(self):
+        moves = self.rebalancer.plan(None, ["lb%d" % i for i in range(6)])
+        self.assertEqual(set(move.target for move in moves),
+                         set(["b2", "b3"]))
+
+    def test_excluded_devices_take_nothing(self):
+        moves = self.rebalancer.plan(None, ["lb%d" % i for i in range(6)],
+                                     exclude=set(["b2"]))
+        self.assertTrue(moves)
+        self.assertEqual(set(move.target for move in moves), set(["b3"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+
+from f5_lbaasv2_bigiq_agent.bigiq import l7
+
+PARTITION = "loadbalancer-lb1"
+
+
+def rule(rule_id, rule_type="PATH", compare_type="STARTS_WITH",
+         value="/api", **kwargs):
+    return dict(id=rule_id, type=rule_type, compare_type=compare_type,
+                value=value, **kwargs)
+
+
+def policy(policy_id, position, rules, action="REJECT", **kwargs):
+    return dict(id=policy_id, position=position, action=action,
+                rules=rules, **kwargs)
+
+
+def listener(*policies):
+    return {'id': "l1", 'l7policies': list(policies)}
+
+
+class TestCompileRuleSet(unittest.TestCase):
+
+    def compile(self, *policies):
+        return l7.compile_rule_set(
+            "l1", PARTITION, l7.rule_set(listener(*policies)))
+
+    def test_policies_in_position_order(self):
+        document = self.compile(
+            policy("b", 2, [rule("r2")]),
+            policy("a", 1, [rule("r1", "HOST_NAME", "EQUAL_TO",
+                                 "example.com")],
+                   action="REDIRECT_TO_POOL", redirect_pool_id="p1"))
+
+        self.assertEqual(document["name"], l7.policy_name("l1"))
+        self.assertEqual(document["partition"], PARTITION)
+        self.assertEqual([r["name"] for r in document["rules"]],
+                         ["l7policy-a", "l7policy-b"])
+        self.assertEqual([r["ordinal"] for r in document["rules"]], [0, 1])
+
+        first = document["rules"][0]
+        self.assertEqual(first["conditions"], [{
+            "name": "0", "request": True, "httpHost": True, "host": True,
+            "equals": True, "caseInsensitive": True,
+            "values": ["example.com"]}])
+        self.assertEqual(first["actions"][0]["pool"],
+                         "/%s/pool-p1" % PARTITION)
+        self.assertTrue(document["rules"][1]["actions"][0]["reset"])
+
+    def test_header_key_and_invert(self):
+        document = self.compile(policy("a", 1, [
+            rule("r1", "HEADER", "CONTAINS", "x", key="X-Test",
+                 invert=True)]))
+        condition = document["rules"][0]["conditions"][0]
+        self.assertEqual(condition["tmName"], "X-Test")
+        self.assertTrue(condition["not"])
+        self.assertTrue(condition["contains"])
+
+    def test_disabled_and_empty_policies_are_left_out(self):
+        self.assertIsNone(self.compile(
+            policy("a", 1, []),
+            policy("b", 2, [rule("r1")], admin_state_up=False),
+            policy("c", 3, [rule("r2", provisioning_status="PENDING_DELETE")])
+        ))
+
+    def test_unsupported_rule(self):
+        self.assertRaises(l7.L7CompileError, self.compile,
+                          policy("a", 1, [rule("r1", "SSL_CONN_HAS_CERT")]))
+        self.assertRaises(l7.L7CompileError, self.compile,
+                          policy("a", 1, [rule("r1", compare_type="REGEX")]))
+        self.assertRaises(l7.L7CompileError, self.compile,
+                          policy("a", 1, [rule("r1")], action="DROP"))
+
+    def test_rule_set_ignores_rule_order(self):
+        self.assertEqual(
+            l7.rule_set(listener(policy("a", 1, [rule("r1"), rule("r2")]))),
+            l7.rule_set(listener(policy("a", 1, [rule("r2"), rule("r1")]))))
+
+
+class TestL7Compiler(unittest.TestCase):
+
+    def test_compiles_once_per_rule_set(self):
+        compiler = l7.L7Compiler()
+        first = compiler.compile(listener(policy("a", 1, [rule("r1")])),
+                                 PARTITION)
+        again = compiler.compile(listener(policy("a", 1, [rule("r1")])),
+                                 PARTITION)
+        self.assertIs(again, first)
+        self.assertEqual(compiler.stats(),
+                         {'listeners': 1, 'hits': 1, 'compiles': 1})
+
+        changed = compiler.compile(
+            listener(policy("a", 1, [rule("r1", value="/v2")])), PARTITION)
+        self.assertEqual(changed["rules"][0]["conditions"][0]["values"],
+                         ["/v2"])
+        self.assertEqual(compiler.stats()['compiles'], 2)
+
+    def test_forget(self):
+        compiler = l7.L7Compiler()
+        compiler.compile(listener(policy("a", 1, [rule("r1")])), PARTITION)
+        compiler.compile(listener(policy("a", 1, [rule("r1")])), "other")
+        compiler.forget(PARTITION, "l1")
+        self.assertEqual(compiler.stats()['listeners'], 1)
+        compiler.forget_partition("other")
+        self.assertEqual(compiler.stats()['listeners'], 0)
+
+        compiler.compile(listener(policy("a", 1, [rule("r1")])), PARTITION)
+        self.assertEqual(compiler.stats()['compiles'], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
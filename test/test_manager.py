@@ -0,0 +1,80 @@
+import json
+import unittest
+
+from f5sdk.exceptions import HTTPError
+
+from f5_lbaasv2_bigiq_agent.bigiq import endpoints
+from f5_lbaasv2_bigiq_agent.bigiq import manager
+
+
+class Conf(object):
+    bigiq_token_lifetime = 0
+    bigiq_probe_failures = 2
+
+
+class FakeClient(object):
+    host = "bigiq-1"
+    port = 443
+
+    def __init__(self, token):
+        self.token = token
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.reason = "Unauthorized" if status_code == 401 else "OK"
+        self.text = ""
+        self.body = body
+        self.closed = False
+
+    def iter_content(self, size):
+        return iter([self.body])
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+    """Answer streamed GETs, refusing tokens up to expired."""
+
+    def __init__(self, expired):
+        self.expired = expired
+        self.tokens = []
+
+    def get(self, url, headers=None, **kwargs):
+        token = headers["X-F5-Auth-Token"]
+        self.tokens.append(token)
+        if token <= self.expired:
+            return FakeResponse(401)
+        return FakeResponse(200, json.dumps({"items": []}).encode("utf-8"))
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = iter(range(1, 10))
+        self.endpoint = endpoints.Endpoint(
+            "bigiq-1", Conf(), login=lambda: FakeClient(next(self.tokens)))
+        self.endpoint._session = FakeSession(expired=1)
+        self.manager = manager.BIGIQManager.__new__(manager.BIGIQManager)
+        self.manager.endpoints = endpoints.EndpointPool(Conf(),
+                                                        [self.endpoint])
+
+    def test_expired_token_logs_in_again(self):
+        chunks = list(self.manager._stream("/mgmt/devices"))
+
+        self.assertEqual(json.loads(b"".join(chunks).decode("utf-8")),
+                         {"items": []})
+        self.assertEqual(self.endpoint._session.tokens, [1, 2])
+        self.assertEqual(self.endpoint.logins, 2)
+
+    def test_refused_again_is_raised(self):
+        self.endpoint._session.expired = 9
+        self.assertRaises(HTTPError, self.manager._stream, "/mgmt/devices")
+        self.assertEqual(self.endpoint._session.tokens, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from f5_lbaasv2_bigiq_agent import constants
+from f5_lbaasv2_bigiq_agent import member_health
+
+
+class PluginRPC(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def update_member_status(self, member_id, **kwargs):
+        self.calls.append(("member", member_id, kwargs))
+
+    def update_pool_status(self, pool_id, **kwargs):
+        self.calls.append(("pool", pool_id, kwargs))
+
+
+class TestMemberHealth(unittest.TestCase):
+
+    def setUp(self):
+        self.plugin_rpc = PluginRPC()
+        self.health = member_health.MemberHealth(None, self.plugin_rpc)
+
+    def test_only_operating_status_is_reported(self):
+        self.health.update("p1", "m1", constants.ONLINE)
+        self.assertEqual(self.plugin_rpc.calls, [
+            ("member", "m1", {'operating_status': constants.ONLINE}),
+            ("pool", "p1", {'provisioning_status': None,
+                            'operating_status': constants.ONLINE})])
+
+    def test_only_changes_are_reported(self):
+        self.health.update("p1", "m1", constants.ONLINE)
+        self.health.update("p1", "m1", constants.ONLINE)
+        self.assertEqual(len(self.plugin_rpc.calls), 2)
+
+        self.health.update("p1", "m2", constants.OFFLINE)
+        self.assertEqual(self.plugin_rpc.calls[-1], (
+            "pool", "p1", {'provisioning_status': None,
+                           'operating_status': constants.DEGRADED}))
+
+
+class TestParseEvent(unittest.TestCase):
+
+    def test_event_dict(self):
+        self.assertEqual(member_health.parse_event(
+            {'pool': "pool-p1", 'member': "member-m1:80", 'state': "up"}),
+            ("p1", "m1", constants.ONLINE))
+        self.assertIsNone(member_health.parse_event({'pool': "p1"}))
+
+    def test_monitor_message(self):
+        message = ("Pool /loadbalancer-1/pool-0a1b member "
+                   "/loadbalancer-1/member-2c3d:80 monitor status down.")
+        self.assertEqual(member_health.parse_event(message),
+                         ("0a1b", "2c3d", constants.OFFLINE))
+        self.assertIsNone(member_health.parse_event("unrelated"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+from f5_lbaasv2_bigiq_agent.bigiq import shared
+
+MONITOR = "monitor/http/~Common~lbaas-shared-monitor-1"
+OTHER = "monitor/http/~Common~lbaas-shared-monitor-2"
+
+
+class TestSharedObjects(unittest.TestCase):
+
+    def setUp(self):
+        self.objects = shared.SharedObjects()
+
+    def test_last_release_collects(self):
+        self.assertIsNone(self.objects.acquire("b1", "pool-1", MONITOR))
+        self.assertIsNone(self.objects.acquire("b1", "pool-2", MONITOR))
+        self.assertTrue(self.objects.in_use("b1", MONITOR))
+
+        self.assertIsNone(self.objects.release("b1", "pool-1"))
+        self.assertTrue(self.objects.in_use("b1", MONITOR))
+        self.assertEqual(self.objects.release("b1", "pool-2"), MONITOR)
+        self.assertFalse(self.objects.in_use("b1", MONITOR))
+        self.assertEqual(self.objects.stats(),
+                         {'objects': 0, 'references': 0, 'locks': 0,
+                          'collected': 0})
+
+    def test_acquire_again_is_a_no_op(self):
+        self.objects.acquire("b1", "pool-1", MONITOR)
+        self.assertIsNone(self.objects.acquire("b1", "pool-1", MONITOR))
+        self.assertEqual(self.objects.release("b1", "pool-1"), MONITOR)
+
+    def test_switching_objects_returns_the_one_left_unused(self):
+        self.objects.acquire("b1", "pool-1", MONITOR)
+        self.objects.acquire("b1", "pool-2", MONITOR)
+        self.assertIsNone(self.objects.acquire("b1", "pool-1", OTHER))
+        self.assertEqual(self.objects.acquire("b1", "pool-2", OTHER),
+                         MONITOR)
+        self.assertEqual(self.objects.stats()['objects'], 1)
+
+    def test_devices_are_counted_apart(self):
+        self.objects.acquire("b1", "pool-1", MONITOR)
+        self.objects.acquire("b2", "pool-1", MONITOR)
+        self.assertEqual(self.objects.release("b1", "pool-1"), MONITOR)
+        self.assertTrue(self.objects.in_use("b2", MONITOR))
+
+    def test_release_unknown_user(self):
+        self.assertIsNone(self.objects.release("b1", "pool-1"))
+
+    def test_lock_per_object(self):
+        with self.objects.lock("b1", MONITOR):
+            with self.objects.lock("b2", MONITOR):
+                self.assertEqual(self.objects.stats()['locks'], 2)
+                lock, holders = self.objects._locks[("b1", MONITOR)]
+                self.assertEqual(holders, 1)
+                self.assertFalse(lock.acquire(False))
+        self.assertEqual(self.objects.stats()['locks'], 0)
+
+    def test_lock_kept_while_in_use(self):
+        with self.objects.lock("b1", MONITOR):
+            self.objects.acquire("b1", "pool-1", MONITOR)
+        self.assertEqual(self.objects.stats()['locks'], 1)
+
+        # Dropped along with the last reference
+        self.objects.release("b1", "pool-1")
+        self.assertEqual(self.objects.stats()['locks'], 0)
+
+    def test_lock_kept_while_held(self):
+        with self.objects.lock("b1", MONITOR):
+            self.objects.acquire("b1", "pool-1", MONITOR)
+            self.objects.release("b1", "pool-1")
+            self.assertEqual(self.objects.stats()['locks'], 1)
+        self.assertEqual(self.objects.stats()['locks'], 0)
+
+
+class TestSettings(unittest.TestCase):
+
+    def test_expected_codes(self):
+        self.assertEqual(shared._expected_codes("202, 200"), [200, 202])
+        self.assertEqual(shared._expected_codes("200-202,204"),
+                         [200, 201, 202, 204])
+        self.assertEqual(shared._expected_codes(None), [200])
+
+    def test_monitors_which_check_alike_share(self):
+        first = {'id': "hm1", 'type': "HTTP", 'delay': 5, 'timeout': 3,
+                 'max_retries': 2, 'expected_codes': "200,202"}
+        second = dict(first, id="hm2", expected_codes="202,200")
+        self.assertEqual(shared.monitor_settings(first),
+                         shared.monitor_settings(second))
+        monitor_type, settings = shared.monitor_settings(first)
+        self.assertEqual(monitor_type, "http")
+        self.assertEqual(settings["timeout"], 6)
+        self.assertEqual(
+            shared.shared_name("monitor", settings),
+            shared.shared_name("monitor", dict(settings)))
+        self.assertNotEqual(
+            shared.shared_name("monitor", settings),
+            shared.shared_name("monitor", dict(settings, interval=10)))
+
+    def test_http_profile_settings(self):
+        self.assertIsNone(shared.http_profile_settings({}))
+        self.assertIsNotNone(shared.http_profile_settings(
+            {'insert_headers': {'X-Forwarded-For': "True"}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from f5_lbaasv2_bigiq_agent.bigiq import stream
+
+RESPONSE = {
+    "kind": "cm:shared:resolver:device-groups:devices:collectionstate",
+    "items": [
+        {"uuid": "bigip-1", "state": "ACTIVE", "tags": [{"a": [1, 2]}]},
+        {"uuid": "bigip-2", "hostname": "quote\" brace} bracket] \\",
+         "address": "10.0.0.2"},
+        {"uuid": "bigip-3", "hostname": u"bézier ☃"}
+    ],
+    "totalItems": 3,
+    "nextLink": "https://localhost/mgmt/devices?$top=3&$skip=3"
+}
+
+
+def body(document=RESPONSE):
+    return json.dumps(document, indent=1).encode("utf-8")
+
+
+def parse(data, size):
+    parser = stream.ItemParser()
+    items = []
+    for i in range(0, len(data), size):
+        items += parser.feed(data[i:i + size])
+    parser.close()
+    return parser, items
+
+
+class TestItemParser(unittest.TestCase):
+
+    def test_whole_body(self):
+        parser, items = parse(body(), len(body()))
+        self.assertEqual(items, RESPONSE["items"])
+        self.assertEqual(parser.meta["totalItems"], 3)
+        self.assertEqual(parser.meta["nextLink"], RESPONSE["nextLink"])
+        self.assertNotIn("items", parser.meta)
+
+    def test_any_chunk_size(self):
+        data = body()
+        for size in (1, 2, 3, 7, 64):
+            parser, items = parse(data, size)
+            self.assertEqual(items, RESPONSE["items"], size)
+            self.assertEqual(parser.meta["nextLink"], RESPONSE["nextLink"])
+
+    def test_compact_body(self):
+        data = json.dumps(RESPONSE, separators=(',', ':')).encode("utf-8")
+        _, items = parse(data, 5)
+        self.assertEqual(items, RESPONSE["items"])
+
+    def test_items_are_returned_as_they_complete(self):
+        parser = stream.ItemParser()
+        self.assertEqual(parser.feed(b'{"items": [{"a": 1}, {"b"'),
+                         [{"a": 1}])
+        self.assertEqual(parser.feed(b': 2}]}'), [{"b": 2}])
+        parser.close()
+
+    def test_empty_list(self):
+        parser, items = parse(b'{"items": [], "totalItems": 0}', 4)
+        self.assertEqual(items, [])
+        self.assertEqual(parser.meta, {"totalItems": 0})
+
+    def test_other_key(self):
+        parser = stream.ItemParser(key="entries")
+        items = parser.feed(b'{"items": 1, "entries": ["a", "b"]}')
+        parser.close()
+        self.assertEqual(items, ["a", "b"])
+        self.assertEqual(parser.meta, {"items": 1})
+
+    def test_truncated_body(self):
+        parser = stream.ItemParser()
+        parser.feed(body()[:-10])
+        self.assertRaises(ValueError, parser.close)
+
+    def test_not_an_object(self):
+        parser = stream.ItemParser()
+        self.assertRaises(ValueError, parser.feed, b'[1, 2]')
+
+
+class TestLinkPath(unittest.TestCase):
+
+    def test_link_path(self):
+        self.assertEqual(stream.link_path(RESPONSE["nextLink"]),
+                         "/mgmt/devices?$top=3&$skip=3")
+        self.assertEqual(stream.link_path("https://localhost/mgmt/x"),
+                         "/mgmt/x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import unittest
+
+from f5_lbaasv2_bigiq_agent.bigiq import config_cache
+from f5_lbaasv2_bigiq_agent.bigiq import templates
+
+
+class TestBodyTemplate(unittest.TestCase):
+
+    def test_render_matches_the_body_dict(self):
+        body = templates.MEMBER.render("member-1:80", "loadbalancer-1",
+                                       "10.0.0.1")
+        self.assertEqual(json.loads(body.data.decode("ascii")), {
+            "name": "member-1:80", "partition": "loadbalancer-1",
+            "address": "10.0.0.1"})
+        self.assertEqual(body.name, "member-1:80")
+        self.assertEqual(body.partition, "loadbalancer-1")
+
+    def test_constants_and_structured_values(self):
+        body = templates.HTTP_VIRTUAL.render(
+            "listener-1", "loadbalancer-1", "10.0.0.1:80",
+            [{"name": "http"}, {"name": "tcp"}])
+        self.assertEqual(json.loads(body.data.decode("ascii")), {
+            "name": "listener-1", "partition": "loadbalancer-1",
+            "destination": "10.0.0.1:80", "ipProtocol": "tcp",
+            "profiles": [{"name": "http"}, {"name": "tcp"}]})
+
+    def test_strings_are_escaped(self):
+        template = templates.BodyTemplate(("name", "description"),
+                                          note="100%")
+        body = template.render(u"a\"b\\c", u"café %s")
+        self.assertEqual(json.loads(body.data.decode("ascii")), {
+            "name": u"a\"b\\c", "description": u"café %s",
+            "note": "100%"})
+        self.assertIsNone(body.partition)
+
+    def test_folder(self):
+        body = templates.FOLDER.render("loadbalancer-1", "tenant-1",
+                                       "/loadbalancer-1")
+        self.assertEqual(json.loads(body.data.decode("ascii"))["subPath"],
+                         "/")
+
+
+class TestRawRequest(unittest.TestCase):
+
+    def test_headers_are_not_shared(self):
+        kwargs = templates.raw_request()
+        # As f5sdk add_auth_header does
+        kwargs["headers"]["X-F5-Auth-Token"] = "token"
+        self.assertEqual(templates.raw_request(), {
+            "body_content_type": "raw",
+            "headers": {"Content-Type": templates.RAW_CONTENT_TYPE}})
+
+
+class TestRawBody(unittest.TestCase):
+
+    def test_hash_of_the_bytes(self):
+        body = templates.POOL.render("pool-1", "loadbalancer-1")
+        self.assertEqual(body.hash, hashlib.sha1(body.data).hexdigest())
+        self.assertEqual(config_cache.body_hash(body), body.hash)
+
+    def test_same_values_same_hash(self):
+        self.assertEqual(
+            templates.POOL.render("pool-1", "loadbalancer-1").hash,
+            templates.POOL.render("pool-1", "loadbalancer-1").hash)
+        self.assertNotEqual(
+            templates.POOL.render("pool-1", "loadbalancer-1").hash,
+            templates.POOL.render("pool-2", "loadbalancer-1").hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
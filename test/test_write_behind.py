@@ -0,0 +1,173 @@
+import unittest
+
+from f5_lbaasv2_bigiq_agent import write_behind
+
+
+class Conf(object):
+    write_behind_window = 60000
+    write_behind_max_changes = 100
+
+
+LOADBALANCER = {'id': "lb-1", 'tenant_id': "tenant-1"}
+
+
+def change(kind, op, obj, op_id=None):
+    return write_behind.Change(kind, op, "%s_%s" % (op, kind),
+                               {kind: obj, 'loadbalancer': LOADBALANCER},
+                               op_id)
+
+
+class TestChangeMerge(unittest.TestCase):
+
+    def test_create_then_update_creates_updated_body(self):
+        merged = change("pool", write_behind.CREATE,
+                        {'id': "p1", 'name': "old"}, 1).merge(
+            change("pool", write_behind.UPDATE,
+                   {'id': "p1", 'name': "new"}, 2))
+        self.assertEqual(merged.op, write_behind.CREATE)
+        self.assertEqual(merged.method, "create_pool")
+        self.assertEqual(merged.obj['name'], "new")
+        self.assertEqual(merged.op_ids, [1, 2])
+
+    def test_create_then_delete_cancels(self):
+        merged = change("member", write_behind.CREATE, {'id': "m1"}, 1) \
+            .merge(change("member", write_behind.DELETE, {'id': "m1"}, 2))
+        self.assertEqual(merged.op, write_behind.CANCEL)
+        self.assertEqual(merged.op_ids, [1, 2])
+
+    def test_create_update_delete_cancels(self):
+        created = change("pool", write_behind.CREATE, {'id': "p1"}, 1)
+        merged = created.merge(
+            change("pool", write_behind.UPDATE, {'id': "p1"}, 2))
+        merged = merged.merge(
+            change("pool", write_behind.DELETE, {'id': "p1"}, 3))
+        self.assertEqual(merged.op, write_behind.CANCEL)
+        self.assertEqual(merged.op_ids, [1, 2, 3])
+
+    def test_update_then_delete_deletes(self):
+        merged = change("listener", write_behind.UPDATE, {'id': "l1"}) \
+            .merge(change("listener", write_behind.DELETE, {'id': "l1"}))
+        self.assertEqual(merged.op, write_behind.DELETE)
+        self.assertEqual(merged.method, "delete_listener")
+
+    def test_update_then_update_keeps_last(self):
+        merged = change("pool", write_behind.UPDATE,
+                        {'id': "p1", 'name': "a"}).merge(
+            change("pool", write_behind.UPDATE, {'id': "p1", 'name': "b"}))
+        self.assertEqual(merged.op, write_behind.UPDATE)
+        self.assertEqual(merged.obj['name'], "b")
+
+    def test_update_then_update_keeps_first_old_object(self):
+        first = change("listener", write_behind.UPDATE,
+                       {'id': "l1", 'name': "b"})
+        first.kwargs['old_listener'] = {'id': "l1", 'name': "a"}
+        later = change("listener", write_behind.UPDATE,
+                       {'id': "l1", 'name': "c"})
+        later.kwargs['old_listener'] = {'id': "l1", 'name': "b"}
+        merged = first.merge(later)
+        self.assertEqual(merged.kwargs['old_listener']['name'], "a")
+        self.assertEqual(merged.obj['name'], "c")
+
+
+class TestWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        self.applied = []
+        self.write_behind = write_behind.WriteBehind(
+            Conf(), lambda loadbalancer, changes: self.applied.append(
+                (loadbalancer, changes)))
+
+    def add(self, kind, op, obj, loadbalancer=LOADBALANCER):
+        self.write_behind.add(kind, op, "%s_%s" % (op, kind),
+                              {kind: obj, 'loadbalancer': loadbalancer})
+
+    def test_changes_are_merged_by_object(self):
+        self.add("pool", write_behind.CREATE, {'id': "p1"})
+        self.add("pool", write_behind.UPDATE, {'id': "p1"})
+        self.add("pool", write_behind.CREATE, {'id': "p2"})
+        self.assertTrue(self.write_behind.pending("lb-1"))
+        self.write_behind.flush("lb-1")
+
+        self.assertFalse(self.write_behind.pending("lb-1"))
+        _, changes = self.applied[0]
+        self.assertEqual([(c.kind, c.op, c.obj['id']) for c in changes],
+                         [("pool", write_behind.CREATE, "p1"),
+                          ("pool", write_behind.CREATE, "p2")])
+        self.assertEqual(self.write_behind.stats(),
+                         {'batches': 1, 'changes': 3, 'open': 0})
+
+    def test_parents_created_first_and_deleted_last(self):
+        self.add("member", write_behind.DELETE, {'id': "m1"})
+        self.add("pool", write_behind.DELETE, {'id': "p1"})
+        self.add("member", write_behind.CREATE, {'id': "m2"})
+        self.add("pool", write_behind.CREATE, {'id': "p2"})
+        self.add("listener", write_behind.CREATE, {'id': "l1"})
+        self.write_behind.flush("lb-1")
+
+        _, changes = self.applied[0]
+        self.assertEqual([c.obj['id'] for c in changes],
+                         ["l1", "p2", "m2", "m1", "p1"])
+
+    def test_latest_loadbalancer_graph_is_applied(self):
+        self.add("pool", write_behind.CREATE, {'id': "p1"},
+                 dict(LOADBALANCER, pools=[]))
+        self.add("pool", write_behind.CREATE, {'id': "p2"},
+                 dict(LOADBALANCER, pools=[{'id': "p1"}]))
+        self.write_behind.flush("lb-1")
+
+        loadbalancer, _ = self.applied[0]
+        self.assertEqual(loadbalancer['pools'], [{'id': "p1"}])
+
+    def test_full_batch_is_applied_at_once(self):
+        self.write_behind.conf.write_behind_max_changes = 2
+        try:
+            self.add("pool", write_behind.CREATE, {'id': "p1"})
+            self.assertEqual(self.applied, [])
+            self.add("pool", write_behind.CREATE, {'id': "p2"})
+            self.assertEqual(len(self.applied), 1)
+            self.assertFalse(self.write_behind.pending("lb-1"))
+        finally:
+            del self.write_behind.conf.write_behind_max_changes
+
+    def test_children_of_deleted_parents(self):
+        old_graph = dict(LOADBALANCER, listeners=[{'id': "l1"}])
+        self.add("listener", write_behind.CREATE, {'id': "l2"})
+        self.add("l7policy", write_behind.CREATE,
+                 {'id': "r1", 'listener_id': "l2"})
+        self.add("l7policy", write_behind.DELETE,
+                 {'id': "r2", 'listener_id': "l1"}, old_graph)
+        self.add("pool", write_behind.CREATE, {'id': "p1"})
+        self.add("member", write_behind.CREATE,
+                 {'id': "m1", 'pool_id': "p1"})
+        self.add("health_monitor", write_behind.UPDATE,
+                 {'id': "h1", 'pool_id': "p2"})
+        self.add("member", write_behind.CREATE,
+                 {'id': "m2", 'pool_id': "p3"})
+        self.add("listener", write_behind.DELETE, {'id': "l1"})
+        self.add("listener", write_behind.DELETE, {'id': "l2"})
+        self.add("pool", write_behind.DELETE, {'id': "p2"})
+        self.write_behind.flush("lb-1")
+
+        loadbalancer, changes = self.applied[0]
+        ops = dict((c.obj['id'], c.op) for c in changes)
+        self.assertEqual(ops, {
+            "l2": write_behind.CANCEL, "r1": write_behind.CANCEL,
+            "p1": write_behind.CREATE, "m1": write_behind.CREATE,
+            "h1": write_behind.CANCEL, "m2": write_behind.CREATE,
+            "r2": write_behind.DELETE, "l1": write_behind.DELETE,
+            "p2": write_behind.DELETE})
+        # Deleted against the graph which still lists its listener
+        own = [c for c in changes if c.own_graph]
+        self.assertEqual([c.obj['id'] for c in own], ["r2"])
+        self.assertIs(own[0].kwargs['loadbalancer'], old_graph)
+        self.assertIs(loadbalancer, LOADBALANCER)
+        ids = [c.obj['id'] for c in changes]
+        self.assertLess(ids.index("r2"), ids.index("l1"))
+
+    def test_flush_without_changes_does_nothing(self):
+        self.write_behind.flush("lb-1")
+        self.assertEqual(self.applied, [])
+
+
+if __name__ == "__main__":
+    unittest.main()